@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import time
+
+from TP1.extractors import EXTRACTORS
+
+
+# Micro-benchmark des extracteurs sur des pages enregistrées
+def load_pages(pages_dir):
+    """Charge les pages HTML (*.html, *.htm) d'un dossier : [(nom du fichier, contenu)]."""
+    pages = []
+    for pattern in ("*.html", "*.htm"):
+        for path in sorted(glob.glob(os.path.join(pages_dir, "**", pattern), recursive=True)):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                pages.append((os.path.relpath(path, pages_dir), f.read()))
+    return pages
+
+
+def benchmark(pages, base_url, repeat=5):
+    """Temps d'extraction de toutes les pages pour chaque extracteur (meilleur de `repeat` essais).
+
+    Vérifie aussi que les extracteurs donnent le même résultat que BeautifulSoup.
+    """
+    timings = {}
+    for backend, extractor in EXTRACTORS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _, html in pages:
+                extractor(html, base_url)
+            best = min(best, time.perf_counter() - start)
+        timings[backend] = best
+
+    differences = [
+        name
+        for name, html in pages
+        if any(
+            extractor(html, base_url) != EXTRACTORS["bs4"](html, base_url)
+            for extractor in EXTRACTORS.values()
+        )
+    ]
+    return timings, differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare les extracteurs HTML du crawler sur des pages enregistrées."
+    )
+    parser.add_argument("pages_dir", help="Dossier contenant des pages .html")
+    parser.add_argument("--base-url", default="https://web-scraping.dev/")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        raise SystemExit(f"Aucune page .html dans '{args.pages_dir}'.")
+    size = sum(len(html) for _, html in pages) / 1e6
+    timings, differences = benchmark(pages, args.base_url, args.repeat)
+
+    print(f"{len(pages)} pages ({size:.1f} Mo), meilleur de {args.repeat} essais :")
+    for backend, seconds in sorted(timings.items(), key=lambda item: item[1]):
+        print(
+            f"  {backend:>5} : {seconds * 1000 / len(pages):.3f} ms/page, "
+            f"{len(pages) / seconds:.0f} pages/s, x{timings['bs4'] / seconds:.1f} vs bs4"
+        )
+    if differences:
+        print(f"Résultats différents de bs4 pour {len(differences)} pages : {differences[:10]}")
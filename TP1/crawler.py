@@ -1,15 +1,38 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from TP1.extraction import (
     is_allowed_to_crawl,
     polite_request,
     parse_html,
     extract_page_info,
-    add_url_to_queue,
+    fetcher as default_fetcher,
+    robots_cache,
+)
+from TP1.extractors import DEFAULT_EXTRACTOR, extract
+from TP1.frontier import Frontier, product_priority
+from TP1.save_json import (
+    load_checkpoint,
+    open_jsonl_output,
+    read_results_jsonl,
+    save_checkpoint,
+    truncate_partial_line,
+    write_result_line,
 )
-from urllib.parse import urljoin
+from TP1.scheduler import HostScheduler
+from urllib.parse import urlparse
 
+# Nombre maximal de requêtes en cours en même temps (tous hôtes confondus)
+DEFAULT_CONCURRENCY = 8
+# Délai minimal (en secondes) entre deux requêtes vers un même hôte
+DEFAULT_DELAY = 1
+# Nombre de pages crawlées entre deux checkpoints
+CHECKPOINT_EVERY = 100
 
-def crawl_url(url, visited, priority_queue, normal_queue, robots_txt_url):
-    """Gère le crawling d'une URL et l'ajoute aux files d'attente selon sa priorité."""
+
+def crawl_url(url, visited, frontier, robots_txt_url):
+    """Gère le crawling d'une URL et ajoute ses liens à la frontière (qui gère leur priorité)."""
     if not is_allowed_to_crawl(url, robots_txt_url):
         print(f"L'accès à {url} est interdit par robots.txt.")
         return None
@@ -19,42 +42,216 @@ def crawl_url(url, visited, priority_queue, normal_queue, robots_txt_url):
         page_info = extract_page_info(soup, url)
         visited.add(url)  # Marquer l'URL comme visitée
         for link in page_info["links"]:
-            add_url_to_queue(
-                link, visited, priority_queue, normal_queue
-            )  # Ajout des liens dans la bonne file
+            frontier.add(link)  # Ignoré si le lien a déjà été vu
+        return page_info
+    return None
+
+
+async def crawl_url_async(
+    url, visited, frontier, robots, scheduler, fetcher, extract_page
+):
+    """Version asynchrone de `crawl_url` : la politesse est gérée par hôte par le `scheduler`.
+
+    Les appels bloquants (requests, BeautifulSoup) tournent dans des threads pour ne pas
+    bloquer la boucle d'événements pendant que les autres requêtes avancent. Le robots.txt
+    de l'hôte vient du cache `robots`, et son Crawl-delay allonge le délai de l'hôte.
+    La page est téléchargée par `fetcher` : si elle n'a pas changé depuis le dernier crawl
+    (304 ou même contenu), ses informations viennent du cache et page_info["unchanged"] est vrai ;
+    sinon elles sont extraites par la coroutine `extract_page(html, url)`.
+    """
+    rules = await asyncio.to_thread(robots.get, url)
+    if not rules.is_allowed(url):
+        print(f"L'accès à {url} est interdit par robots.txt.")
+        return None
+    if rules.crawl_delay is not None:
+        scheduler.set_delay(urlparse(url).netloc, max(scheduler.delay, rules.crawl_delay))
+    await scheduler.wait(url)  # Respecte le délai de l'hôte
+    response = await asyncio.to_thread(fetcher.fetch, url)
+    if response:
+        page_info = await asyncio.to_thread(fetcher.load_page_info, response.content_hash)
+        if page_info is not None:
+            page_info["unchanged"] = True  # Ni parsing ni ré-indexation nécessaires
+        else:
+            page_info = await extract_page(response.text, url)
+            fetcher.store_page_info(response.content_hash, page_info)
+            page_info["unchanged"] = False
+        visited.add(url)  # Marquer l'URL comme visitée
+        for link in page_info["links"]:
+            frontier.add(link)  # Ignoré si le lien a déjà été vu
         return page_info
     return None
 
 
 # Logique principale du crawler
-def crawl(start_url, max_pages):
-    """Exécute le crawler en respectant la priorité des liens 'product'."""
-    robots_txt_url = urljoin(start_url, "/robots.txt")
+async def crawl_async(
+    start_url,
+    max_pages,
+    concurrency=DEFAULT_CONCURRENCY,
+    delay=DEFAULT_DELAY,
+    robots=None,
+    priority=product_priority,
+    output_file=None,
+    checkpoint_file=None,
+    resume=False,
+    checkpoint_every=CHECKPOINT_EVERY,
+    overwrite=False,
+    fetcher=None,
+    skip_unchanged=False,
+    extractor=DEFAULT_EXTRACTOR,
+    extract_workers=None,
+):
+    """Exécute le crawler avec `concurrency` requêtes simultanées, en respectant la priorité
+    des liens 'product' et un délai de `delay` secondes (ou le Crawl-delay du robots.txt,
+    s'il est plus long) entre deux requêtes vers un même hôte.
+
+    `robots` est le cache de robots.txt à utiliser (par défaut celui partagé du module extraction)
+    et `priority` la fonction de priorité des URLs de la frontière (plus grand = plus tôt).
+    `fetcher` est la couche de téléchargement (par défaut celle du module extraction) ; pour
+    un recrawl, `Fetcher(cache_dir=...)` garde ETag / Last-Modified et les pages extraites
+    d'un crawl à l'autre. Avec `skip_unchanged=True`, les pages inchangées depuis le
+    crawl précédent ne sont pas écrites dans les résultats (leurs liens sont quand même suivis).
+    Les pages sont extraites par l'extracteur `extractor` ("fast" ou "bs4", voir TP1.extractors)
+    dans un pool de `extract_workers` processus (par défaut un par cœur), séparé de la boucle
+    des téléchargements ; avec `extract_workers=0`, l'extraction se fait dans des threads.
+
+    Sans `output_file`, retourne la liste des résultats. Avec `output_file`, chaque page est
+    écrite dans ce fichier JSONL dès qu'elle est crawlée (rien n'est gardé en mémoire) et
+    la fonction retourne le nombre de pages crawlées. La frontière et les pages visitées
+    sont alors enregistrées dans `checkpoint_file` (par défaut `output_file` + ".checkpoint")
+    toutes les `checkpoint_every` pages et à la fin.
+    Avec `resume=True`, le crawl repart du dernier checkpoint ; les pages écrites dans
+    `output_file` après ce checkpoint sont relues au lieu d'être crawlées de nouveau.
+    """
+    robots = robots or robots_cache
+    fetcher = fetcher or default_fetcher
     visited = set()
-    priority_queue = [start_url]  # Pile des liens prioritaires (product)
-    normal_queue = []  # Pile des autres liens
+    in_progress = set()  # URLs en cours de crawling
+    frontier = Frontier(priority)  # URLs à crawler, chacune une seule fois
     results = []
+    output = None
+    if output_file:
+        checkpoint_file = checkpoint_file or output_file + ".checkpoint"
+        saved = load_checkpoint(checkpoint_file) if resume else None
+        replay_offset = 0
+        if saved:
+            frontier = Frontier.from_state(saved["frontier"], priority)
+            visited = set(saved["visited"])
+            replay_offset = saved["output_offset"]
+        if resume and os.path.exists(output_file):
+            truncate_partial_line(output_file)
+            # Pages crawlées après le checkpoint : visitées, leurs liens vont dans la frontière
+            for result in read_results_jsonl(output_file, replay_offset):
+                visited.add(result["url"])
+                for link in result["links"]:
+                    frontier.add(link)
+        output = open_jsonl_output(output_file, resume=resume, overwrite=overwrite)
+        if resume:
+            print(f"Reprise du crawl : {len(visited)} pages déjà crawlées.")
+    if not visited:
+        frontier.add(start_url)
+    pages_since_checkpoint = 0
+    pool = ProcessPoolExecutor(extract_workers) if extract_workers != 0 else None
 
-    while (priority_queue or normal_queue) and len(visited) < max_pages:
-        # On explore d'abord la pile prioritaire, puis la pile normale
-        if priority_queue:
-            current_url = priority_queue.pop(0)
-        else:
-            current_url = normal_queue.pop(0)
+    async def extract_page(html, url):
+        if pool is None:
+            return await asyncio.to_thread(extract, html, url, extractor)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, extract, html, url, extractor)
+    scheduler = HostScheduler(delay)
+    condition = asyncio.Condition()
 
-        print(f"Crawling : {current_url}")
-        page_info = crawl_url(
-            current_url, visited, priority_queue, normal_queue, robots_txt_url
-        )
+    def can_start():
+        # Une URL en attente et de la place sous max_pages (pages visitées + en cours)
+        return frontier and len(visited) + len(in_progress) < max_pages
+
+    def is_finished():
+        return len(visited) >= max_pages or not (frontier or in_progress)
+
+    def checkpoint():
+        fetcher.save()
+        output.flush()
+        state = {
+            "frontier": frontier.state(pending=in_progress),
+            "visited": list(visited),
+            "output_offset": output.tell(),
+        }
+        save_checkpoint(state, checkpoint_file)
+
+    async def worker():
+        nonlocal pages_since_checkpoint
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: can_start() or is_finished())
+                if is_finished():
+                    return
+                # URL la plus prioritaire (les liens 'product' d'abord par défaut)
+                current_url = frontier.pop()
+                if current_url in visited:  # Déjà crawlée avant une reprise
+                    continue
+                in_progress.add(current_url)
 
-        if page_info:
-            results.append(
-                {
-                    "title": page_info["title"],
-                    "url": current_url,
-                    "first_paragraph": page_info["first_paragraph"],
-                    "links": page_info["links"],
-                }
-            )
+            print(f"Crawling : {current_url}")
+            page_info = None
+            try:
+                page_info = await crawl_url_async(
+                    current_url,
+                    visited,
+                    frontier,
+                    robots,
+                    scheduler,
+                    fetcher,
+                    extract_page,
+                )
+            finally:
+                async with condition:
+                    in_progress.discard(current_url)
+                    if page_info and not (skip_unchanged and page_info["unchanged"]):
+                        result = {
+                            "title": page_info["title"],
+                            "url": current_url,
+                            "first_paragraph": page_info["first_paragraph"],
+                            "links": page_info["links"],
+                        }
+                        if output:
+                            write_result_line(output, result)
+                            pages_since_checkpoint += 1
+                            if pages_since_checkpoint >= checkpoint_every:
+                                checkpoint()
+                                pages_since_checkpoint = 0
+                        else:
+                            results.append(result)
+                    condition.notify_all()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if output:
+            checkpoint()
+            output.close()
+        else:
+            fetcher.save()
     print("Crawling terminé")
-    return results
+    return len(visited) if output else results
+
+
+def crawl(
+    start_url,
+    max_pages,
+    concurrency=DEFAULT_CONCURRENCY,
+    delay=DEFAULT_DELAY,
+    priority=product_priority,
+    **options,
+):
+    """Exécute le crawler en respectant la priorité des liens 'product' (ou celle de `priority`).
+
+    Plusieurs hôtes sont crawlés en parallèle (voir `crawl_async`), chaque hôte
+    restant interrogé au plus une fois toutes les `delay` secondes. Les `options`
+    (output_file, checkpoint_file, resume, ...) sont celles de `crawl_async`.
+    """
+    return asyncio.run(
+        crawl_async(
+            start_url, max_pages, concurrency, delay, priority=priority, **options
+        )
+    )
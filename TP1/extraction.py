@@ -1,34 +1,32 @@
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
 import time
 
+from TP1.fetcher import Fetcher
+from TP1.robots import RobotsCache
+
+# Téléchargements partagés par défaut : une session (pool de connexions) par hôte
+fetcher = Fetcher()
+# Cache des robots.txt partagé par défaut (un téléchargement par hôte)
+robots_cache = RobotsCache(http_get=fetcher.get)
+
 
 # Configuration initiale
-def is_allowed_to_crawl(url, robots_txt_url):
-    """Vérifie si le crawler est autorisé à accéder à une page via robots.txt."""
-    try:
-        robots_txt = requests.get(robots_txt_url).text
-        if "Disallow" in robots_txt:
-            disallowed_paths = [
-                line.split(":")[1].strip()
-                for line in robots_txt.split("\n")
-                if line.startswith("Disallow")
-            ]
-            for path in disallowed_paths:
-                if urlparse(url).path.startswith(path):
-                    return False
-        return True
-    except Exception as e:
-        print(f"Erreur en vérifiant robots.txt : {e}")
-        return False
+def is_allowed_to_crawl(url, robots_txt_url=None):
+    """Vérifie si le crawler est autorisé à accéder à une page via le robots.txt de son hôte.
+
+    Le robots.txt est lu dans `robots_cache` : seul le premier appel pour un hôte fait une requête.
+    `robots_txt_url` est gardé pour compatibilité : le robots.txt est celui de l'hôte de `url`.
+    """
+    return robots_cache.is_allowed(url)
 
 
 def polite_request(url, delay=1):
     """Effectue une requête HTTP avec un délai pour respecter la politesse."""
     time.sleep(delay)
     try:
-        response = requests.get(url)
+        response = fetcher.get(url)
         response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
@@ -42,31 +40,24 @@ def parse_html(content):
     return BeautifulSoup(content, "html.parser")
 
 
+def prioritize_links(links):
+    """Met les liens contenant 'product' en premier, en gardant l'ordre de la page."""
+    product_links = [link for link in links if "product" in link]
+    other_links = [link for link in links if "product" not in link]
+    return product_links + other_links
+
+
 def extract_page_info(soup, base_url):
     """Extrait le titre, le premier paragraphe et les liens pertinents d'une page, en priorisant les pages 'product'."""
     title = soup.title.string.strip() if soup.title else "Titre non disponible"
-    paragraph = soup.find("p").text.strip() if soup.find("p") else ""
+    first_paragraph = soup.find("p")
+    paragraph = first_paragraph.text.strip() if first_paragraph else ""
 
     # Priorité aux liens contenant 'product'
     links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)]
-    product_links = [link for link in links if "product" in link]
-    other_links = [link for link in links if "product" not in link]
-
-    # Retourne d'abord les liens 'product', puis les autres
-    prioritized_links = product_links + other_links
 
     return {
         "title": title,
         "first_paragraph": paragraph,
-        "links": prioritized_links,  # Les liens sont triés avec priorité
+        "links": prioritize_links(links),  # Les liens sont triés avec priorité
     }
-
-
-# Gestion des URLs
-def add_url_to_queue(url, visited, priority_queue, normal_queue):
-    """Ajoute une URL à la file d'attente appropriée (prioritaire ou normale) si elle n'a pas été visitée."""
-    if url not in visited and url not in priority_queue and url not in normal_queue:
-        if "product" in url:  # Les liens avec 'product' vont dans la pile prioritaire
-            priority_queue.append(url)
-        else:  # Les autres liens vont dans la pile normale
-            normal_queue.append(url)
@@ -0,0 +1,110 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from TP1.extraction import extract_page_info, parse_html, prioritize_links
+
+# Extracteur utilisé par défaut par le crawler
+DEFAULT_EXTRACTOR = "fast"
+
+
+# Extracteur BeautifulSoup (arbre complet de la page)
+def extract_bs4(html, base_url):
+    """Extraction historique : construit l'arbre BeautifulSoup puis le parcourt."""
+    return extract_page_info(parse_html(html), base_url)
+
+
+# Extracteur rapide (une seule passe, sans arbre)
+# Balises sans balise fermante : jamais ouvertes dans la pile
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+# Balises dont le texte n'est pas compté dans celui d'un paragraphe (comme BeautifulSoup)
+NON_TEXT_TAGS = {"script", "style", "template"}
+
+
+class _PageInfoParser(HTMLParser):
+    """Parcourt la page une seule fois et ne garde que le titre, le premier paragraphe et les liens.
+
+    Seule la pile des balises ouvertes est tenue à jour, pour fermer le premier <p> au même
+    endroit que BeautifulSoup (à sa balise fermante ou à celle d'un de ses ancêtres).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []  # Balises ouvertes
+        self.title = None  # Morceaux du texte du premier <title>
+        self.title_level = None  # Position du premier <title> dans la pile tant qu'il est ouvert
+        self.paragraph = None  # Morceaux du texte du premier <p>
+        self.paragraph_level = None  # Position du premier <p> dans la pile tant qu'il est ouvert
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href":
+                    self.hrefs.append(value or "")
+                    break
+        if tag in VOID_TAGS:
+            return
+        if tag == "title" and self.title is None:
+            self.title = []
+            self.title_level = len(self.stack)
+        elif tag == "p" and self.paragraph is None:
+            self.paragraph = []
+            self.paragraph_level = len(self.stack)
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # <tag/> : ouverte puis fermée aussitôt
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # Ferme la dernière balise `tag` ouverte et tout ce qui est ouvert à l'intérieur
+        for level in range(len(self.stack) - 1, -1, -1):
+            if self.stack[level] == tag:
+                del self.stack[level:]
+                if self.title_level is not None and self.title_level >= level:
+                    self.title_level = None
+                if self.paragraph_level is not None and self.paragraph_level >= level:
+                    self.paragraph_level = None
+                return
+
+    def handle_data(self, data):
+        if self.title_level is not None:
+            self.title.append(data)
+        if self.paragraph_level is not None and self.stack[-1] not in NON_TEXT_TAGS:
+            self.paragraph.append(data)
+
+
+def extract_fast(html, base_url):
+    """Même résultat que `extract_bs4`, en une passe de html.parser sans construire d'arbre."""
+    parser = _PageInfoParser()
+    parser.feed(html)
+    parser.close()
+    title = "".join(parser.title).strip() if parser.title is not None else "Titre non disponible"
+    paragraph = "".join(parser.paragraph).strip() if parser.paragraph is not None else ""
+    links = [urljoin(base_url, href) for href in parser.hrefs]
+    return {
+        "title": title,
+        "first_paragraph": paragraph,
+        "links": prioritize_links(links),  # Les liens sont triés avec priorité
+    }
+
+
+# Choix de l'extracteur
+EXTRACTORS = {"bs4": extract_bs4, "fast": extract_fast}
+
+
+def extract(html, base_url, backend=DEFAULT_EXTRACTOR):
+    """Extrait le titre, le premier paragraphe et les liens d'une page avec l'extracteur `backend`.
+
+    Fonction de module (donc utilisable dans un pool de processus).
+    """
+    if backend not in EXTRACTORS:
+        raise ValueError(
+            f"Extracteur inconnu : '{backend}'. Choisir parmi {sorted(EXTRACTORS)}."
+        )
+    return EXTRACTORS[backend](html, base_url)
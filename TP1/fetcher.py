@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from TP1.robots import USER_AGENT
+
+# Nombre maximal de connexions gardées ouvertes par hôte
+POOL_SIZE = 16
+# Délai maximal (en secondes) d'une requête
+TIMEOUT = 10
+VALIDATORS_FILE = "validators.json"
+PAGES_DIR = "pages"
+
+
+class FetchResult:
+    """Résultat d'un téléchargement.
+
+    - `not_modified` : le serveur a répondu 304, la page n'a pas changé depuis le dernier crawl.
+    - `content_hash` : empreinte de l'URL et du contenu, clé du cache des pages extraites.
+    - `text` : contenu de la page (None si `not_modified`).
+    """
+
+    def __init__(self, url, status_code, text, content_hash, not_modified=False):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.content_hash = content_hash
+        self.not_modified = not_modified
+
+
+class Fetcher:
+    """Couche de téléchargement du crawler.
+
+    - Une `requests.Session` par hôte : les connexions TCP/TLS sont réutilisées.
+    - Avec `cache_dir`, l'ETag et le Last-Modified de chaque page sont gardés (dans
+      `validators.json`) et renvoyés au recrawl (If-None-Match / If-Modified-Since) ;
+      les informations extraites de chaque page sont gardées sur disque par empreinte
+      de contenu, pour ne pas ré-extraire une page inchangée (304 ou même contenu).
+    """
+
+    def __init__(self, cache_dir=None, user_agent=USER_AGENT, timeout=TIMEOUT):
+        self.cache_dir = cache_dir
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.validators = {}  # URL -> {"etag", "last_modified", "content_hash"}
+        if cache_dir:
+            os.makedirs(os.path.join(cache_dir, PAGES_DIR), exist_ok=True)
+            validators_path = os.path.join(cache_dir, VALIDATORS_FILE)
+            if os.path.exists(validators_path):
+                with open(validators_path, "r", encoding="utf-8") as f:
+                    self.validators = json.load(f)
+
+    # Sessions
+    def session(self, url):
+        """Session (pool de connexions) de l'hôte de `url`."""
+        parsed = urlparse(url)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                session.headers["User-Agent"] = self.user_agent
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount(host, adapter)
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    def get(self, url, **kwargs):
+        """`requests.get` via la session de l'hôte."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session(url).get(url, **kwargs)
+
+    # Téléchargement conditionnel
+    def fetch(self, url):
+        """Télécharge `url`, de façon conditionnelle si la page a déjà été crawlée.
+
+        Retourne un FetchResult, ou None en cas d'erreur HTTP ou réseau.
+        """
+        headers = {}
+        known = self.validators.get(url)
+        # Requête conditionnelle seulement si l'extraction de la page est en cache
+        if known and self.has_page_info(known["content_hash"]):
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+        try:
+            response = self.get(url, headers=headers)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur lors de la requête HTTP : {e}")
+            return None
+
+        if response.status_code == 304 and headers:
+            return FetchResult(url, 304, None, known["content_hash"], not_modified=True)
+
+        content_hash = hashlib.sha256(
+            url.encode("utf-8") + b"\0" + response.content
+        ).hexdigest()
+        if self.cache_dir:
+            self.validators[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": content_hash,
+            }
+        return FetchResult(url, response.status_code, response.text, content_hash)
+
+    # Cache des pages extraites
+    def _page_path(self, content_hash):
+        return os.path.join(self.cache_dir, PAGES_DIR, content_hash[:2], f"{content_hash}.json")
+
+    def has_page_info(self, content_hash):
+        """Indique si les informations extraites de ce contenu sont en cache."""
+        return bool(self.cache_dir) and os.path.exists(self._page_path(content_hash))
+
+    def load_page_info(self, content_hash):
+        """Informations extraites d'un contenu déjà vu (None si absent ou sans cache)."""
+        if not self.cache_dir:
+            return None
+        path = self._page_path(content_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def store_page_info(self, content_hash, page_info):
+        """Garde sur disque les informations extraites d'un contenu."""
+        if not self.cache_dir:
+            return
+        path = self._page_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(page_info, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def save(self):
+        """Enregistre les ETag / Last-Modified pour le prochain crawl."""
+        if not self.cache_dir:
+            return
+        path = os.path.join(self.cache_dir, VALIDATORS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(dict(self.validators), f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
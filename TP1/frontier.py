@@ -0,0 +1,89 @@
+import heapq
+from urllib.parse import urlsplit, urlunsplit
+
+# Ports implicites, retirés des URLs normalisées
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+# Normalisation des URLs
+def normalize_url(url):
+    """Forme canonique d'une URL, pour ne pas crawler deux fois la même page.
+
+    Schéma et hôte en minuscules, port par défaut retiré, fragment (#...) supprimé
+    et paramètres de requête triés. Le slash final du chemin est gardé : l'URL
+    normalisée sert de base aux liens relatifs de la page, et `page2` vu depuis
+    `/docs/` mène à `/docs/page2`, mais à `/page2` depuis `/docs`.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    if "@" in parts.netloc:  # Identifiants éventuels, gardés tels quels
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+    path = parts.path or "/"
+    query = "&".join(sorted(param for param in parts.query.split("&") if param))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+# Priorités
+def product_priority(url):
+    """Priorité par défaut : les liens 'product' passent avant les autres."""
+    return 1 if "product" in url else 0
+
+
+# Frontière du crawl
+class Frontier:
+    """File des URLs à crawler : O(log n) par ajout et par retrait, O(1) pour le dédoublonnage.
+
+    - Les URLs sont normalisées (`normalize_url`) et chaque URL n'entre qu'une fois
+      (ensemble `seen` de toutes les URLs déjà rencontrées).
+    - Les URLs sortent par priorité décroissante (fonction `priority(url) -> nombre`,
+      par défaut `product_priority`), puis dans leur ordre d'arrivée.
+    """
+
+    def __init__(self, priority=product_priority):
+        self.priority = priority
+        self.heap = []  # (-priorité, numéro d'arrivée, url)
+        self.seen = set()
+        self.next_number = 0  # Numéro d'arrivée de la prochaine URL
+
+    def add(self, url):
+        """Ajoute `url` si elle n'a jamais été vue ; retourne True si elle a été ajoutée."""
+        url = normalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        heapq.heappush(self.heap, (-self.priority(url), self.next_number, url))
+        self.next_number += 1
+        return True
+
+    def pop(self):
+        """Retire et retourne l'URL la plus prioritaire."""
+        return heapq.heappop(self.heap)[2]
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __bool__(self):
+        return bool(self.heap)
+
+    def state(self, pending=()):
+        """État sérialisable en JSON de la frontière (pour un checkpoint).
+
+        Les URLs de `pending` (retirées mais pas encore crawlées) y sont remises en tête
+        de leur niveau de priorité.
+        """
+        heap = [list(entry) for entry in self.heap]
+        heap += [[-self.priority(url), -1, url] for url in pending]
+        return {"heap": heap, "seen": list(self.seen), "next_number": self.next_number}
+
+    @classmethod
+    def from_state(cls, state, priority=product_priority):
+        """Recrée une frontière à partir de `state` (voir `Frontier.state`)."""
+        frontier = cls(priority)
+        frontier.heap = [tuple(entry) for entry in state["heap"]]
+        heapq.heapify(frontier.heap)
+        frontier.seen = set(state["seen"])
+        frontier.next_number = state["next_number"]
+        return frontier
@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+# Nom du crawler, envoyé dans le User-Agent et cherché dans les groupes du robots.txt
+USER_AGENT = "ensai-crawler"
+# Durée de validité (en secondes) d'un robots.txt en cache
+ROBOTS_TTL = 24 * 3600
+# Durée de validité d'un échec (erreur réseau ou 5xx) : on réessaie plus tôt
+ROBOTS_NEGATIVE_TTL = 10 * 60
+
+
+# Règles d'un robots.txt
+def _compile_pattern(pattern):
+    """Compile un chemin de règle ('*' = n'importe quelle suite, '$' final = fin d'URL) en regex."""
+    anchored = pattern.endswith("$")
+    if anchored:
+        pattern = pattern[:-1]
+    regex = ".*".join(re.escape(part) for part in pattern.split("*"))
+    return re.compile(regex + ("$" if anchored else ""))
+
+
+class RobotsRules:
+    """Règles d'un robots.txt pour un user-agent, compilées une fois pour toutes.
+
+    - Seul le groupe le plus spécifique pour `user_agent` est retenu (sinon le groupe '*').
+    - La règle Allow/Disallow la plus longue qui correspond au chemin l'emporte ;
+      à longueur égale, Allow l'emporte.
+    """
+
+    def __init__(self, rules=(), crawl_delay=None, allow_all=True):
+        self.rules = sorted(rules, key=lambda rule: (-rule[0], not rule[1]))
+        self.crawl_delay = crawl_delay
+        self.allow_all = allow_all  # Décision quand aucune règle ne correspond
+
+    @classmethod
+    def parse(cls, robots_txt, user_agent=USER_AGENT):
+        """Parse le contenu d'un robots.txt et garde les règles s'appliquant à `user_agent`."""
+        groups = []  # [(agents, rules, crawl_delay)]
+        agents, rules, crawl_delay = [], [], None
+        in_rules = False
+        for line in robots_txt.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            field, value = (part.strip() for part in line.split(":", 1))
+            field = field.lower()
+            if field == "user-agent":
+                if in_rules:  # Un User-agent après des règles ouvre un nouveau groupe
+                    groups.append((agents, rules, crawl_delay))
+                    agents, rules, crawl_delay = [], [], None
+                    in_rules = False
+                agents.append(value.lower())
+            elif field in ("allow", "disallow") and agents:
+                in_rules = True
+                if value:  # "Disallow:" vide n'interdit rien
+                    rules.append((len(value), field == "allow", _compile_pattern(value)))
+            elif field == "crawl-delay" and agents:
+                in_rules = True
+                try:
+                    crawl_delay = float(value)
+                except ValueError:
+                    pass
+        if agents:
+            groups.append((agents, rules, crawl_delay))
+
+        # Groupe le plus spécifique : le nom d'agent le plus long contenu dans le nôtre
+        user_agent = user_agent.lower()
+        best_length, selected_rules, selected_delay = -1, [], None
+        for group_agents, group_rules, group_delay in groups:
+            length = max(
+                0 if agent == "*" else len(agent) if agent in user_agent else -1
+                for agent in group_agents
+            )
+            if length < 0 or length < best_length:
+                continue
+            if length > best_length:
+                best_length, selected_rules, selected_delay = length, [], None
+            # Les groupes d'un même agent sont fusionnés
+            selected_rules = selected_rules + group_rules
+            if group_delay is not None:
+                selected_delay = group_delay
+        return cls(selected_rules, selected_delay)
+
+    def is_allowed(self, url):
+        """Indique si `url` peut être crawlée selon ces règles."""
+        parsed = urlparse(url)
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        for _, allow, regex in self.rules:
+            if regex.match(path):
+                return allow
+        return self.allow_all
+
+
+# Cache par hôte
+class RobotsCache:
+    """Cache des robots.txt par hôte (schéma + domaine), partagé entre threads.
+
+    - Un robots.txt est téléchargé au plus une fois par `ttl` secondes et par hôte.
+    - Un 4xx (pas de robots.txt) autorise tout ; une erreur réseau ou un 5xx interdit
+      tout l'hôte, et ce résultat négatif est gardé `negative_ttl` secondes.
+    - `http_get` est la fonction de téléchargement (par défaut `requests.get`, par exemple
+      `Fetcher.get` pour réutiliser les connexions du crawler).
+    """
+
+    def __init__(
+        self,
+        user_agent=USER_AGENT,
+        ttl=ROBOTS_TTL,
+        negative_ttl=ROBOTS_NEGATIVE_TTL,
+        http_get=None,
+    ):
+        self.http_get = http_get or requests.get
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}  # Hôte -> (règles, instant d'expiration)
+        self.locks = {}  # Un verrou par hôte : un seul téléchargement à la fois
+        self.lock = threading.Lock()
+
+    def fetch(self, robots_txt_url):
+        """Télécharge et compile un robots.txt ; retourne (règles, durée de validité)."""
+        try:
+            response = self.http_get(
+                robots_txt_url, headers={"User-Agent": self.user_agent}, timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur en vérifiant robots.txt : {e}")
+            return RobotsRules(allow_all=False), self.negative_ttl
+        if response.status_code >= 500:
+            return RobotsRules(allow_all=False), self.negative_ttl
+        if response.status_code >= 400:
+            return RobotsRules(), self.ttl
+        return RobotsRules.parse(response.text, self.user_agent), self.ttl
+
+    def get(self, url):
+        """Retourne les règles du robots.txt de l'hôte de `url`, téléchargé si absent ou expiré."""
+        parsed = urlparse(url)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        entry = self.entries.get(host)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        with self.lock:
+            host_lock = self.locks.setdefault(host, threading.Lock())
+        with host_lock:
+            entry = self.entries.get(host)  # Peut-être téléchargé entre-temps
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            rules, ttl = self.fetch(f"{host}/robots.txt")
+            self.entries[host] = (rules, time.monotonic() + ttl)
+            return rules
+
+    def is_allowed(self, url):
+        """Indique si `url` peut être crawlée (recherche en mémoire une fois le robots.txt en cache)."""
+        return self.get(url).is_allowed(url)
+
+    def crawl_delay(self, url):
+        """Crawl-delay de l'hôte de `url` (None s'il n'en précise pas)."""
+        return self.get(url).crawl_delay
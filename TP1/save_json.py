@@ -20,3 +20,75 @@ def save_results_to_json(data, output_file, overwrite=False):
         print(f"Résultats sauvegardés dans '{output_file}'.")
     except Exception as e:
         print(f"Erreur lors de l'enregistrement des résultats : {e}")
+
+
+def open_jsonl_output(output_file, resume=False, overwrite=False):
+    """Ouvre le fichier JSONL où les résultats sont écrits au fil du crawl (une page par ligne).
+
+    - Avec `resume=True`, le fichier est ouvert en ajout pour continuer un crawl interrompu.
+    - Sinon, mêmes règles que `save_results_to_json` si le fichier existe déjà.
+    """
+    if resume:
+        return open(output_file, "a", encoding="utf-8")
+    if os.path.exists(output_file) and not overwrite:
+        raise FileExistsError(
+            f"Le fichier '{output_file}' existe déjà. "
+            "Utilisez `overwrite=True` pour l'écraser ou `resume=True` pour reprendre le crawl."
+        )
+    return open(output_file, "w", encoding="utf-8")
+
+
+def write_result_line(f, data):
+    """Écrit un résultat sur une ligne du fichier JSONL, sur disque immédiatement."""
+    f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+def read_results_jsonl(output_file, offset=0):
+    """Lit les résultats d'un fichier JSONL à partir de la position `offset` (en octets)."""
+    with open(output_file, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break  # Dernière ligne tronquée par un arrêt brutal
+
+
+def save_checkpoint(state, checkpoint_file):
+    """Enregistre un checkpoint du crawl de façon atomique (fichier temporaire puis renommage)."""
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def load_checkpoint(checkpoint_file):
+    """Charge un checkpoint écrit par `save_checkpoint` (None s'il n'existe pas)."""
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def truncate_partial_line(output_file, chunk_size=1 << 16):
+    """Supprime la dernière ligne d'un fichier JSONL si elle est incomplète (arrêt pendant l'écriture)."""
+    if not os.path.exists(output_file):
+        return
+    with open(output_file, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                if start + newline + 1 != end:
+                    f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
@@ -0,0 +1,37 @@
+import asyncio
+from urllib.parse import urlparse
+
+
+# Politesse par hôte
+class HostScheduler:
+    """Espace les requêtes vers un même hôte d'au moins `delay` secondes.
+
+    Les requêtes vers des hôtes différents ne s'attendent pas entre elles : seul
+    le délai de l'hôte de l'URL compte. Un hôte peut avoir son propre délai
+    (par exemple le Crawl-delay de son robots.txt) via `set_delay`.
+    """
+
+    def __init__(self, delay=1):
+        self.delay = delay
+        self.host_delays = {}  # Délai propre à certains hôtes
+        self.next_allowed = {}  # Hôte -> instant (horloge de la boucle) de la prochaine requête
+        self.locks = {}  # Un verrou par hôte pour réserver les créneaux dans l'ordre
+
+    def set_delay(self, host, delay):
+        """Fixe le délai minimal entre deux requêtes vers `host`."""
+        self.host_delays[host] = delay
+
+    def get_delay(self, host):
+        """Délai minimal entre deux requêtes vers `host`."""
+        return self.host_delays.get(host, self.delay)
+
+    async def wait(self, url):
+        """Attend que l'hôte de `url` puisse recevoir une nouvelle requête et réserve ce créneau."""
+        host = urlparse(url).netloc
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait_time = self.next_allowed.get(host, 0) - loop.time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            self.next_allowed[host] = loop.time() + self.get_delay(host)
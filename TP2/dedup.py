@@ -0,0 +1,95 @@
+import hashlib
+from collections import Counter, defaultdict
+
+from TP2.id_extraction import extract_product_id
+from TP2.my_tokenizer import my_tokenizer
+
+SIMHASH_BITS = 64
+# Two documents whose SimHashes differ by at most this many bits are near-duplicates
+MAX_HAMMING_DISTANCE = 3
+
+
+# ---------------------- SimHash Fingerprints ---------------------- #
+def _token_hash(token):
+    """Stable 64-bit hash of a token."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens):
+    """Computes the 64-bit SimHash of a bag of tokens (weighted by count): similar texts get close fingerprints."""
+    weights = [0] * SIMHASH_BITS
+    for token, count in Counter(tokens).items():
+        token_hash = _token_hash(token)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if token_hash >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+def product_tokens(product, stopwords):
+    """Tokens describing a product body: title, description and feature values."""
+    tokens = my_tokenizer(product.get("title", ""), stopwords)
+    tokens += my_tokenizer(product.get("description", ""), stopwords)
+    for value in product.get("product_features", {}).values():
+        tokens += my_tokenizer(value, stopwords)
+    return tokens
+
+
+# ---------------------- Online Deduplication ---------------------- #
+class Deduplicator:
+    """Streaming dedup stage: maps each product to the canonical document of its cluster.
+
+    - Variants (same product ID, see `extract_product_id`) belong to the first URL seen for that ID.
+    - Other products are compared by SimHash to the canonical documents seen so far. LSH keeps this cheap:
+      the fingerprint is cut into `max_distance + 1` bands, so two fingerprints within `max_distance` bits
+      share at least one band and only documents of the same band buckets are compared.
+    Duplicates are recorded in `variants` ({canonical URL: [duplicate URLs]}).
+    """
+
+    def __init__(self, stopwords, max_distance=MAX_HAMMING_DISTANCE):
+        self.stopwords = stopwords
+        self.max_distance = max_distance
+        self.n_bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.n_bands
+        self.buckets = [defaultdict(list) for _ in range(self.n_bands)]
+        self.product_canonical = {}  # Product ID -> canonical URL
+        self.variants = defaultdict(list)
+
+    def _bands(self, fingerprint):
+        """Values of the LSH bands of a fingerprint."""
+        mask = (1 << self.band_bits) - 1
+        return [fingerprint >> (band * self.band_bits) & mask for band in range(self.n_bands)]
+
+    def _near_duplicate(self, fingerprint):
+        """Canonical URL of an already seen document within `max_distance` bits, or None."""
+        for band, value in enumerate(self._bands(fingerprint)):
+            for other, canonical_url in self.buckets[band].get(value, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return canonical_url
+        return None
+
+    def canonical_url(self, product):
+        """Returns the canonical URL of `product` if it duplicates an already seen one, else registers it
+        as a new canonical document and returns None."""
+        url = product["url"]
+        product_id, _ = extract_product_id(url)
+        if product_id in self.product_canonical:
+            canonical_url = self.product_canonical[product_id]
+            self.variants[canonical_url].append(url)
+            return canonical_url
+
+        tokens = product_tokens(product, self.stopwords)
+        fingerprint = simhash(tokens) if tokens else None  # Empty bodies are never merged
+        canonical_url = self._near_duplicate(fingerprint) if tokens else None
+        if canonical_url is not None:
+            self.variants[canonical_url].append(url)
+        elif fingerprint is not None:
+            for band, value in enumerate(self._bands(fingerprint)):
+                self.buckets[band][value].append((fingerprint, url))
+        if product_id is not None:
+            self.product_canonical[product_id] = canonical_url or url
+        return canonical_url
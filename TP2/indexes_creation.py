@@ -1,43 +1,86 @@
+from TP2.dedup import Deduplicator
 from TP2.my_tokenizer import my_tokenizer
 from collections import defaultdict
+from array import array
+import json
+
+# Text fields that get both an inverted and a positional index
+TEXT_FIELDS = ["title", "description"]
+
+
+# ---------------------- Create Document ID Dictionary ---------------------- #
+def create_doc_ids(products):
+    """Assigns a dense integer ID to every product URL, in file order (URL -> ID)."""
+    doc_ids = {}
+    for product in products:
+        product_url = product.get("url", "")
+        if product_url and product_url not in doc_ids:
+            doc_ids[product_url] = len(doc_ids)
+    return doc_ids
+
+
+def _append_posting(postings, doc_key):
+    """Appends a document to a postings list, skipping consecutive duplicates of integer IDs."""
+    if isinstance(doc_key, int) and postings and postings[-1] == doc_key:
+        return
+    postings.append(doc_key)
+
+
+def _to_int_arrays(index):
+    """Turns the integer postings lists of an index into sorted `array('I')`."""
+    return {token: array("I", sorted(set(postings))) for token, postings in index.items()}
 
 
 # ---------------------- Create Inverted Index ---------------------- #
-def create_inverted_index(products, field, stopwords):
-    """Creates an inverted index mapping words in a given field (title, description) to product URLs."""
+def create_inverted_index(products, field, stopwords, doc_ids=None):
+    """Creates an inverted index mapping words in a given field (title, description) to product URLs.
+
+    If `doc_ids` (URL -> ID, see `create_doc_ids`) is given, postings are sorted integer arrays instead.
+    """
     index = defaultdict(list)
     for product in products:
         product_url = product.get("url", "")
         if product_url and field in product:
+            doc_key = doc_ids[product_url] if doc_ids is not None else product_url
             tokens = my_tokenizer(product[field], stopwords)
             for token in tokens:
-                index[token].append(product_url)
-    return index
+                _append_posting(index[token], doc_key)
+    return _to_int_arrays(index) if doc_ids is not None else index
 
 
 # ---------------------- Create Reviews Index ---------------------- #
-def create_reviews_index(products):
+def _review_entry(product):
+    """Computes the total number of reviews, average rating, and latest rating of a product (None if unrated)."""
+    reviews = product["product_reviews"]
+    scores = [review.get("rating", 0) for review in reviews if "rating" in review]
+    if not scores:
+        return None
+    return {
+        "total_reviews": len(scores),
+        "average_score": sum(scores) / len(scores),
+        "latest_score": scores[-1],  # Most recent review score
+    }
+
+
+def create_reviews_index(products, doc_ids=None):
     """Creates an index storing the total number of reviews, average rating, and latest rating per product."""
     index = {}
     for product in products:
         product_url = product.get("url", "")
         if product_url and "product_reviews" in product:
-            reviews = product["product_reviews"]
-            scores = [
-                review.get("rating", 0) for review in reviews if "rating" in review
-            ]
-            if scores:
-                index[product_url] = {
-                    "total_reviews": len(scores),
-                    "average_score": sum(scores) / len(scores),
-                    "latest_score": scores[-1],  # Most recent review score
-                }
+            doc_key = doc_ids[product_url] if doc_ids is not None else product_url
+            entry = _review_entry(product)
+            if entry:
+                index[doc_key] = entry
     return index
 
 
 # ---------------------- Create Feature Index ---------------------- #
-def create_feature_index(products, feature, stopwords):
-    """Creates an inverted index mapping feature values (e.g., brand, made in) to product URLs."""
+def create_feature_index(products, feature, stopwords, doc_ids=None):
+    """Creates an inverted index mapping feature values (e.g., brand, made in) to product URLs.
+
+    If `doc_ids` is given, postings are sorted integer arrays instead.
+    """
     index = defaultdict(list)
     for product in products:
         product_url = product.get("url", "")
@@ -46,20 +89,102 @@ def create_feature_index(products, feature, stopwords):
             and "product_features" in product
             and feature in product["product_features"]
         ):
+            doc_key = doc_ids[product_url] if doc_ids is not None else product_url
             tokens = my_tokenizer(product["product_features"][feature], stopwords)
             for token in tokens:
-                index[token].append(product_url)
-    return index
+                _append_posting(index[token], doc_key)
+    return _to_int_arrays(index) if doc_ids is not None else index
 
 
 # ---------------------- Create Positional Index ---------------------- #
-def create_positional_index(products, field, stopwords):
-    """Creates an inverted index that stores word positions in the given field."""
+def create_positional_index(products, field, stopwords, doc_ids=None):
+    """Creates an inverted index that stores word positions in the given field.
+
+    If `doc_ids` is given, documents are keyed by their integer ID instead of their URL.
+    """
     index = defaultdict(lambda: defaultdict(list))
     for product in products:
         product_url = product.get("url", "")
         if product_url and field in product:
+            doc_key = doc_ids[product_url] if doc_ids is not None else product_url
             tokens = my_tokenizer(product[field], stopwords)
             for pos, token in enumerate(tokens):
-                index[token][product_url].append(pos)
+                index[token][doc_key].append(pos)
     return index
+
+
+# ---------------------- Build Every Index in a Single Pass ---------------------- #
+def new_index_accumulator():
+    """Creates the empty in-memory indexes filled by `add_product_to_indexes`."""
+    accumulator = {"reviews": {}, "features": defaultdict(lambda: defaultdict(list))}
+    for field in TEXT_FIELDS:
+        accumulator[field] = defaultdict(list)
+        accumulator[f"{field}_pos"] = defaultdict(lambda: defaultdict(list))
+    return accumulator
+
+
+def add_product_to_indexes(accumulator, product, doc_id, stopwords):
+    """Adds one product to every index of the accumulator, tokenizing each field once.
+
+    The title and description tokens feed both the inverted and the positional index; feature keys are
+    discovered on the fly. Returns the number of postings added (used to bound memory).
+    """
+    added = 0
+    for field in TEXT_FIELDS:
+        if field in product:
+            tokens = my_tokenizer(product[field], stopwords)
+            for pos, token in enumerate(tokens):
+                _append_posting(accumulator[field][token], doc_id)
+                accumulator[f"{field}_pos"][token][doc_id].append(pos)
+            added += 2 * len(tokens)
+
+    if "product_reviews" in product:
+        entry = _review_entry(product)
+        if entry:
+            accumulator["reviews"][doc_id] = entry
+
+    for feature, value in product.get("product_features", {}).items():
+        tokens = my_tokenizer(value, stopwords)
+        for token in tokens:
+            _append_posting(accumulator["features"][feature][token], doc_id)
+        added += len(tokens)
+    return added
+
+
+def build_indexes_single_pass(filepath, stopwords, dedup=False):
+    """Streams a JSONL file once and fills every index in the same pass, with integer doc IDs.
+
+    Each product is read line by line and each field is tokenized once (see `add_product_to_indexes`).
+    Returns {"doc_ids", "title", "description", "title_pos", "description_pos", "reviews", "features": {feature: index}}.
+    With `dedup`, variants and near-duplicates are collapsed (see `Deduplicator`): only the canonical document of
+    each cluster is indexed, and the result also has "variants" ({canonical URL: [duplicate URLs]}).
+    """
+    doc_ids = {}
+    accumulator = new_index_accumulator()
+    deduplicator = Deduplicator(stopwords) if dedup else None
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            product = json.loads(line)
+            product_url = product.get("url", "")
+            if not product_url:
+                continue
+            if deduplicator and product_url not in doc_ids:
+                if deduplicator.canonical_url(product) is not None:
+                    continue
+            doc_id = doc_ids.setdefault(product_url, len(doc_ids))
+            add_product_to_indexes(accumulator, product, doc_id, stopwords)
+
+    indexes = {"doc_ids": doc_ids, "reviews": accumulator["reviews"]}
+    for field in TEXT_FIELDS:
+        indexes[field] = _to_int_arrays(accumulator[field])
+        indexes[f"{field}_pos"] = accumulator[f"{field}_pos"]
+    indexes["features"] = {
+        feature: _to_int_arrays(index)
+        for feature, index in sorted(accumulator["features"].items())
+    }
+    if deduplicator:
+        indexes["variants"] = dict(deduplicator.variants)
+    return indexes
@@ -0,0 +1,241 @@
+import heapq
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from TP2.indexes_creation import (
+    TEXT_FIELDS,
+    add_product_to_indexes,
+    new_index_accumulator,
+)
+
+# Prefix of the feature indexes in the sorted runs (e.g. "feature:brand")
+FEATURE_PREFIX = "feature:"
+
+
+# ---------------------- Split the Input into Byte Ranges ---------------------- #
+def split_byte_ranges(filepath, n_chunks):
+    """Splits a JSONL file into at most `n_chunks` byte ranges [start, end) aligned on line boundaries."""
+    size = os.path.getsize(filepath)
+    boundaries = [0]
+    with open(filepath, "rb") as f:
+        for i in range(1, n_chunks):
+            f.seek(max(size * i // n_chunks, boundaries[-1]))
+            if f.tell() > 0:
+                f.readline()  # Move to the start of the next line
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start
+    ]
+
+
+def _read_range(filepath, start, end):
+    """Yields the products of the lines starting in the byte range [start, end)."""
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+# ---------------------- Worker: Build and Spill Sorted Runs ---------------------- #
+def _run_records(accumulator):
+    """Yields the (index_name, term, postings) records of an accumulator, sorted by index name then term."""
+    indexes = {}
+    for field in TEXT_FIELDS:
+        indexes[field] = accumulator[field]
+        indexes[f"{field}_pos"] = accumulator[f"{field}_pos"]
+    for feature, index in accumulator["features"].items():
+        indexes[FEATURE_PREFIX + feature] = index
+
+    for index_name in sorted(indexes):
+        index = indexes[index_name]
+        for term in sorted(index):
+            postings = index[term]
+            if isinstance(postings, dict):
+                postings = sorted(postings.items())
+            yield index_name, term, postings
+
+
+def _spill(accumulator, chunk_no, run_no, run_dir, reviews_file):
+    """Writes the accumulator to disk as a sorted run (one JSON record per line) and returns the run path."""
+    run_path = os.path.join(run_dir, f"run_{chunk_no:05d}_{run_no:05d}.jsonl")
+    with open(run_path, "w", encoding="utf-8") as f:
+        for index_name, term, postings in _run_records(accumulator):
+            record = [index_name, term, chunk_no, run_no, postings]
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    for doc_id, entry in accumulator["reviews"].items():
+        reviews_file.write(json.dumps([doc_id, entry]) + "\n")
+    return run_path
+
+
+def _build_chunk(filepath, chunk_no, start, end, stopwords, run_dir, max_postings):
+    """Indexes one byte range (SPIMI): fills in-memory indexes with chunk-local doc IDs and spills a
+    sorted run to disk each time `max_postings` postings are held in memory.
+
+    Returns (chunk_no, number of docs, run paths, reviews path, urls path).
+    """
+    urls_path = os.path.join(run_dir, f"urls_{chunk_no:05d}.txt")
+    reviews_path = os.path.join(run_dir, f"reviews_{chunk_no:05d}.jsonl")
+    run_paths = []
+    n_docs = 0
+    in_memory = 0
+    accumulator = new_index_accumulator()
+
+    with open(urls_path, "w", encoding="utf-8") as urls_file, open(
+        reviews_path, "w", encoding="utf-8"
+    ) as reviews_file:
+        for product in _read_range(filepath, start, end):
+            product_url = product.get("url", "")
+            if not product_url:
+                continue
+            urls_file.write(product_url + "\n")
+            in_memory += add_product_to_indexes(accumulator, product, n_docs, stopwords)
+            n_docs += 1
+            if in_memory >= max_postings:
+                run_paths.append(
+                    _spill(accumulator, chunk_no, len(run_paths), run_dir, reviews_file)
+                )
+                accumulator = new_index_accumulator()
+                in_memory = 0
+        if in_memory or accumulator["reviews"]:
+            run_paths.append(
+                _spill(accumulator, chunk_no, len(run_paths), run_dir, reviews_file)
+            )
+
+    return chunk_no, n_docs, run_paths, reviews_path, urls_path
+
+
+def _build_chunk_task(args):
+    """Unpacks the arguments of `_build_chunk` (for `ProcessPoolExecutor.map`)."""
+    return _build_chunk(*args)
+
+
+# ---------------------- K-way Merge of the Runs ---------------------- #
+def _read_run(run_path):
+    """Yields the records of a sorted run."""
+    with open(run_path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _index_path(index_name, output_dir, features_output_dir):
+    """Output file of a merged index."""
+    if index_name.startswith(FEATURE_PREFIX):
+        feature = index_name[len(FEATURE_PREFIX) :]
+        return os.path.join(features_output_dir, f"{feature}_index.json")
+    return os.path.join(output_dir, f"{index_name}_index.json")
+
+
+def _merge_runs(run_paths, doc_offsets, output_dir, features_output_dir):
+    """Merges all sorted runs (k-way, one record per run in memory) and streams every index to its JSON file.
+
+    Chunk-local doc IDs are shifted by the offset of their chunk, so the records of a term, ordered by
+    (chunk, run), give postings already sorted by global doc ID.
+    """
+    merged = heapq.merge(*(_read_run(path) for path in run_paths), key=lambda r: r[:4])
+    for index_name, records in groupby(merged, key=lambda r: r[0]):
+        filename = _index_path(index_name, output_dir, features_output_dir)
+        positional = index_name.endswith("_pos")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("{")
+            separator = "\n"
+            for term, term_records in groupby(records, key=lambda r: r[1]):
+                if positional:
+                    postings = {
+                        doc_offsets[chunk_no] + doc_id: positions
+                        for _, _, chunk_no, _, chunk_postings in term_records
+                        for doc_id, positions in chunk_postings
+                    }
+                else:
+                    postings = [
+                        doc_offsets[chunk_no] + doc_id
+                        for _, _, chunk_no, _, chunk_postings in term_records
+                        for doc_id in chunk_postings
+                    ]
+                f.write(f"{separator}    {json.dumps(term, ensure_ascii=False)}: ")
+                f.write(json.dumps(postings))
+                separator = ",\n"
+            f.write("\n}")
+        print(f"Index saved to {filename}")
+
+
+def _merge_doc_keyed(chunks, doc_offsets, output_dir):
+    """Writes doc_ids.json (URLs in global doc ID order) and reviews_index.json from the chunk files."""
+    with open(os.path.join(output_dir, "doc_ids.json"), "w", encoding="utf-8") as f:
+        f.write("[")
+        separator = "\n"
+        for _, _, _, _, urls_path in chunks:
+            with open(urls_path, "r", encoding="utf-8") as urls_file:
+                for line in urls_file:
+                    f.write(separator + "    " + json.dumps(line.rstrip("\n"), ensure_ascii=False))
+                    separator = ",\n"
+        f.write("\n]")
+
+    with open(os.path.join(output_dir, "reviews_index.json"), "w", encoding="utf-8") as f:
+        f.write("{")
+        separator = "\n"
+        for chunk_no, _, _, reviews_path, _ in chunks:
+            with open(reviews_path, "r", encoding="utf-8") as reviews_file:
+                for line in reviews_file:
+                    doc_id, entry = json.loads(line)
+                    f.write(f'{separator}    "{doc_offsets[chunk_no] + doc_id}": {json.dumps(entry)}')
+                    separator = ",\n"
+        f.write("\n}")
+
+
+# ---------------------- Parallel Out-of-core Build ---------------------- #
+def build_indexes_parallel(
+    filepath,
+    stopwords,
+    output_dir,
+    features_output_dir,
+    n_workers=None,
+    max_postings=1_000_000,
+    run_dir=None,
+):
+    """Builds and saves every index of `build_indexes_single_pass` with a process pool and bounded memory.
+
+    The JSONL file is split into byte ranges handed to `n_workers` processes (default: all cores). Each worker
+    indexes its range SPIMI-style and spills a sorted run to `run_dir` whenever it holds `max_postings`
+    postings, which caps its memory. A k-way merge of the runs then streams the final inverted, positional
+    and feature indexes to disk, with doc IDs in file order (as in the single-pass build).
+    URLs are assumed to be unique in the input (each line gets its own doc ID).
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(features_output_dir, exist_ok=True)
+    own_run_dir = run_dir is None
+    run_dir = run_dir or tempfile.mkdtemp(prefix="index_runs_")
+    os.makedirs(run_dir, exist_ok=True)
+
+    try:
+        # More ranges than workers, so that uneven ranges still balance the load
+        ranges = split_byte_ranges(filepath, n_workers * 4)
+        tasks = [
+            (filepath, chunk_no, start, end, stopwords, run_dir, max_postings)
+            for chunk_no, (start, end) in enumerate(ranges)
+        ]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunks = sorted(executor.map(_build_chunk_task, tasks))
+
+        doc_offsets = {}
+        total_docs = 0
+        for chunk_no, n_docs, _, _, _ in chunks:
+            doc_offsets[chunk_no] = total_docs
+            total_docs += n_docs
+
+        _merge_doc_keyed(chunks, doc_offsets, output_dir)
+        run_paths = [path for chunk in chunks for path in chunk[2]]
+        _merge_runs(run_paths, doc_offsets, output_dir, features_output_dir)
+        print(f"Indexed {total_docs} documents with {n_workers} workers.")
+    finally:
+        if own_run_dir:
+            shutil.rmtree(run_dir, ignore_errors=True)
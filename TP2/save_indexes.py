@@ -10,5 +10,31 @@ def save_index(index, filename, overwrite=False):
             f"The file '{filename}' already exists. Use `overwrite=True` to overwrite it."
         )
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=4)
+        # `default=list` serializes the `array('I')` postings of integer ID indexes
+        json.dump(index, f, ensure_ascii=False, indent=4, default=list)
     print(f"Index saved to {filename}")
+
+
+# ---------------------- Save Document IDs ---------------------- #
+def save_doc_ids(doc_ids, filename, overwrite=False):
+    """Saves the document ID dictionary as a JSON list of URLs, where the position is the ID."""
+    doc_urls = sorted(doc_ids, key=doc_ids.get)
+    save_index(doc_urls, filename, overwrite=overwrite)
+
+
+# ---------------------- Save Every Index ---------------------- #
+def save_all_indexes(indexes, output_dir, features_output_dir, overwrite=False):
+    """Saves the result of `build_indexes_single_pass`: doc IDs, variant map and main indexes in `output_dir`, features in `features_output_dir`."""
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(features_output_dir, exist_ok=True)
+    save_doc_ids(indexes["doc_ids"], os.path.join(output_dir, "doc_ids.json"), overwrite)
+    for name, index in indexes.items():
+        if name in ("doc_ids", "features", "variants"):
+            continue
+        save_index(index, os.path.join(output_dir, f"{name}_index.json"), overwrite)
+    if "variants" in indexes:
+        save_index(indexes["variants"], os.path.join(output_dir, "variants.json"), overwrite)
+    for feature, index in indexes["features"].items():
+        save_index(
+            index, os.path.join(features_output_dir, f"{feature}_index.json"), overwrite
+        )
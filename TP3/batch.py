@@ -0,0 +1,206 @@
+import argparse
+import json
+import math
+import multiprocessing
+import time
+
+from TP3.corpus_stats import get_corpus_stats
+from TP3.search import search
+from TP3.service import DATA_FOLDER, DEFAULT_TOP_K, FIELD_WEIGHTS, FILTER_MODES, load_service
+
+# Queries sent to a worker at once (amortizes the inter-process round trips)
+CHUNK_SIZE = 64
+
+# Service of the worker processes: set in the parent before forking, so the
+# indexes are shared copy-on-write (or loaded by _init_worker otherwise)
+_service = None
+
+
+def read_queries(filepath):
+    """
+    Reads the queries to evaluate:
+    - .jsonl: one query per line, either a string or an object with a
+      "query" key and optional "filter_mode", "top_k" and "proximity_weight",
+    - any other file: one query per line.
+    Empty lines are skipped; a .jsonl line that is not valid JSON gives
+    {"error": ...}, reported as the error of that query.
+    :return: generator of dicts {"query", ...search parameters}
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if filepath.endswith(".jsonl"):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {"error": f"invalid JSON line: {e}"}
+                    continue
+                yield entry if isinstance(entry, dict) else {"query": entry}
+            else:
+                yield {"query": line}
+
+
+def percentile(sorted_values, p):
+    """
+    p-th percentile (nearest rank) of an ascending list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _init_worker(data_folder, field_weights, cache_size):
+    global _service
+    if _service is None:  # Not inherited from the parent (spawn start method)
+        _service = load_service(
+            data_folder, field_weights=field_weights, workers=1, cache_size=cache_size
+        )
+
+
+def _evaluate(item):
+    """
+    Evaluates one query in a worker.
+    :return: output record (search() result with the query and its latency),
+             or {"id", "query", "error"} if the query could not be evaluated:
+             one bad query does not stop the others.
+    """
+    position, entry, defaults = item
+    record = {"id": position, "query": entry.get("query")}
+    try:
+        if "error" in entry:
+            raise ValueError(entry["error"])
+        if "query" not in entry:
+            raise ValueError("missing 'query'")
+        params = {**defaults, **{key: entry[key] for key in defaults if key in entry}}
+        start = time.perf_counter()
+        indexes = _service.indexes
+        results_data = search(
+            entry["query"],
+            indexes,
+            _service.synonyms,
+            _service.doc_data,
+            get_corpus_stats(indexes, _service.doc_data)["avgdl"],
+            _service.field_weights,
+            cache=_service.cache,
+            **params,
+        )
+        latency = time.perf_counter() - start
+    except Exception as e:  # Query syntax, invalid parameters, ...
+        return {**record, "error": f"{type(e).__name__}: {e}"}
+    return {**record, "latency_ms": round(latency * 1000, 3), **results_data}
+
+
+def evaluate_queries(
+    queries,
+    output_file,
+    data_folder=DATA_FOLDER,
+    field_weights=FIELD_WEIGHTS,
+    workers=None,
+    filter_mode="any",
+    top_k=DEFAULT_TOP_K,
+    proximity_weight=0.0,
+    cache_size=1024,
+):
+    """
+    Evaluates every query and streams the results (in input order) to a
+    JSONL file, one search() result per line with the query and its latency.
+
+    The indexes are loaded once in this process (mmap segments), then shared
+    read-only with a pool of worker processes: with the fork start method the
+    workers inherit them copy-on-write, otherwise each worker maps the same
+    segment files.
+
+    :param queries: iterable of dicts as returned by read_queries.
+    :param workers: number of processes (None: one per CPU, 1: no pool).
+    :param filter_mode, top_k, proximity_weight: defaults for the queries
+                                                 that do not set them.
+    :return: {"queries", "errors", "seconds", "qps", "p50_ms", "p95_ms", "p99_ms"}
+             (latencies of the evaluated queries only)
+    """
+    global _service
+    _service = load_service(
+        data_folder, field_weights=field_weights, workers=1, cache_size=cache_size
+    )
+    defaults = {"filter_mode": filter_mode, "top_k": top_k, "proximity_weight": proximity_weight}
+    items = ((position, entry, defaults) for position, entry in enumerate(queries))
+
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    with open(output_file, "w", encoding="utf-8") as f:
+        if workers == 1:
+            pool = None
+            records = map(_evaluate, items)
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            pool = context.Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=(data_folder, field_weights, cache_size),
+            )
+            records = pool.imap(_evaluate, items, chunksize=CHUNK_SIZE)
+        try:
+            for record in records:
+                if "error" in record:
+                    errors += 1
+                else:
+                    latencies.append(record["latency_ms"])
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    seconds = time.perf_counter() - start
+    _service.close()
+
+    latencies.sort()
+    total = len(latencies) + errors
+    return {
+        "queries": total,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "qps": round(total / seconds, 1) if seconds else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluates a file of queries in parallel and writes the results as JSONL."
+    )
+    parser.add_argument("queries_file", help="Queries: .jsonl or one query per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--workers", type=int, help="Processes (default: one per CPU)")
+    parser.add_argument("--mode", choices=FILTER_MODES, default="any")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--proximity", type=float, default=0.0)
+    parser.add_argument(
+        "--field-weights",
+        type=json.loads,
+        default=FIELD_WEIGHTS,
+        help='JSON object, e.g. \'{"title": 3.0, "description": 1.0}\'',
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Rank every query, even repeated ones")
+    args = parser.parse_args()
+
+    report = evaluate_queries(
+        read_queries(args.queries_file),
+        args.output,
+        field_weights=args.field_weights,
+        workers=args.workers,
+        filter_mode=args.mode,
+        top_k=args.top_k,
+        proximity_weight=args.proximity,
+        cache_size=0 if args.no_cache else 1024,
+    )
+    print(
+        f"{report['queries']} queries ({report['errors']} errors) in {report['seconds']} s "
+        f"({report['qps']} queries/s), "
+        f"latency p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms"
+    )
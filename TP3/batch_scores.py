@@ -0,0 +1,138 @@
+import math
+
+import numpy as np
+
+from TP3.corpus_stats import document_frequency, get_corpus_stats
+from TP3.scores import FIELD_INDEX_MAP
+
+
+def _match_postings(postings, doc_ids):
+    """
+    Looks up every candidate of doc_ids (sorted int64 array) in a Postings.
+    Returns (found, ranks): a boolean mask of the candidates present in the
+    postings, and their rank in the postings (only meaningful where found).
+    """
+    posting_ids = np.frombuffer(postings.doc_ids, dtype=np.uint32)
+    if len(posting_ids) == 0:
+        return np.zeros(len(doc_ids), dtype=bool), np.zeros(len(doc_ids), dtype=np.int64)
+    ranks = np.searchsorted(posting_ids, doc_ids)
+    clipped = np.minimum(ranks, len(posting_ids) - 1)
+    found = (ranks < len(posting_ids)) & (posting_ids[clipped] == doc_ids)
+    return found, clipped
+
+
+def _tf_vector(postings, doc_ids):
+    """
+    Term frequencies of the token for every candidate (0.0 where absent),
+    with the same convention as Postings.tf.
+    """
+    found, ranks = _match_postings(postings, doc_ids)
+    term_frequencies = postings.term_frequencies()
+    if term_frequencies is None:
+        return found.astype(np.float64)
+    tfs = np.frombuffer(term_frequencies, dtype=np.uint32).astype(np.float64)
+    if not len(tfs):
+        return np.zeros(len(doc_ids), dtype=np.float64)
+    return np.where(found, tfs[ranks], 0.0)
+
+
+def batch_bm25(doc_ids, query_tokens, indexes, doc_data, avgdl, field_weights, k1=1.5, b=0.75):
+    """
+    Term-at-a-time version of compute_bm25: accumulates the multi-field BM25
+    contributions of each (field, token) pair for all candidates at once.
+
+    :param doc_ids: sorted numpy int64 array of candidate doc IDs.
+    Other parameters are the same as compute_bm25.
+    :return: numpy float64 array of BM25 scores, aligned with doc_ids.
+
+    Contributions are added in the same (field, token) order and with the same
+    float operations as compute_bm25, so scores are identical, not just close.
+    """
+    stats = get_corpus_stats(indexes, doc_data)
+    total_docs = stats["total_docs"]
+    avgdl = avgdl or stats["avgdl"]
+
+    scores = np.zeros(len(doc_ids), dtype=np.float64)
+    for field, weight in field_weights.items():
+        if weight <= 0.0:
+            continue
+
+        index_name = FIELD_INDEX_MAP.get(field)
+        if not index_name or index_name not in indexes:
+            continue
+        index = indexes[index_name]
+
+        # Length normalization of every candidate, shared by all tokens
+        lengths = np.frombuffer(stats["doc_lengths"][field], dtype=np.uint32)[doc_ids]
+        doc_lengths = np.where(lengths == 0, 1, lengths).astype(np.float64)
+        avgdl_field = avgdl.get(field, 1.0)
+        norm = k1 * (1 - b + b * (doc_lengths / avgdl_field))
+
+        for token in query_tokens:
+            if token not in index:
+                continue
+            df = document_frequency(index, token)
+            idf = math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
+
+            tf = _tf_vector(index[token], doc_ids)
+            scores += weight * (idf * ((tf * (k1 + 1)) / (tf + norm)))
+
+    return scores
+
+
+def batch_linear_score(doc_ids, query_tokens, indexes):
+    """
+    Vectorized version of compute_linear_score for all candidates at once.
+    :return: numpy float64 array of linear scores, aligned with doc_ids.
+    """
+    scores = np.zeros(len(doc_ids), dtype=np.float64)
+
+    # 1) Query tokens appearing in the title, 2) in the description
+    for index_name, weight in (("title_index", 2.0), ("description_index", 1.0)):
+        hits = np.zeros(len(doc_ids), dtype=np.float64)
+        if index_name in indexes:
+            for token in query_tokens:
+                if token in indexes[index_name]:
+                    hits += _match_postings(indexes[index_name][token], doc_ids)[0]
+        scores += weight * hits
+
+    # 3) Average review score (doc-keyed index, no postings to vectorize)
+    if "reviews_index" in indexes:
+        reviews = indexes["reviews_index"]
+        scores += np.fromiter(
+            (
+                float(reviews[doc_id].get("average_score", 0.0))
+                if doc_id in reviews
+                else 0.0
+                for doc_id in doc_ids.tolist()
+            ),
+            dtype=np.float64,
+            count=len(doc_ids),
+        )
+
+    # 4) Origin match boost
+    origin_boost = np.zeros(len(doc_ids), dtype=np.float64)
+    if "origin_index" in indexes:
+        for token in query_tokens:
+            if token in indexes["origin_index"]:
+                origin_boost += 3.0 * _match_postings(indexes["origin_index"][token], doc_ids)[0]
+    scores += origin_boost
+
+    return scores
+
+
+def batch_rank(candidates, query_tokens, indexes, doc_data, avgdl, field_weights):
+    """
+    Scores all candidate doc IDs with bm25 * 1.5 + linear score, like
+    rank_documents, and returns [(doc_id, final_score), ...] sorted by
+    descending score (ties by ascending doc ID).
+    """
+    if not len(candidates):
+        return []
+    doc_ids = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+    bm25_scores = batch_bm25(doc_ids, query_tokens, indexes, doc_data, avgdl, field_weights)
+    linear_scores = batch_linear_score(doc_ids, query_tokens, indexes)
+    final_scores = bm25_scores * 1.5 + linear_scores
+
+    order = np.argsort(-final_scores, kind="stable")
+    return list(zip(doc_ids[order].tolist(), final_scores[order].tolist()))
@@ -0,0 +1,68 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Repository root (the TP3 package must be importable from there)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMER = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def import_time(module, repeat=10):
+    """
+    Cold import time of a module: each run is a fresh interpreter.
+    :return: list of durations in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMER.format(module=module)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        timings.append(float(output.split()[-1]))
+    return timings
+
+
+def slowest_imports(module, n=10):
+    """
+    Modules with the largest cumulative import time (python -X importtime).
+    :param n: number of modules returned (None: all).
+    :return: list of (cumulative microseconds, module name)
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:n]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the cold import time of the search code.")
+    parser.add_argument("modules", nargs="*", default=["TP3.search", "TP3.service"])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        timings = import_time(module, args.repeat)
+        print(
+            f"{module}: median {statistics.median(timings) * 1000:.1f} ms, "
+            f"min {min(timings) * 1000:.1f} ms over {args.repeat} runs"
+        )
+        imports = slowest_imports(module, n=None)
+        for cumulative, name in imports[:10]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        if any(name.split(".")[0] == "nltk" for _, name in imports):
+            print("  warning: NLTK is imported")
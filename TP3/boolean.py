@@ -0,0 +1,237 @@
+import re
+from array import array
+
+from TP3.corpus_stats import document_frequency
+from TP3.postings import Postings
+from TP3.tokenize import tokenize
+
+# Indexes searched by an unqualified term
+DEFAULT_INDEXES = ("title_index", "description_index", "origin_index", "brand_index")
+# Field qualifiers (title:red, origin:(usa OR france)) and the indexes they search
+FIELD_INDEXES = {
+    "title": ("title_index",),
+    "description": ("description_index",),
+    "origin": ("origin_index",),
+    "brand": ("brand_index",),
+    "domain": ("domain_index",),
+}
+OPERATORS = ("AND", "OR", "NOT")
+LEXER_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+QUALIFIER_PATTERN = re.compile(r"(\w+):(.*)")
+
+
+# ---------------------- Parsing ---------------------- #
+def parse_boolean_query(query):
+    """
+    Parses a boolean query into a tree of tuples:
+      ("term", token, index_names), ("and", children), ("or", children),
+      ("not", child)
+
+    Syntax: AND, OR and NOT (upper case), parentheses, field qualifiers
+    (title:red, origin:(usa OR france)); juxtaposed operands are ANDed and
+    NOT binds tighter than AND, which binds tighter than OR. Words are
+    tokenized like the documents: stopwords are ignored and a word giving
+    several tokens is the AND of them.
+
+    :return: the tree, or None if the query has no searchable term.
+    :raise ValueError: on unbalanced parentheses or a missing operand.
+    """
+    tokens = LEXER_PATTERN.findall(query)
+    node, position = _parse_or(tokens, 0, DEFAULT_INDEXES)
+    if position < len(tokens):
+        raise ValueError(f"Unexpected '{tokens[position]}' in boolean query")
+    return node
+
+
+def _combine(kind, children):
+    children = tuple(child for child in children if child is not None)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else (kind, children)
+
+
+def _parse_or(tokens, position, index_names):
+    children = []
+    node, position = _parse_and(tokens, position, index_names)
+    children.append(node)
+    while position < len(tokens) and tokens[position] == "OR":
+        node, position = _parse_and(tokens, position + 1, index_names)
+        children.append(node)
+    return _combine("or", children), position
+
+
+def _parse_and(tokens, position, index_names):
+    children = []
+    while position < len(tokens) and tokens[position] not in ("OR", ")"):
+        if tokens[position] == "AND":
+            position += 1
+        node, position = _parse_not(tokens, position, index_names)
+        children.append(node)
+    if not children:
+        raise ValueError("Missing operand in boolean query")
+    return _combine("and", children), position
+
+
+def _parse_not(tokens, position, index_names):
+    if position < len(tokens) and tokens[position] == "NOT":
+        node, position = _parse_not(tokens, position + 1, index_names)
+        return (None if node is None else ("not", node)), position
+    return _parse_primary(tokens, position, index_names)
+
+
+def _parse_primary(tokens, position, index_names):
+    if position >= len(tokens) or tokens[position] in OPERATORS + (")",):
+        raise ValueError("Missing operand in boolean query")
+    word = tokens[position]
+    qualifier = QUALIFIER_PATTERN.fullmatch(word)
+    if qualifier and qualifier.group(1).lower() in FIELD_INDEXES:
+        index_names = FIELD_INDEXES[qualifier.group(1).lower()]
+        word = qualifier.group(2)
+        if not word:  # title:(...), or title: followed by a space
+            position += 1
+            if position >= len(tokens) or tokens[position] in OPERATORS + (")",):
+                raise ValueError(f"Missing operand after '{tokens[position - 1]}'")
+            word = tokens[position]
+    if word == "(":
+        node, position = _parse_or(tokens, position + 1, index_names)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise ValueError("Unbalanced parentheses in boolean query")
+        return node, position + 1
+    terms = [("term", token, index_names) for token in tokenize(word)]
+    return _combine("and", terms), position + 1
+
+
+def positive_tokens(node):
+    """
+    Tokens of the terms that are not under a NOT (the ones used for ranking).
+    """
+    if node is None or node[0] == "not":
+        return []
+    if node[0] == "term":
+        return [node[1]]
+    tokens = []
+    for child in node[1]:
+        tokens.extend(token for token in positive_tokens(child) if token not in tokens)
+    return tokens
+
+
+# ---------------------- Planning ---------------------- #
+def _universe(indexes):
+    """
+    Every live document (what a NOT is evaluated against).
+    """
+    return array("I", sorted(indexes["doc_ids"].values()))
+
+
+def estimate(node, indexes):
+    """
+    Upper bound on the number of documents matching node, from the document
+    frequencies of the term dictionaries (no postings are decoded).
+    """
+    kind = node[0]
+    if kind == "term":
+        return sum(
+            document_frequency(indexes[name], node[1]) for name in node[2] if name in indexes
+        )
+    if kind == "not":
+        return len(indexes["doc_ids"])
+    estimates = [estimate(child, indexes) for child in node[1]]
+    return min(estimates) if kind == "and" else sum(estimates)
+
+
+# ---------------------- Evaluation ---------------------- #
+def _term_postings(node, indexes):
+    """
+    Postings of a term, one per index containing it (not decoded yet: see
+    _filter).
+    """
+    postings_list = []
+    for name in node[2]:
+        if name in indexes:
+            postings = indexes[name].get(node[1])
+            if postings is not None and len(postings):
+                postings_list.append(postings)
+    return postings_list
+
+
+def _union(doc_id_lists):
+    if len(doc_id_lists) == 1:
+        return doc_id_lists[0]
+    return array("I", sorted(set().union(*doc_id_lists)))
+
+
+def _filter(candidates, postings_list, keep):
+    """
+    Candidates present (keep=True) or absent (keep=False) in at least one of
+    postings_list. Each postings is searched from where the previous
+    candidate was found (Postings.seek): the cost depends on the number of
+    candidates, not on the length of the postings, and compressed postings
+    only decode the blocks that can hold a candidate.
+    """
+    cursors = [0] * len(postings_list)
+    result = array("I")
+    for doc_id in candidates:
+        found = False
+        for i, postings in enumerate(postings_list):
+            found, cursors[i] = postings.seek(doc_id, cursors[i])
+            if found:
+                break
+        if found == keep:
+            result.append(doc_id)
+    return result
+
+
+def evaluate(node, indexes):
+    """
+    Sorted array('I') of the doc IDs matching a parsed boolean query.
+
+    An AND starts from its operand with the smallest estimated document
+    frequency and only filters those candidates through the other operands
+    (rarest first, then the NOTs), with galloping searches in their postings
+    (over the skip entries of compressed postings, so only the blocks that
+    can hold a candidate are decoded).
+    It stops as soon as an operand has no postings or no candidate is left,
+    so a selective AND costs about the size of its rarest term.
+    """
+    if node is None:
+        return array("I")
+    kind = node[0]
+    if kind == "term":
+        postings_list = _term_postings(node, indexes)
+        if not postings_list:
+            return array("I")
+        return _union([postings.doc_ids for postings in postings_list])
+    if kind == "or":
+        return _union([evaluate(child, indexes) for child in node[1]])
+    if kind == "not":
+        return _filter(_universe(indexes), [Postings(evaluate(node[1], indexes))], keep=False)
+
+    positives = [child for child in node[1] if child[0] != "not"]
+    negatives = [child[1] for child in node[1] if child[0] == "not"]
+    planned = sorted((estimate(child, indexes), i, child) for i, child in enumerate(positives))
+    if planned and planned[0][0] == 0:
+        return array("I")  # An operand matches nothing: skip every postings list
+    if planned:
+        candidates = evaluate(planned[0][2], indexes)
+    else:
+        candidates = _universe(indexes)
+    operands = [(child, True) for _, _, child in planned[1:]]
+    operands += [(child, False) for child in negatives]
+    for child, keep in operands:
+        if not candidates:
+            break
+        if child[0] == "term":
+            postings_list = _term_postings(child, indexes)
+        else:
+            postings_list = [Postings(evaluate(child, indexes))]
+        candidates = _filter(candidates, postings_list, keep)
+    return candidates
+
+
+def boolean_filter(node, indexes):
+    """
+    Filter step of search() for a parsed boolean query.
+    :return: dict { doc_id: number of positive query tokens }
+    """
+    token_count = len(positive_tokens(node))
+    return {doc_id: token_count for doc_id in evaluate(node, indexes)}
@@ -0,0 +1,347 @@
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+import numpy as np
+
+from TP3.postings import from_uint32_bytes
+
+# Postings are cut into blocks of BLOCK_SIZE documents; each block but the
+# first has a skip entry (last doc ID of the previous block, offset of its doc
+# ID gaps, offset of its positions), so a block can be skipped or decoded
+# without touching the others
+BLOCK_SIZE = 128
+SKIP_ENTRY = struct.Struct("<III")
+# Below this many bytes, a plain loop decodes faster than numpy (call overhead)
+NUMPY_MIN_BYTES = 256
+
+
+# ---------------------- Variable-byte codec ---------------------- #
+def encode_varints(values, out=None):
+    """
+    Variable-byte encoding: 7 bits per byte, low bits first, the high bit
+    set on every byte but the last one of a value. Small values (gaps
+    between sorted doc IDs or positions) take a single byte.
+    :param out: bytearray to append to (a new one if None).
+    """
+    out = bytearray() if out is None else out
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+
+def read_varint(buffer, offset):
+    """
+    Decodes one variable-byte value.
+    :return: (value, offset of the next value)
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _decode_varints_numpy(buffer):
+    """
+    Decodes a buffer of variable-byte values at once (vectorized).
+    :return: numpy uint64 array
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Rank of each byte within its value gives its shift (0, 7, 14, ...)
+    shifts = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    payload = (data & 0x7F).astype(np.uint64) << (7 * shifts).astype(np.uint64)
+    return np.add.reduceat(payload, starts)
+
+
+def decode_varints(buffer):
+    """
+    Decodes a buffer of variable-byte values.
+    :return: array('I')
+    """
+    if len(buffer) >= NUMPY_MIN_BYTES:
+        return to_uint32_array(_decode_varints_numpy(buffer))
+    values = array("I")
+    value = shift = 0
+    for byte in buffer:
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+        else:
+            shift += 7
+    return values
+
+
+def decode_gaps(buffer):
+    """
+    Decodes varint gaps back into the sorted values (running sums).
+    :return: array('I')
+    """
+    if len(buffer) >= NUMPY_MIN_BYTES:
+        return to_uint32_array(np.cumsum(_decode_varints_numpy(buffer)))
+    return array("I", accumulate(decode_varints(buffer)))
+
+
+def to_uint32_array(values):
+    """
+    numpy integer array -> array('I'), the type of Postings.doc_ids.
+    """
+    return from_uint32_bytes(values.astype("<u4").tobytes())
+
+
+# ---------------------- Postings codec ---------------------- #
+def encode_postings(doc_ids, positions=None):
+    """
+    Compressed postings block:
+      sections : byte length of the doc ID gaps and of the tfs (2 varints)
+      skips    : per block of BLOCK_SIZE documents after the first, the last
+                 doc ID of the previous block, the offset of its first doc ID
+                 gap and of its first position (uint32 x 3)
+      doc IDs  : gaps between consecutive doc IDs, as varints
+      tfs      : number of positions of each document, as varints
+                 (positional postings only)
+      positions: per document, gaps between its sorted positions, as varints
+    """
+    n_blocks = (len(doc_ids) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    doc_bytes = bytearray()
+    tf_bytes = bytearray()
+    position_bytes = bytearray()
+    skips = bytearray()
+    previous = 0
+    for block in range(n_blocks):
+        start = block * BLOCK_SIZE
+        block_ids = doc_ids[start : start + BLOCK_SIZE]
+        if block:
+            skips += SKIP_ENTRY.pack(previous, len(doc_bytes), len(position_bytes))
+        gaps = []
+        for doc_id in block_ids:
+            gaps.append(doc_id - previous)
+            previous = doc_id
+        encode_varints(gaps, doc_bytes)
+        if positions is not None:
+            for doc_positions in positions[start : start + BLOCK_SIZE]:
+                tf_bytes += encode_varints([len(doc_positions)])
+                encode_varints(
+                    (b - a for a, b in zip([0, *doc_positions], doc_positions)),
+                    position_bytes,
+                )
+    sections = encode_varints([len(doc_bytes), len(tf_bytes)])
+    return sections + skips + doc_bytes + tf_bytes + position_bytes
+
+
+def decode_postings(block, df, positional):
+    """
+    Opens an encode_postings block without decoding it: the doc IDs are
+    returned as BlockDocIds (decoded a block of documents at a time, or all
+    at once when needed) and the positions as BlockPositions, which decodes
+    the tfs and the positions of a block the first time they are accessed.
+    :return: (BlockDocIds, BlockPositions or None)
+    """
+    doc_ids = BlockDocIds(block, df)
+    if not positional:
+        return doc_ids, None
+    tfs_start = doc_ids.tfs_start
+    tf_length = doc_ids.tf_length
+    return doc_ids, BlockPositions(
+        block[tfs_start + tf_length :],
+        block[tfs_start : tfs_start + tf_length],
+        doc_ids.position_offsets(),
+        df,
+    )
+
+
+class BlockDocIds:
+    """
+    Doc IDs of a compressed postings list, read through its skip entries.
+
+    The skip entries give, for each block of BLOCK_SIZE documents, the last
+    doc ID of the previous block and the offset of its doc ID gaps: a doc ID
+    is looked up by a binary search over the skip entries, then only the
+    gaps of its block are decoded. decode_all() decodes the whole list (in
+    one vectorized pass) for the consumers that need every doc ID.
+    """
+
+    __slots__ = (
+        "_data",
+        "_df",
+        "_skips",
+        "_docs_start",
+        "_doc_length",
+        "tfs_start",
+        "tf_length",
+        "_blocks",
+    )
+
+    def __init__(self, data, df):
+        doc_length, offset = read_varint(data, 0)
+        tf_length, skips_start = read_varint(data, offset)
+        n_blocks = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+        self._data = data
+        self._df = df
+        self._docs_start = skips_start + SKIP_ENTRY.size * max(n_blocks - 1, 0)
+        # (previous last doc ID, doc offset, position offset) x (n_blocks - 1)
+        self._skips = from_uint32_bytes(data[skips_start : self._docs_start])
+        self._doc_length = doc_length
+        self.tfs_start = self._docs_start + doc_length
+        self.tf_length = tf_length
+        self._blocks = {}
+
+    def __len__(self):
+        return self._df
+
+    def n_blocks(self):
+        return (self._df + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+    def position_offsets(self):
+        """
+        Offset of the positions of every block (array('I')).
+        """
+        return array("I", [0]) + self._skips[2::3]
+
+    def find_block(self, doc_id, lo=0):
+        """
+        First block (from block lo) that can hold doc_id, found by galloping
+        over the skip entries (the last doc ID of every block but the last
+        one); no doc ID is decoded. Like positional.gallop, walking the blocks
+        with increasing doc IDs costs O(log d) per search, d blocks skipped.
+        """
+        last = self.n_blocks() - 1
+        bound = lo
+        step = 1
+        while bound < last and self._skips[3 * bound] < doc_id:
+            lo = bound + 1
+            bound += step
+            step *= 2
+        hi = min(bound, last)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._skips[3 * mid] < doc_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, doc_id, lo=0):
+        """
+        Rank of doc_id in the postings (-1 if absent), decoding only the
+        block that can hold it.
+        :param lo: first block to search (for increasing doc_ids).
+        :return: (rank, block)
+        """
+        block = self.find_block(doc_id, lo)
+        doc_ids = self.block(block)
+        i = bisect_left(doc_ids, doc_id)
+        if i < len(doc_ids) and doc_ids[i] == doc_id:
+            return block * BLOCK_SIZE + i, block
+        return -1, block
+
+    def block(self, block):
+        """
+        Sorted doc IDs of one block (array('I')), decoded on first access.
+        """
+        decoded = self._blocks.get(block)
+        if decoded is None:
+            start = self._docs_start + (self._skips[3 * block - 2] if block else 0)
+            if block + 1 < self.n_blocks():
+                end = self._docs_start + self._skips[3 * block + 1]
+            else:
+                end = self.tfs_start
+            decoded = decode_varints(self._data[start:end])
+            previous = self._skips[3 * block - 3] if block else 0
+            decoded = array("I", accumulate(decoded, initial=previous))[1:]
+            self._blocks[block] = decoded
+        return decoded
+
+    def decode_all(self):
+        """
+        Every doc ID (array('I')).
+        """
+        return decode_gaps(self._data[self._docs_start : self.tfs_start])
+
+
+class BlockPositions:
+    """
+    Lazily decoded positions of a compressed postings list: positions[i] is
+    the array('I') of positions of the i-th document.
+
+    The tfs (len(positions[i])) are decoded on first use, without the
+    positions; the positions themselves are decoded a block of BLOCK_SIZE
+    documents at a time, on first access, so phrase and proximity checks
+    only pay for the blocks of the documents they look at.
+    """
+
+    __slots__ = ("_data", "_tf_data", "_tfs", "_offsets", "_blocks", "_length")
+
+    def __init__(self, data, tf_data, offsets, length):
+        """
+        :param tf_data: the tfs, as varints.
+        :param length: number of documents.
+        """
+        self._data = data
+        self._tf_data = tf_data
+        self._tfs = None
+        self._offsets = offsets
+        self._blocks = {}
+        self._length = length
+
+    def lengths(self):
+        """
+        Number of positions of every document (array('I')).
+        """
+        if self._tfs is None:
+            self._tfs = decode_varints(self._tf_data)
+        return self._tfs
+
+    def _block(self, block):
+        decoded = self._blocks.get(block)
+        if decoded is None:
+            start = block * BLOCK_SIZE
+            tfs = self.lengths()[start : start + BLOCK_SIZE]
+            end = self._offsets[block + 1] if block + 1 < len(self._offsets) else len(self._data)
+            gaps = self._data[self._offsets[block] : end]
+            decoded = []
+            start = 0
+            if len(gaps) >= NUMPY_MIN_BYTES:
+                values = np.cumsum(_decode_varints_numpy(gaps))
+                # Gaps restart at each document: remove the sum of the previous ones
+                counts = np.asarray(tfs, dtype=np.int64)
+                starts = np.cumsum(counts) - counts
+                previous = np.where(starts > 0, values[np.maximum(starts - 1, 0)], 0)
+                all_positions = to_uint32_array(values - np.repeat(previous, counts))
+                for tf in tfs:
+                    decoded.append(all_positions[start : start + tf])
+                    start += tf
+            else:
+                all_gaps = decode_varints(gaps)
+                for tf in tfs:
+                    decoded.append(array("I", accumulate(all_gaps[start : start + tf])))
+                    start += tf
+            self._blocks[block] = decoded
+        return decoded
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return self._block(i // BLOCK_SIZE)[i % BLOCK_SIZE]
+
+    def __iter__(self):
+        for block in range((self._length + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            yield from self._block(block)
@@ -0,0 +1,116 @@
+import json
+import struct
+from array import array
+
+from TP3.postings import from_uint32_bytes, to_uint32_bytes
+from TP3.tokenize import tokenize
+
+# Statistics segment layout (little-endian):
+#   magic, length of the JSON header
+#   JSON header: {"total_docs": N, "fields": [...], "avgdl": {field: float},
+#                 "max_review_score": float}
+#   doc lengths: one uint32 array of N entries per field, in header order
+STATS_MAGIC = b"IWST"
+STATS_FILE = "corpus_stats.bin"
+STATS_HEADER = struct.Struct("<4sI")
+
+# Fields whose document lengths are stored (keys of scores.FIELD_INDEX_MAP)
+STATS_FIELDS = ("title", "description", "brand", "origin")
+
+
+def build_corpus_stats(indexes, doc_data, fields=STATS_FIELDS):
+    """
+    Computes the corpus statistics used by BM25, once, at index time:
+    {
+      "total_docs": N (size of the doc-ID dictionary),
+      "doc_lengths": {field: array('I') of token counts indexed by doc ID},
+      "avgdl": {field: average length over the N documents},
+      "max_review_score": highest average review score (see max_review_score),
+    }
+    doc_data is keyed by URL (see build_doc_data). This is the only place
+    where raw field texts are tokenized for scoring purposes.
+    """
+    doc_urls = indexes["doc_urls"]
+    total_docs = len(doc_urls)
+    doc_lengths = {}
+    avgdl = {}
+    for field in fields:
+        lengths = array(
+            "I",
+            (len(tokenize(doc_data.get(url, {}).get(field, ""))) for url in doc_urls),
+        )
+        doc_lengths[field] = lengths
+        avgdl[field] = sum(lengths) / total_docs if total_docs > 0 else 1
+    return {
+        "total_docs": total_docs,
+        "doc_lengths": doc_lengths,
+        "avgdl": avgdl,
+        "max_review_score": max_review_score(indexes.get("reviews_index", {})),
+    }
+
+
+def max_review_score(reviews):
+    """
+    Highest average review score of a reviews_index (the review part of the
+    linear score of any document, used by the top-k pruning).
+    """
+    return max(
+        (float(info.get("average_score", 0.0)) for info in reviews.values()),
+        default=0.0,
+    )
+
+
+def get_corpus_stats(indexes, doc_data):
+    """
+    Returns indexes["stats"], building it from doc_data on first use when the
+    indexes were loaded without a statistics segment.
+    """
+    if "stats" not in indexes:
+        indexes["stats"] = build_corpus_stats(indexes, doc_data)
+    return indexes["stats"]
+
+
+def document_frequency(index, token):
+    """
+    Number of documents containing token. Segment indexes read it from their
+    term dictionary, in-memory indexes from the length of the postings.
+    """
+    if hasattr(index, "df"):
+        return index.df(token)
+    postings = index.get(token)
+    return len(postings) if postings is not None else 0
+
+
+def write_corpus_stats(stats, filepath):
+    """
+    Writes the corpus statistics as a binary statistics segment.
+    """
+    fields = list(stats["doc_lengths"])
+    header = {"total_docs": stats["total_docs"], "fields": fields, "avgdl": stats["avgdl"]}
+    if "max_review_score" in stats:
+        header["max_review_score"] = stats["max_review_score"]
+    header = json.dumps(header).encode("utf-8")
+    with open(filepath, "wb") as f:
+        f.write(STATS_HEADER.pack(STATS_MAGIC, len(header)))
+        f.write(header)
+        for field in fields:
+            f.write(to_uint32_bytes(stats["doc_lengths"][field]))
+
+
+def load_corpus_stats(filepath):
+    """
+    Loads a statistics segment written by write_corpus_stats.
+    """
+    with open(filepath, "rb") as f:
+        magic, header_length = STATS_HEADER.unpack(f.read(STATS_HEADER.size))
+        if magic != STATS_MAGIC:
+            raise ValueError(f"'{filepath}' is not a corpus statistics segment.")
+        header = json.loads(f.read(header_length).decode("utf-8"))
+        total_docs = header["total_docs"]
+        doc_lengths = {
+            field: from_uint32_bytes(f.read(4 * total_docs)) for field in header["fields"]
+        }
+    stats = {"total_docs": total_docs, "doc_lengths": doc_lengths, "avgdl": header["avgdl"]}
+    if "max_review_score" in header:
+        stats["max_review_score"] = header["max_review_score"]
+    return stats
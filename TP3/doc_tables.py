@@ -0,0 +1,245 @@
+import json
+import mmap
+import operator
+import struct
+from array import array
+
+from TP3.postings import to_uint32_bytes
+
+# URL table layout (little-endian):
+#   header : magic, version, number of documents
+#   offsets: uint32 start offset of the URL of every doc ID, plus the end of
+#            the last one
+#   order  : the doc IDs sorted by the UTF-8 bytes of their URL (uint32)
+#   urls   : the UTF-8 URLs, in doc ID order, back to back
+URL_TABLE_MAGIC = b"IWDU"
+URL_TABLE_VERSION = 1
+URL_TABLE_FILE = "doc_urls.bin"
+
+# Doc-keyed table layout (little-endian):
+#   header : magic, version, number of documents, number of values
+#   offsets: uint32 start offset of the value of every doc ID, plus the end
+#            of the last one
+#   values : the JSON value of every doc ID, in doc ID order (empty for a
+#            document without value)
+DOC_TABLE_MAGIC = b"IWDT"
+DOC_TABLE_VERSION = 1
+DOC_TABLE_EXTENSION = ".table"
+
+URL_TABLE_HEADER = struct.Struct("<4sHI")
+DOC_TABLE_HEADER = struct.Struct("<4sHII")
+UINT32 = struct.Struct("<I")
+
+
+def _open(filepath, header, magic, version):
+    with open(filepath, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    fields = header.unpack_from(mm, 0)
+    if fields[0] != magic or fields[1] != version:
+        mm.close()
+        raise ValueError(f"'{filepath}' is not a supported document table.")
+    return mm, fields[2:]
+
+
+# ---------------------- URL table ---------------------- #
+def write_url_table(doc_urls, filepath):
+    """
+    Writes the ID -> URL list of the indexes (doc_urls[doc_id] is the URL
+    of doc_id) as a URL table.
+    """
+    encoded = [url.encode("utf-8") for url in doc_urls]
+    offsets = array("I", [0])
+    for url in encoded:
+        offsets.append(offsets[-1] + len(url))
+    order = array("I", sorted(range(len(encoded)), key=encoded.__getitem__))
+    with open(filepath, "wb") as f:
+        f.write(URL_TABLE_HEADER.pack(URL_TABLE_MAGIC, URL_TABLE_VERSION, len(encoded)))
+        f.write(to_uint32_bytes(offsets))
+        f.write(to_uint32_bytes(order))
+        for url in encoded:
+            f.write(url)
+
+
+class UrlTable:
+    """
+    Read-only doc_urls list (doc ID -> URL) backed by a memory-mapped URL
+    table file.
+
+    Opening only reads the header: urls[doc_id] reads one URL from the
+    offsets, and doc_ids (a DocIds view) finds the doc ID of a URL by a
+    binary search over the doc IDs sorted by URL. Startup does not depend on
+    the number of documents, and no URL -> ID dict is built.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._mm, (self._n_docs,) = _open(
+            filepath, URL_TABLE_HEADER, URL_TABLE_MAGIC, URL_TABLE_VERSION
+        )
+        self._offsets_start = URL_TABLE_HEADER.size
+        self._order_start = self._offsets_start + 4 * (self._n_docs + 1)
+        self._urls_start = self._order_start + 4 * self._n_docs
+        self.doc_ids = DocIds(self)
+
+    def _url_bytes(self, doc_id):
+        start, end = struct.unpack_from("<II", self._mm, self._offsets_start + 4 * doc_id)
+        return self._mm[self._urls_start + start : self._urls_start + end]
+
+    def __len__(self):
+        return self._n_docs
+
+    def __getitem__(self, doc_id):
+        if isinstance(doc_id, slice):
+            return [self[i] for i in range(*doc_id.indices(self._n_docs))]
+        if doc_id < 0:
+            doc_id += self._n_docs
+        if not 0 <= doc_id < self._n_docs:
+            raise IndexError(doc_id)
+        return self._url_bytes(doc_id).decode("utf-8")
+
+    def __iter__(self):
+        for doc_id in range(self._n_docs):
+            yield self._url_bytes(doc_id).decode("utf-8")
+
+    def find(self, url):
+        """
+        Doc ID of url, or -1 if it is not in the table.
+        """
+        if not isinstance(url, str):
+            return -1
+        key = url.encode("utf-8")
+        lo, hi = 0, self._n_docs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (doc_id,) = UINT32.unpack_from(self._mm, self._order_start + 4 * mid)
+            candidate = self._url_bytes(doc_id)
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return doc_id
+        return -1
+
+    def close(self):
+        self._mm.close()
+
+
+class DocIds:
+    """
+    URL -> doc ID dictionary of a UrlTable, with the read API of a dict.
+    """
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table):
+        self._table = table
+
+    def get(self, url, default=None):
+        doc_id = self._table.find(url)
+        return default if doc_id < 0 else doc_id
+
+    def __getitem__(self, url):
+        doc_id = self._table.find(url)
+        if doc_id < 0:
+            raise KeyError(url)
+        return doc_id
+
+    def __contains__(self, url):
+        return self._table.find(url) >= 0
+
+    def __len__(self):
+        return len(self._table)
+
+    def __iter__(self):
+        return iter(self._table)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return iter(range(len(self._table)))
+
+    def items(self):
+        for doc_id, url in enumerate(self._table):
+            yield url, doc_id
+
+
+# ---------------------- Doc-keyed tables ---------------------- #
+def write_doc_table(index, n_docs, filepath):
+    """
+    Writes a doc-keyed index ({doc_id: JSON value}, e.g. reviews_index) of
+    a corpus of n_docs documents as a doc-keyed table.
+    """
+    offsets = array("I", [0])
+    values = bytearray()
+    for doc_id in range(n_docs):
+        if doc_id in index:
+            values += json.dumps(index[doc_id], ensure_ascii=False).encode("utf-8")
+        offsets.append(len(values))
+    with open(filepath, "wb") as f:
+        f.write(DOC_TABLE_HEADER.pack(DOC_TABLE_MAGIC, DOC_TABLE_VERSION, n_docs, len(index)))
+        f.write(to_uint32_bytes(offsets))
+        f.write(values)
+
+
+class DocTable:
+    """
+    Read-only doc-keyed index ({doc_id: value}) backed by a memory-mapped
+    doc-keyed table file, with the read API of a dict. Opening only reads
+    the header; the value of a document is parsed when it is accessed.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._mm, (self._n_docs, self._n_values) = _open(
+            filepath, DOC_TABLE_HEADER, DOC_TABLE_MAGIC, DOC_TABLE_VERSION
+        )
+        self._values_start = DOC_TABLE_HEADER.size + 4 * (self._n_docs + 1)
+
+    def _value_bytes(self, doc_id):
+        try:
+            doc_id = operator.index(doc_id)  # int or NumPy integer
+        except TypeError:
+            return b""
+        if not 0 <= doc_id < self._n_docs:
+            return b""
+        start, end = struct.unpack_from("<II", self._mm, DOC_TABLE_HEADER.size + 4 * doc_id)
+        return self._mm[self._values_start + start : self._values_start + end]
+
+    def get(self, doc_id, default=None):
+        value = self._value_bytes(doc_id)
+        return json.loads(value) if value else default
+
+    def __getitem__(self, doc_id):
+        value = self._value_bytes(doc_id)
+        if not value:
+            raise KeyError(doc_id)
+        return json.loads(value)
+
+    def __contains__(self, doc_id):
+        return bool(self._value_bytes(doc_id))
+
+    def __len__(self):
+        return self._n_values
+
+    def __iter__(self):
+        for doc_id in range(self._n_docs):
+            if self._value_bytes(doc_id):
+                yield doc_id
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for doc_id in range(self._n_docs):
+            value = self._value_bytes(doc_id)
+            if value:
+                yield doc_id, json.loads(value)
+
+    def values(self):
+        for _, value in self.items():
+            yield value
+
+    def close(self):
+        self._mm.close()
@@ -0,0 +1,154 @@
+import json
+import mmap
+import struct
+import zlib
+from array import array
+from functools import lru_cache
+
+from TP3.postings import from_uint32_bytes, to_uint32_bytes
+
+# Document store layout (little-endian):
+#   header : magic, version, documents per block, number of documents,
+#            length of the JSON field list
+#   fields : JSON list of the stored field names
+#   offsets: uint32 start offset of every block, plus the end of the last one
+#   blocks : for each block of DOCS_PER_BLOCK consecutive doc IDs, the zlib
+#            compressed JSON list of their field values (null for a document
+#            without stored fields)
+DOC_STORE_MAGIC = b"IWDS"
+DOC_STORE_VERSION = 1
+DOC_STORE_FILE = "docs.store"
+DOCS_PER_BLOCK = 16
+# Number of decompressed blocks kept by a DocStore
+BLOCK_CACHE_SIZE = 64
+
+HEADER = struct.Struct("<4sHHII")
+
+
+def write_doc_store(doc_data, doc_urls, filepath, docs_per_block=DOCS_PER_BLOCK):
+    """
+    Writes the stored fields of doc_data (keyed by URL, see build_doc_data)
+    as a document store, in doc ID order (doc_urls[doc_id] is the URL of
+    doc_id). Neighbouring documents are compressed together, so the store
+    is much smaller than the raw texts.
+    """
+    fields = []
+    for url in doc_urls:
+        for field in doc_data.get(url, {}):
+            if field not in fields:
+                fields.append(field)
+    encoded_fields = json.dumps(fields).encode("utf-8")
+
+    blocks = bytearray()
+    offsets = array("I")
+    for start in range(0, len(doc_urls), docs_per_block):
+        documents = []
+        for url in doc_urls[start : start + docs_per_block]:
+            info = doc_data.get(url)
+            documents.append(None if info is None else [info.get(field) for field in fields])
+        offsets.append(len(blocks))
+        blocks += zlib.compress(json.dumps(documents, ensure_ascii=False).encode("utf-8"))
+    offsets.append(len(blocks))
+
+    with open(filepath, "wb") as f:
+        f.write(
+            HEADER.pack(
+                DOC_STORE_MAGIC,
+                DOC_STORE_VERSION,
+                docs_per_block,
+                len(doc_urls),
+                len(encoded_fields),
+            )
+        )
+        f.write(encoded_fields)
+        f.write(to_uint32_bytes(offsets))
+        f.write(blocks)
+
+
+class DocStore:
+    """
+    Read-only stored fields backed by a memory-mapped document store file.
+
+    Exposes the same read API as the doc_data dict of build_doc_data
+    (doc_data.get(url, {}), url in doc_data, ...), so it can be passed to
+    search() instead of it. Opening only reads the header and the offset
+    table: the fields of a document are decompressed with its block when
+    they are accessed, and the most recently used blocks are kept in a small
+    LRU cache. Memory no longer grows with the size of the texts, and only
+    the results returned by search() are read.
+    """
+
+    def __init__(self, filepath, doc_ids, cache_size=BLOCK_CACHE_SIZE):
+        """
+        :param doc_ids: URL -> doc ID dict of the indexes the store was
+                        written for (indexes["doc_ids"]).
+        """
+        self.filepath = filepath
+        self.doc_ids = doc_ids
+        with open(filepath, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, docs_per_block, n_docs, fields_length = HEADER.unpack_from(self._mm, 0)
+        if magic != DOC_STORE_MAGIC or version != DOC_STORE_VERSION:
+            raise ValueError(f"'{filepath}' is not a supported document store.")
+        self.docs_per_block = docs_per_block
+        self._n_docs = n_docs
+        self.fields = json.loads(self._mm[HEADER.size : HEADER.size + fields_length])
+        offsets_start = HEADER.size + fields_length
+        n_blocks = (n_docs + docs_per_block - 1) // docs_per_block
+        self._offsets = from_uint32_bytes(
+            self._mm[offsets_start : offsets_start + 4 * (n_blocks + 1)]
+        )
+        self._blocks_start = offsets_start + 4 * (n_blocks + 1)
+        self._block = lru_cache(maxsize=cache_size)(self._block)
+
+    def _block(self, block):
+        start = self._blocks_start + self._offsets[block]
+        end = self._blocks_start + self._offsets[block + 1]
+        return json.loads(zlib.decompress(self._mm[start:end]))
+
+    def document(self, doc_id):
+        """
+        Stored fields of doc_id ({field: value}), or None if it has none.
+        """
+        if not 0 <= doc_id < self._n_docs:
+            return None
+        values = self._block(doc_id // self.docs_per_block)[doc_id % self.docs_per_block]
+        return None if values is None else dict(zip(self.fields, values))
+
+    def get(self, url, default=None):
+        doc_id = self.doc_ids.get(url)
+        info = None if doc_id is None else self.document(doc_id)
+        return default if info is None else info
+
+    def __getitem__(self, url):
+        info = self.get(url)
+        if info is None:
+            raise KeyError(url)
+        return info
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __iter__(self):
+        for url in self.doc_ids:
+            if url in self:
+                yield url
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for url in self.doc_ids:
+            info = self.get(url)
+            if info is not None:
+                yield url, info
+
+    def values(self):
+        for _, info in self.items():
+            yield info
+
+    def close(self):
+        self._mm.close()
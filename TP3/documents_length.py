@@ -1,12 +1,7 @@
 import collections
-import nltk
-from nltk.corpus import stopwords
 from TP3.tokenize import tokenize
 from TP3.loadings import load_jsonl
 
-nltk.download("stopwords")
-STOPWORDS = set(stopwords.words("english"))
-
 
 # Should preferrably use the indexes instead of creating another dict.
 # It's for sure repetitive and suboptimal.
@@ -30,28 +25,35 @@ def build_doc_data(jsonl_filepath):
 
     for entry in raw_data:
         url = entry.get("url", "")
-
-        # Extract fields safely
-        title = entry.get("title", "")
-        description = entry.get("description", "")
-        product_features = entry.get("product_features", {})
-
-        # brand and origin might be found in product_features
-        brand = product_features.get("brand", "")
-        origin = product_features.get(
-            "made in", ""
-        )  # or "origin" if your data uses that key
-
-        doc_data[url] = {
-            "title": title,
-            "description": description,
-            "brand": brand,
-            "origin": origin,
-        }
+        doc_data[url] = extract_doc_fields(entry)
 
     return doc_data
 
 
+def extract_doc_fields(entry):
+    """
+    Returns the doc_data fields of one product of rearranged_products.jsonl:
+    {"title", "description", "brand", "origin"}.
+    """
+    # Extract fields safely
+    title = entry.get("title", "")
+    description = entry.get("description", "")
+    product_features = entry.get("product_features", {})
+
+    # brand and origin might be found in product_features
+    brand = product_features.get("brand", "")
+    origin = product_features.get(
+        "made in", ""
+    )  # or "origin" if your data uses that key
+
+    return {
+        "title": title,
+        "description": description,
+        "brand": brand,
+        "origin": origin,
+    }
+
+
 def compute_avgdl_per_field(doc_data, fields):
     """
     For each field, compute the average document length across all docs.
@@ -82,7 +84,7 @@ def compute_avgdl_per_field(doc_data, fields):
 def build_doc_data_from_indexes(indexes):
     """
     Build a pseudo doc_data from the existing indexes.
-    doc_data[doc_id] = {
+    doc_data[doc_url] = {
       "title": (reconstructed from token positions in title_index),
       "description": (reconstructed from token positions in description_index),
       "brand": (detected brand token(s)),
@@ -108,66 +110,37 @@ def build_doc_data_from_indexes(indexes):
 
     # 1) Reconstruct "title" from title_index
     if "title_index" in indexes:
-        for token, doc_dict_or_list in indexes["title_index"].items():
-            if isinstance(doc_dict_or_list, dict):
-                # { doc_id: [positions], ... }
-                for doc_id, positions in doc_dict_or_list.items():
-                    all_doc_ids.add(doc_id)
-                    if isinstance(positions, list):
-                        # Add each position and the token
-                        for pos in positions:
-                            title_tokens_positions[doc_id].append((pos, token))
-                    else:
-                        # If it's an int or something else, treat freq or single pos
-                        title_tokens_positions[doc_id].append((0, token))
-            elif isinstance(doc_dict_or_list, list):
-                # just a list of docs => no position data
-                for doc_id in doc_dict_or_list:
-                    all_doc_ids.add(doc_id)
-                    # We'll store token with some default position 0
-                    title_tokens_positions[doc_id].append((0, token))
+        for token, postings in indexes["title_index"].items():
+            for doc_id in postings:
+                all_doc_ids.add(doc_id)
+                # Positional postings give the token positions, otherwise
+                # we store the token with some default position 0
+                positions = postings.get(doc_id) or [0]
+                for pos in positions:
+                    title_tokens_positions[doc_id].append((pos, token))
 
     # 2) Reconstruct "description" from description_index
     if "description_index" in indexes:
-        for token, doc_dict_or_list in indexes["description_index"].items():
-            if isinstance(doc_dict_or_list, dict):
-                for doc_id, positions in doc_dict_or_list.items():
-                    all_doc_ids.add(doc_id)
-                    if isinstance(positions, list):
-                        for pos in positions:
-                            desc_tokens_positions[doc_id].append((pos, token))
-                    else:
-                        desc_tokens_positions[doc_id].append((0, token))
-            elif isinstance(doc_dict_or_list, list):
-                for doc_id in doc_dict_or_list:
-                    all_doc_ids.add(doc_id)
-                    desc_tokens_positions[doc_id].append((0, token))
+        for token, postings in indexes["description_index"].items():
+            for doc_id in postings:
+                all_doc_ids.add(doc_id)
+                positions = postings.get(doc_id) or [0]
+                for pos in positions:
+                    desc_tokens_positions[doc_id].append((pos, token))
 
     # 3) Detect brand(s) from brand_index
     if "brand_index" in indexes:
-        for brand_token, doc_list_or_dict in indexes["brand_index"].items():
-            if isinstance(doc_list_or_dict, dict):
-                # doc_list_or_dict => { doc_id: [positions], ... } or frequency
-                for doc_id in doc_list_or_dict.keys():
-                    all_doc_ids.add(doc_id)
-                    brand_map[doc_id].add(brand_token)
-            elif isinstance(doc_list_or_dict, list):
-                # doc_list_or_dict => [doc_id, doc_id, ...]
-                for doc_id in doc_list_or_dict:
-                    all_doc_ids.add(doc_id)
-                    brand_map[doc_id].add(brand_token)
+        for brand_token, postings in indexes["brand_index"].items():
+            for doc_id in postings:
+                all_doc_ids.add(doc_id)
+                brand_map[doc_id].add(brand_token)
 
     # 4) Detect origin(s) from origin_index
     if "origin_index" in indexes:
-        for origin_token, doc_list_or_dict in indexes["origin_index"].items():
-            if isinstance(doc_list_or_dict, dict):
-                for doc_id in doc_list_or_dict.keys():
-                    all_doc_ids.add(doc_id)
-                    origin_map[doc_id].add(origin_token)
-            elif isinstance(doc_list_or_dict, list):
-                for doc_id in doc_list_or_dict:
-                    all_doc_ids.add(doc_id)
-                    origin_map[doc_id].add(origin_token)
+        for origin_token, postings in indexes["origin_index"].items():
+            for doc_id in postings:
+                all_doc_ids.add(doc_id)
+                origin_map[doc_id].add(origin_token)
 
     # Build final doc_data
     doc_data = {}
@@ -194,7 +167,8 @@ def build_doc_data_from_indexes(indexes):
         # Combine origin tokens
         origin_str = ", ".join(sorted(origin_map[doc_id])) if origin_map[doc_id] else ""
 
-        doc_data[doc_id] = {
+        # doc_data is keyed by URL, like build_doc_data
+        doc_data[indexes["doc_urls"][doc_id]] = {
             "title": reconstructed_title if reconstructed_title else "Unknown Title",
             "description": (
                 reconstructed_desc if reconstructed_desc else "No description"
@@ -0,0 +1,325 @@
+import os
+import re
+from array import array
+
+from TP3.loadings import DOC_IDS_FILE, load_json
+
+# Feature indexes written by TP2 (one <feature>_index.json per product feature)
+FEATURES_FOLDER = "TP2/indexes/features"
+# Feature indexes of the TP3 indexes, used when no TP2 features are available
+INDEX_FACETS = {"brand": "brand_index", "origin": "origin_index"}
+FEATURE_INDEX_SUFFIX = "_index.json"
+# Near-duplicates collapsed by a dedup TP2 build ({canonical URL: [variant URLs]})
+VARIANTS_FILE = "variants.json"
+# A roaring container holds the doc IDs sharing their 16 high bits: a sorted
+# array('H') of the low bits while it has at most ARRAY_MAX values, else a
+# 65536-bit bitmap (a Python int)
+CONTAINER_BITS = 16
+ARRAY_MAX = 4096
+FILTER_PATTERN = re.compile(r"\s*([\w ]+?)\s*=\s*([^=]+?)\s*(?:\bAND\b|,|$)")
+
+
+# ---------------------- Roaring bitmaps ---------------------- #
+def _to_bits(container):
+    if isinstance(container, int):
+        return container
+    bits = bytearray(1 << (CONTAINER_BITS - 3))
+    for low in container:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _to_array(bits):
+    values = array("H")
+    data = bits.to_bytes(1 << (CONTAINER_BITS - 3), "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            lowest = byte & -byte
+            values.append(byte_index * 8 + lowest.bit_length() - 1)
+            byte ^= lowest
+    return values
+
+
+def _normalize(container):
+    """
+    Smallest representation of a container (None if empty).
+    """
+    if isinstance(container, int):
+        count = container.bit_count()
+        if count == 0:
+            return None
+        return _to_array(container) if count <= ARRAY_MAX else container
+    if not container:
+        return None
+    return container if len(container) <= ARRAY_MAX else _to_bits(container)
+
+
+def _cardinality(container):
+    return container.bit_count() if isinstance(container, int) else len(container)
+
+
+def _and(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a & b
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return array("H", (low for low in a if b >> low & 1))
+    return array("H", sorted(set(a).intersection(b)))
+
+
+def _and_count(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return (a & b).bit_count()
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return sum(b >> low & 1 for low in a)
+    return len(set(a).intersection(b))
+
+
+class Bitmap:
+    """
+    Compressed set of doc IDs (roaring-style): doc IDs are grouped by their
+    16 high bits, and each group is stored as a sorted array of its low bits
+    when sparse, or as a 65536-bit bitmap when dense. Intersections, unions
+    and intersection counts work container by container, with word-level
+    operations between dense containers.
+    """
+
+    __slots__ = ("containers",)
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}  # High bits -> container
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids):
+        """
+        Bitmap of an iterable of doc IDs.
+        """
+        groups = {}
+        for doc_id in sorted(set(doc_ids)):
+            groups.setdefault(doc_id >> CONTAINER_BITS, array("H")).append(
+                doc_id & 0xFFFF
+            )
+        return cls({high: _normalize(low) for high, low in groups.items()})
+
+    def __and__(self, other):
+        containers = {}
+        if len(self.containers) > len(other.containers):
+            self, other = other, self
+        for high, container in self.containers.items():
+            if high in other.containers:
+                result = _normalize(_and(container, other.containers[high]))
+                if result is not None:
+                    containers[high] = result
+        return Bitmap(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for high, container in other.containers.items():
+            if high in containers:
+                containers[high] = _normalize(_to_bits(containers[high]) | _to_bits(container))
+            else:
+                containers[high] = container
+        return Bitmap(containers)
+
+    def and_count(self, other):
+        """
+        len(self & other), without building the intersection.
+        """
+        if len(self.containers) > len(other.containers):
+            self, other = other, self
+        return sum(
+            _and_count(container, other.containers[high])
+            for high, container in self.containers.items()
+            if high in other.containers
+        )
+
+    def __contains__(self, doc_id):
+        container = self.containers.get(doc_id >> CONTAINER_BITS)
+        if container is None:
+            return False
+        low = doc_id & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        return low in container
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            if isinstance(container, int):
+                container = _to_array(container)
+            base = high << CONTAINER_BITS
+            for low in container:
+                yield base + low
+
+
+# ---------------------- Facet engine ---------------------- #
+def parse_facet_filters(filters):
+    """
+    Parses facet filters such as "brand=chocodelight AND made_in=switzerland"
+    (clauses separated by AND or commas; "colors=red|blue" accepts any of
+    the values). A list of (facet, value) pairs is accepted too.
+    :return: list of (facet, [values])
+    :raise ValueError: if the filters cannot be parsed.
+    """
+    if not isinstance(filters, str):
+        return [(facet, value.split("|")) for facet, value in filters]
+    clauses = FILTER_PATTERN.findall(filters)
+    if not clauses or "".join(FILTER_PATTERN.sub("", filters).split()):
+        raise ValueError(f"Invalid facet filters: '{filters}'")
+    return [(facet, value.split("|")) for facet, value in clauses]
+
+
+def facet_name(name):
+    """
+    Normalized facet name: "Made in" -> "made_in".
+    """
+    return "_".join(name.lower().split())
+
+
+class FacetIndex:
+    """
+    Product features as bitmaps over the dense doc IDs of the TP3 indexes:
+    {facet: {value token: Bitmap}}.
+
+    filter() intersects the bitmaps of the selected values (smallest first)
+    and counts() gives, for every facet value, the number of documents of a
+    result set having it (one intersection count per value bitmap).
+    """
+
+    def __init__(self, facets):
+        self.facets = facets
+
+    @classmethod
+    def from_indexes(cls, indexes, index_facets=INDEX_FACETS):
+        """
+        Facets of the feature indexes loaded with the TP3 indexes
+        (brand_index, origin_index).
+        """
+        facets = {}
+        for facet, index_name in index_facets.items():
+            if index_name in indexes:
+                facets[facet] = {
+                    value: Bitmap.from_doc_ids(postings.doc_ids)
+                    for value, postings in indexes[index_name].items()
+                }
+        return cls(facets)
+
+    @classmethod
+    def load(cls, features_folder, indexes):
+        """
+        Loads every TP2 feature index (<feature>_index.json) of a folder.
+        Documents are mapped to the doc IDs of indexes by URL (TP2 doc IDs
+        are translated with the doc_ids.json next to the features folder);
+        documents unknown to indexes are skipped. A dedup TP2 build only
+        indexes the canonical document of each cluster: with the
+        variants.json next to the features folder, the variants of a
+        canonical URL get its features too. Features whose names only differ
+        by spaces or underscores ("made in") are merged.
+        """
+        doc_ids = indexes["doc_ids"]
+        tp2_urls = None
+        tp2_folder = os.path.dirname(os.path.normpath(features_folder))
+        tp2_doc_ids_path = os.path.join(tp2_folder, DOC_IDS_FILE)
+        if os.path.exists(tp2_doc_ids_path):
+            tp2_urls = load_json(tp2_doc_ids_path)
+        variants = {}
+        variants_path = os.path.join(tp2_folder, VARIANTS_FILE)
+        if os.path.exists(variants_path):
+            variants = load_json(variants_path)
+
+        facets = {}
+        for filename in sorted(os.listdir(features_folder)):
+            if not filename.endswith(FEATURE_INDEX_SUFFIX):
+                continue
+            facet = facet_name(filename[: -len(FEATURE_INDEX_SUFFIX)])
+            values = facets.setdefault(facet, {})
+            for value, docs in load_json(os.path.join(features_folder, filename)).items():
+                if tp2_urls is not None:
+                    docs = [tp2_urls[doc] if isinstance(doc, int) else doc for doc in docs]
+                urls = [
+                    url for canonical in docs for url in (canonical, *variants.get(canonical, ()))
+                ]
+                bitmap = Bitmap.from_doc_ids(doc_ids[url] for url in urls if url in doc_ids)
+                values[value] = values[value] | bitmap if value in values else bitmap
+        return cls(facets)
+
+    def filter(self, filters):
+        """
+        Documents matching every clause of the facet filters (see
+        parse_facet_filters); the values of a clause are tokenized like the
+        features, and a multi-word value requires all its tokens.
+        :return: Bitmap
+        :raise ValueError: on an unknown facet.
+        """
+        clause_bitmaps = []
+        for facet, values in parse_facet_filters(filters):
+            facet = facet_name(facet)
+            if facet not in self.facets:
+                raise ValueError(f"Unknown facet '{facet}'")
+            clause = Bitmap()
+            for value in values:
+                tokens = re.findall(r"\w+", value.lower())
+                bitmaps = [self.facets[facet].get(token, Bitmap()) for token in tokens]
+                if bitmaps:
+                    bitmaps.sort(key=len)
+                    matching = bitmaps[0]
+                    for bitmap in bitmaps[1:]:
+                        matching &= bitmap
+                    clause |= matching
+            clause_bitmaps.append(clause)
+        if not clause_bitmaps:
+            return Bitmap()
+        clause_bitmaps.sort(key=len)
+        result = clause_bitmaps[0]
+        for bitmap in clause_bitmaps[1:]:
+            if not result.containers:
+                break
+            result &= bitmap
+        return result
+
+    def counts(self, result, facets=None):
+        """
+        Facet value counts of a result set (a Bitmap).
+        :param facets: facets to count (all by default).
+        :return: {facet: {value: count}}, values sorted by decreasing count,
+                 without the values absent from the result set.
+        """
+        # The result containers are prepared once (bits and set of low bits),
+        # so each value container is counted with one C-level operation
+        prepared = {}
+        for high, container in result.containers.items():
+            if isinstance(container, int):
+                prepared[high] = (container, set(_to_array(container)))
+            else:
+                prepared[high] = (None, set(container))
+
+        def count_in_result(bitmap):
+            count = 0
+            for high, container in bitmap.containers.items():
+                if high not in prepared:
+                    continue
+                bits, lows = prepared[high]
+                if not isinstance(container, int):
+                    count += len(lows.intersection(container))
+                elif bits is not None:
+                    count += (bits & container).bit_count()
+                else:
+                    count += sum(container >> low & 1 for low in lows)
+            return count
+
+        counts = {}
+        for facet in facets or self.facets:
+            value_counts = []
+            for value, bitmap in self.facets[facet_name(facet)].items():
+                count = count_in_result(bitmap)
+                if count:
+                    value_counts.append((value, count))
+            value_counts.sort(key=lambda item: (-item[1], item[0]))
+            counts[facet] = dict(value_counts)
+        return counts
@@ -1,8 +1,7 @@
 from collections import defaultdict
 
-from nltk.corpus import stopwords
-
-STOPWORDS = set(stopwords.words("english"))
+from TP3.boolean import DEFAULT_INDEXES, evaluate
+from TP3.stopwords import STOPWORDS
 
 
 def filter_docs_any_token(query_tokens, indexes):
@@ -12,11 +11,11 @@ def filter_docs_any_token(query_tokens, indexes):
 
     indexes is expected to have the typical structure, e.g.:
         {
-            "title_index": { token: { doc_id: ... }, ... },
-            "description_index": { token: { doc_id: ... }, ... },
+            "title_index": { token: Postings, ... },
+            "description_index": { token: Postings, ... },
             ...
         }
-    Returns a dict: { doc_id: matched_token_count }
+    Returns a dict: { doc_id: matched_token_count } with integer doc IDs
     """
     relevant_docs = defaultdict(int)
 
@@ -45,38 +44,14 @@ def filter_docs_all_tokens(query_tokens, indexes):
     """
     Filter documents: keep those that contain ALL tokens in query_tokens
     (AND-based filtering), ignoring stopwords.
+
+    The AND is evaluated by the boolean query planner (TP3.boolean): from
+    the rarest token, with galloping searches in the postings of the others,
+    stopping at the first token without postings.
     """
     query_tokens = [t for t in query_tokens if t not in STOPWORDS]
     if not query_tokens:
         return {}
 
-    fields_to_check = ["title_index", "description_index", "origin_index", "brand"]
-    docs_for_each_token = []
-
-    for token in query_tokens:
-        doc_ids_for_token = set()
-        for field in fields_to_check:
-            if field in indexes and token in indexes[field]:
-                doc_list_or_dict = indexes[field][token]
-
-                # Check if it’s a dict or a list
-                if isinstance(doc_list_or_dict, dict):
-                    # Old approach
-                    doc_ids_for_token.update(doc_list_or_dict.keys())
-                elif isinstance(doc_list_or_dict, list):
-                    # Just add them directly
-                    doc_ids_for_token.update(doc_list_or_dict)
-                else:
-                    # Unexpected structure -> skip or handle differently
-                    pass
-
-        if not doc_ids_for_token:
-            # If no docs for a particular token, no doc can match all
-            return {}
-        docs_for_each_token.append(doc_ids_for_token)
-
-    # Intersect them all
-    docs_with_all_tokens = set.intersection(*docs_for_each_token)
-
-    # Build your result
-    return {doc_id: len(query_tokens) for doc_id in docs_with_all_tokens}
+    node = ("and", tuple(("term", token, DEFAULT_INDEXES) for token in set(query_tokens)))
+    return {doc_id: len(query_tokens) for doc_id in evaluate(node, indexes)}
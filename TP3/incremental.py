@@ -0,0 +1,772 @@
+import json
+import os
+import re
+import shutil
+import threading
+from array import array
+from bisect import bisect_right
+from collections import ChainMap, defaultdict
+from functools import lru_cache
+from itertools import accumulate
+from urllib.parse import urlparse
+
+import numpy as np
+
+from TP3.compression import to_uint32_array
+from TP3.corpus_stats import STATS_FIELDS, get_corpus_stats
+from TP3.documents_length import extract_doc_fields
+from TP3.loadings import DOC_KEYED_INDEXES, META_KEYS, load_json
+from TP3.postings import Postings
+from TP3.segment import DECODED_CACHE_SIZE, SEGMENT_EXTENSION, SegmentIndex, write_segment
+from TP3.tokenize import tokenize
+
+# Postings indexes filled for new products (same layout as TP3/data/indexes)
+POSITIONAL_FIELDS = {"title_index": "title", "description_index": "description"}
+VALUE_FIELDS = {"brand_index": "brand", "origin_index": "origin"}
+DELETED_FILE = "deleted.bin"
+SEGMENT_META_FILE = "segment.json"
+# Entries of a segment dict that are not indexes
+SEGMENT_METADATA = ("doc_urls", "documents", "reviews_index")
+# Initial capacity of the doc length columns (doubled when full)
+MIN_LENGTHS_CAPACITY = 1024
+
+
+def index_products(products, first_doc_id):
+    """
+    Indexes new products (rearranged_products.jsonl format) as one in-memory
+    segment, giving them the doc IDs first_doc_id, first_doc_id + 1, ...
+
+    Returns a segment dict:
+    {
+      "doc_urls": [url, ...],
+      "documents": [doc_data fields, ...],
+      "title_index": {token: Postings}, ..., "reviews_index": {doc_id: {...}}
+    }
+    """
+    postings = defaultdict(lambda: defaultdict(dict))
+    reviews = {}
+    doc_urls = []
+    documents = []
+    for offset, product in enumerate(products):
+        doc_id = first_doc_id + offset
+        fields = extract_doc_fields(product)
+        doc_urls.append(product["url"])
+        documents.append(fields)
+
+        for index_name, field in POSITIONAL_FIELDS.items():
+            for pos, token in enumerate(tokenize(fields[field])):
+                postings[index_name][token].setdefault(doc_id, []).append(pos)
+        for index_name, field in VALUE_FIELDS.items():
+            if fields[field]:
+                postings[index_name][fields[field].lower()][doc_id] = None
+        domain = re.sub(r"\W+", "", urlparse(product["url"]).netloc.lower())
+        if domain:
+            postings["domain_index"][domain][doc_id] = None
+
+        ratings = [r["rating"] for r in product.get("product_reviews", []) if "rating" in r]
+        reviews[doc_id] = {
+            "total_reviews": len(ratings),
+            "mean_mark": round(sum(ratings) / len(ratings), 2) if ratings else 0,
+            "last_rating": ratings[-1] if ratings else 0,
+        }
+
+    segment = {"doc_urls": doc_urls, "documents": documents, "reviews_index": reviews}
+    for index_name, index in postings.items():
+        positional = index_name in POSITIONAL_FIELDS
+        segment[index_name] = {
+            token: Postings(
+                array("I", docs),
+                [array("I", docs[doc_id]) for doc_id in docs] if positional else None,
+            )
+            for token, docs in index.items()
+        }
+    return segment
+
+
+class MultiSegmentIndex:
+    """
+    One index (e.g. title_index) seen across a snapshot of the live segments
+    of an IncrementalIndex, with the same API as a {token: Postings} dict.
+
+    Segments hold disjoint, increasing doc ID ranges, so the postings of a
+    token are the concatenation of its per-segment postings, minus the
+    documents marked in the deletion bitmap. The snapshot never changes, so
+    merged postings are cached like decoded ones in SegmentIndex.
+    """
+
+    def __init__(self, segment_indexes, deleted):
+        self._segment_indexes = segment_indexes
+        self._deleted = np.frombuffer(deleted, dtype=np.uint8)
+        self._has_deletions = bool(self._deleted.any())
+        self._merge_postings = lru_cache(maxsize=DECODED_CACHE_SIZE)(self._merge_postings)
+
+    def _kept(self, doc_ids):
+        """
+        Indices of the doc IDs that are not deleted (None if all are kept),
+        read from the deletion bitmap for the whole postings at once.
+        """
+        if not self._has_deletions:
+            return None
+        doc_ids = np.frombuffer(doc_ids, dtype=np.uint32)
+        deleted = (self._deleted[doc_ids >> 3] >> (doc_ids & 7).astype(np.uint8)) & 1
+        if not deleted.any():
+            return None
+        return np.flatnonzero(deleted == 0)
+
+    def _merge_postings(self, token):
+        parts = []
+        for index in self._segment_indexes:
+            postings = index.get(token)
+            if postings is None or not len(postings):
+                continue
+            kept = self._kept(postings.doc_ids)
+            if kept is None or len(kept):
+                parts.append((postings, kept))
+        if not parts:
+            return None
+        if len(parts) == 1 and parts[0][1] is None:
+            return parts[0][0]  # Nothing to remove: no copy
+        doc_ids = to_uint32_array(
+            np.concatenate(
+                [
+                    np.frombuffer(postings.doc_ids, dtype=np.uint32)[kept]
+                    if kept is not None
+                    else np.frombuffer(postings.doc_ids, dtype=np.uint32)
+                    for postings, kept in parts
+                ]
+            )
+        )
+        if all(postings.positions is None for postings, _ in parts):
+            return Postings(doc_ids)
+        return Postings(doc_ids, MergedPositions(parts))
+
+    def get(self, token, default=None):
+        postings = self._merge_postings(token)
+        return default if postings is None else postings
+
+    def __getitem__(self, token):
+        postings = self._merge_postings(token)
+        if postings is None:
+            raise KeyError(token)
+        return postings
+
+    def __contains__(self, token):
+        return self._merge_postings(token) is not None
+
+    def df(self, token):
+        postings = self._merge_postings(token)
+        return len(postings) if postings is not None else 0
+
+    def __iter__(self):
+        seen = set()
+        for index in self._segment_indexes:
+            for token in index:
+                if token not in seen and token in self:
+                    seen.add(token)
+                    yield token
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for token in self:
+            yield token, self._merge_postings(token)
+
+    def values(self):
+        for _, postings in self.items():
+            yield postings
+
+
+class MergedPositions:
+    """
+    Positions of postings merged by MultiSegmentIndex, read lazily from the
+    per-segment postings: positions[i] is the array('I') of positions of the
+    i-th merged document (empty for presence-only segment postings).
+    """
+
+    __slots__ = ("_parts", "_starts")
+
+    def __init__(self, parts):
+        """
+        :param parts: list of (segment postings, indices of their kept documents or None for all).
+        """
+        self._parts = parts
+        self._starts = list(
+            accumulate((len(postings) if kept is None else len(kept) for postings, kept in parts), initial=0)
+        )
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        part = bisect_right(self._starts, i) - 1
+        postings, kept = self._parts[part]
+        if postings.positions is None:
+            return array("I")
+        offset = i - self._starts[part]
+        return postings.positions[offset if kept is None else int(kept[offset])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self):
+        """
+        Number of positions of every document (array('I')).
+        """
+        lengths = []
+        for postings, kept in self._parts:
+            tfs = postings.term_frequencies()
+            tfs = (
+                np.zeros(len(postings), dtype=np.uint32)
+                if tfs is None
+                else np.frombuffer(tfs, dtype=np.uint32)
+            )
+            lengths.append(tfs if kept is None else tfs[kept])
+        return to_uint32_array(np.concatenate(lengths))
+
+
+class PrefixView:
+    """
+    Read-only view of the first `length` items of an append-only list
+    (the doc_urls of a published snapshot).
+    """
+
+    __slots__ = ("_items", "_length")
+
+    def __init__(self, items, length):
+        self._items = items
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._items[j] for j in range(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return self._items[i]
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self._items[i]
+
+
+class DocIdsView:
+    """
+    URL -> doc ID dictionary of a published snapshot, with the read API of
+    a dict. Nothing is copied: the base dictionary is never modified, the
+    doc IDs given to added URLs are only appended, and the snapshot only
+    sees the doc IDs below its end that its deletion bitmap keeps.
+    """
+
+    def __init__(self, base, added, doc_urls, deleted, live_docs):
+        """
+        :param base: URL -> doc ID dict of the base indexes.
+        :param added: URL -> list of the doc IDs given to it since (append-only).
+        :param doc_urls: PrefixView of the doc IDs of the snapshot.
+        :param deleted: deletion bitmap of the snapshot.
+        :param live_docs: number of documents that are not deleted.
+        """
+        self._base = base
+        self._added = added
+        self._doc_urls = doc_urls
+        self._deleted = deleted
+        self._live_docs = live_docs
+
+    def _is_deleted(self, doc_id):
+        return bool(self._deleted[doc_id // 8] & (1 << (doc_id % 8)))
+
+    def get(self, url, default=None):
+        end = len(self._doc_urls)
+        for doc_id in reversed(self._added.get(url, ())):
+            # A URL is deleted before being added again: only its last doc ID can be live
+            if doc_id < end:
+                return default if self._is_deleted(doc_id) else doc_id
+        doc_id = self._base.get(url)
+        if doc_id is None or self._is_deleted(doc_id):
+            return default
+        return doc_id
+
+    def __getitem__(self, url):
+        doc_id = self.get(url)
+        if doc_id is None:
+            raise KeyError(url)
+        return doc_id
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __len__(self):
+        return self._live_docs
+
+    def values(self):
+        """
+        Live doc IDs, in increasing order.
+        """
+        for doc_id in range(len(self._doc_urls)):
+            if not self._is_deleted(doc_id):
+                yield doc_id
+
+    def items(self):
+        for doc_id in self.values():
+            yield self._doc_urls[doc_id], doc_id
+
+    def __iter__(self):
+        for url, _ in self.items():
+            yield url
+
+    def keys(self):
+        return iter(self)
+
+
+class DocDataView:
+    """
+    Read-only doc_data of an IncrementalIndex, with the read API of the
+    build_doc_data dict (get, in, items, ...). The base doc_data (a dict or
+    a TP3.docstore.DocStore) is never modified: the fields of added
+    products are kept by the IncrementalIndex, by doc ID, and a URL is only
+    visible while doc_ids (the published doc-ID dictionary) maps it.
+    """
+
+    def __init__(self, base, base_docs, added_fields, doc_ids):
+        """
+        :param base_docs: number of doc IDs of the base indexes.
+        :param added_fields: fields of the added doc IDs base_docs, base_docs + 1, ...
+        """
+        self._base = base
+        self._base_docs = base_docs
+        self._added_fields = added_fields
+        self._doc_ids = doc_ids
+
+    def get(self, url, default=None):
+        doc_id = self._doc_ids.get(url)
+        if doc_id is None:
+            return default
+        if doc_id < self._base_docs:
+            return self._base.get(url, default)
+        return self._added_fields[doc_id - self._base_docs] or default
+
+    def __getitem__(self, url):
+        info = self.get(url)
+        if info is None:
+            raise KeyError(url)
+        return info
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __iter__(self):
+        for url in self._doc_ids:
+            if url in self:
+                yield url
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for url in self._doc_ids:
+            info = self.get(url)
+            if info is not None:
+                yield url, info
+
+    def values(self):
+        for _, info in self.items():
+            yield info
+
+
+class IncrementalIndex:
+    """
+    Live index accepting product additions, updates and deletions by URL
+    without rebuilding the base indexes.
+
+    - Each batch of added products becomes a small new segment, with new
+      doc IDs after all existing ones.
+    - Deleted (or updated) products are marked in a deletion bitmap; their
+      postings stay in their segment and are filtered out at query time.
+    - When there are more than max_segments added segments, they are merged
+      into one (in a background thread by default), dropping deleted docs.
+    - The corpus statistics (N, doc lengths, avgdl) are kept up to date with
+      running totals.
+
+    If segment_folder is given, new segments (binary segments, see
+    TP3.segment, plus their documents) and the deletion bitmap are written
+    there, and reopened on the next start.
+
+    Use `live.indexes` and `live.doc_data` as the indexes and doc_data of
+    search(). Every update publishes a new indexes dict (a consistent
+    snapshot for the queries using it) whose "version" is incremented, and
+    a new doc_data view (DocDataView): the doc_data given here, which may be
+    a read-only DocStore, is never modified.
+    """
+
+    def __init__(
+        self,
+        indexes,
+        doc_data,
+        segment_folder=None,
+        max_segments=8,
+        background_merge=True,
+    ):
+        self.base_doc_data = doc_data
+        self.segment_folder = segment_folder
+        self.max_segments = max_segments
+        self.background_merge = background_merge
+        self.version = indexes.get("version", 0)
+
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread = None
+
+        base_stats = get_corpus_stats(indexes, doc_data)
+        base_names = [
+            name
+            for name in indexes
+            if name not in META_KEYS and name not in DOC_KEYED_INDEXES and name != "version"
+        ]
+        self.doc_urls = list(indexes["doc_urls"])
+        # Fields of the added products, indexed by doc ID - _base_docs
+        self._base_docs = len(self.doc_urls)
+        self._added_fields = []
+        # Published snapshots share these structures instead of copying them:
+        # the base doc IDs are never modified, added doc IDs and doc lengths
+        # are only appended (see DocIdsView, PrefixView)
+        self._base_doc_ids = indexes["doc_ids"]
+        self._added_doc_ids = {}
+        self.deleted = bytearray((len(self.doc_urls) + 7) // 8)
+        self.doc_lengths = {}
+        for field in STATS_FIELDS:
+            lengths = np.asarray(base_stats["doc_lengths"][field], dtype=np.uint32)
+            self.doc_lengths[field] = np.zeros(
+                max(2 * len(lengths), MIN_LENGTHS_CAPACITY), dtype=np.uint32
+            )
+            self.doc_lengths[field][: len(lengths)] = lengths
+        self._live_docs = len(self.doc_urls)
+        self._length_totals = {
+            field: int(self.doc_lengths[field].sum()) for field in STATS_FIELDS
+        }
+
+        # The base indexes are the first segment; it is never merged.
+        # _segment_ranges[i] is the [first, end) doc ID range of segment i
+        self.segments = [{name: indexes[name] for name in base_names}]
+        # Reviews of each segment (never modified once added)
+        self._segment_reviews = [indexes.get("reviews_index", {})]
+        self._segment_ranges = [(0, len(self.doc_urls))]
+        self._segment_dirs = [None]
+
+        if segment_folder:
+            os.makedirs(segment_folder, exist_ok=True)
+            self._open_segments()
+        self._publish()
+
+    # ---------------------- Updates ---------------------- #
+    def add_products(self, products):
+        """
+        Adds (or updates, if their URL is already indexed) products, as one
+        new segment.
+        """
+        products = [product for product in products if product.get("url")]
+        if not products:
+            return
+        with self._lock:
+            for product in products:
+                self._delete(product["url"])
+            self._add_segment(index_products(products, len(self.doc_urls)))
+            if self.segment_folder:
+                self._segment_dirs[-1] = self._write_segment(len(self.segments) - 1)
+                self._write_deleted()
+            self._publish()
+        self._maybe_merge()
+
+    def add_product(self, product):
+        """
+        Adds one product, or updates it if its URL is already indexed.
+        """
+        self.add_products([product])
+
+    update_product = add_product
+
+    def delete_product(self, url):
+        """
+        Deletes the product with this URL (no-op if it is not indexed).
+        """
+        with self._lock:
+            if self._delete(url):
+                if self.segment_folder:
+                    self._write_deleted()
+                self._publish()
+
+    def is_deleted(self, doc_id):
+        """
+        Checks the deletion bitmap.
+        """
+        byte = doc_id // 8
+        return byte < len(self.deleted) and bool(self.deleted[byte] & (1 << (doc_id % 8)))
+
+    def _live_doc_ids(self):
+        """
+        Current URL -> doc ID dictionary (not a snapshot: only for updates).
+        """
+        return DocIdsView(
+            self._base_doc_ids,
+            self._added_doc_ids,
+            PrefixView(self.doc_urls, len(self.doc_urls)),
+            self.deleted,
+            self._live_docs,
+        )
+
+    def _delete(self, url):
+        doc_id = self._live_doc_ids().get(url)
+        if doc_id is None:
+            return False
+        self._delete_doc_id(doc_id)
+        return True
+
+    def _delete_doc_id(self, doc_id):
+        self.deleted[doc_id // 8] |= 1 << (doc_id % 8)
+        self._live_docs -= 1
+        for field in STATS_FIELDS:
+            self._length_totals[field] -= int(self.doc_lengths[field][doc_id])
+
+    def _append_lengths(self, doc_id, fields):
+        for field in STATS_FIELDS:
+            lengths = self.doc_lengths[field]
+            if doc_id >= len(lengths):
+                # New column: published snapshots keep views of the old one
+                grown = np.zeros(2 * len(lengths), dtype=np.uint32)
+                grown[: len(lengths)] = lengths
+                self.doc_lengths[field] = lengths = grown
+            lengths[doc_id] = len(tokenize(fields.get(field, "")))
+
+    def _add_segment(self, segment):
+        first_doc_id = len(self.doc_urls)
+        end_doc_id = first_doc_id + len(segment["doc_urls"])
+        self.deleted.extend(bytes((end_doc_id + 7) // 8 - len(self.deleted)))
+        for offset, (url, fields) in enumerate(zip(segment["doc_urls"], segment["documents"])):
+            doc_id = first_doc_id + offset
+            self.doc_urls.append(url)
+            self._added_fields.append(fields)
+            self._append_lengths(doc_id, fields)
+            if not fields:
+                # Document deleted before its segment was written (reopened segment)
+                self.deleted[doc_id // 8] |= 1 << (doc_id % 8)
+                continue
+            self._added_doc_ids.setdefault(url, []).append(doc_id)
+            self._live_docs += 1
+            for field in STATS_FIELDS:
+                self._length_totals[field] += int(self.doc_lengths[field][doc_id])
+        self._segment_reviews.append(segment["reviews_index"])
+        self.segments.append(
+            {name: index for name, index in segment.items() if name not in SEGMENT_METADATA}
+        )
+        self._segment_ranges.append((first_doc_id, end_doc_id))
+        self._segment_dirs.append(None)
+
+    def _publish(self):
+        """
+        Publishes a new indexes dict for search(): a snapshot of the segments,
+        the deletion bitmap and the statistics. Queries running on the
+        previous dict keep a consistent view. Only the deletion bitmap is
+        copied (N / 8 bytes); the other structures are shared with views
+        limited to the doc IDs of the snapshot.
+        """
+        end = len(self.doc_urls)
+        deleted = bytes(self.deleted)
+        doc_urls = PrefixView(self.doc_urls, end)
+        index_names = []
+        for segment in self.segments:
+            index_names.extend(name for name in segment if name not in index_names)
+
+        self.version += 1
+        indexes = {
+            "doc_urls": doc_urls,
+            "doc_ids": DocIdsView(
+                self._base_doc_ids, self._added_doc_ids, doc_urls, deleted, self._live_docs
+            ),
+            "stats": {
+                "total_docs": self._live_docs,
+                "doc_lengths": {
+                    field: lengths[:end] for field, lengths in self.doc_lengths.items()
+                },
+                "avgdl": {
+                    field: total / self._live_docs if self._live_docs > 0 else 1
+                    for field, total in self._length_totals.items()
+                },
+            },
+            "reviews_index": ChainMap(*self._segment_reviews),
+            "version": self.version,
+        }
+        for name in index_names:
+            indexes[name] = MultiSegmentIndex(
+                [segment[name] for segment in self.segments if name in segment], deleted
+            )
+        self.doc_data = DocDataView(
+            self.base_doc_data, self._base_docs, self._added_fields, indexes["doc_ids"]
+        )
+        self.indexes = indexes
+
+    # ---------------------- Merge Policy ---------------------- #
+    def _maybe_merge(self):
+        if len(self.segments) - 1 <= self.max_segments:
+            return
+        if not self.background_merge:
+            self.merge_segments()
+        elif self._merge_thread is None or not self._merge_thread.is_alive():
+            self._merge_thread = threading.Thread(target=self.merge_segments, daemon=True)
+            self._merge_thread.start()
+
+    def wait_for_merges(self):
+        """
+        Blocks until the running background merge (if any) is done.
+        """
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+
+    def merge_segments(self):
+        """
+        Compacts all the added segments into a single one, dropping the
+        postings of deleted documents. The base segment is left untouched.
+        Updates can go on during the merge: segments added meanwhile stay
+        after the merged one, and deletions are applied by the bitmap.
+        """
+        with self._merge_lock:
+            with self._lock:
+                to_merge = self.segments[1:]
+                merged_range = (self._segment_ranges[1][0], self._segment_ranges[-1][1]) if to_merge else None
+                old_dirs = self._segment_dirs[1:]
+                reviews_to_merge = self._segment_reviews[1:]
+                deleted = bytes(self.deleted)
+            if len(to_merge) < 2:
+                return
+
+            merged = {}
+            for name in set().union(*to_merge):
+                view = MultiSegmentIndex([segment[name] for segment in to_merge if name in segment], deleted)
+                # Positions are copied out of the merged segments, which are dropped
+                merged[name] = {
+                    token: Postings(
+                        postings.doc_ids,
+                        None if postings.positions is None else list(postings.positions),
+                    )
+                    for token, postings in view.items()
+                }
+            merged_reviews = {
+                doc_id: info
+                for reviews in reviews_to_merge
+                for doc_id, info in reviews.items()
+                if not deleted[doc_id // 8] & (1 << (doc_id % 8))
+            }
+
+            with self._lock:
+                added_since = self.segments[1 + len(to_merge) :]
+                self.segments = [self.segments[0], merged] + added_since
+                self._segment_reviews = (
+                    self._segment_reviews[:1]
+                    + [merged_reviews]
+                    + self._segment_reviews[1 + len(to_merge) :]
+                )
+                self._segment_ranges = (
+                    self._segment_ranges[:1] + [merged_range] + self._segment_ranges[1 + len(to_merge) :]
+                )
+                self._segment_dirs = [None, None] + self._segment_dirs[1 + len(to_merge) :]
+                if self.segment_folder:
+                    self._segment_dirs[1] = self._write_segment(1)
+                    for old_dir in old_dirs:
+                        if old_dir:
+                            shutil.rmtree(old_dir, ignore_errors=True)
+                self._publish()
+
+    # ---------------------- Persistence ---------------------- #
+    def _write_segment(self, position):
+        """
+        Writes segment number `position` to a new folder of segment_folder:
+        one binary segment per index, plus its documents (URL, doc_data fields
+        and reviews; no fields for deleted documents) in segment.json.
+        """
+        first_doc_id, end_doc_id = self._segment_ranges[position]
+        doc_urls = self.doc_urls[first_doc_id:end_doc_id]
+        meta = {
+            "first_doc_id": first_doc_id,
+            "doc_urls": doc_urls,
+            "documents": [
+                {} if self.is_deleted(doc_id) else self._added_fields[doc_id - self._base_docs]
+                for doc_id in range(first_doc_id, end_doc_id)
+            ],
+            "reviews_index": {
+                doc_id: self._segment_reviews[position][doc_id]
+                for doc_id in range(first_doc_id, end_doc_id)
+                if doc_id in self._segment_reviews[position]
+            },
+        }
+
+        existing = [name for name in os.listdir(self.segment_folder) if name.startswith("seg_")]
+        number = max((int(name[4:10]) for name in existing), default=0) + 1
+        segment_dir = os.path.join(self.segment_folder, f"seg_{number:06d}")
+        tmp_dir = segment_dir + ".tmp"
+        os.makedirs(tmp_dir)
+        for name, index in self.segments[position].items():
+            write_segment(index, os.path.join(tmp_dir, f"{name}{SEGMENT_EXTENSION}"))
+        with open(os.path.join(tmp_dir, SEGMENT_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp_dir, segment_dir)
+        return segment_dir
+
+    def _write_deleted(self):
+        path = os.path.join(self.segment_folder, DELETED_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(self.deleted)
+        os.replace(path + ".tmp", path)
+
+    def _open_segments(self):
+        """
+        Reopens the segments written by a previous run, in doc ID order,
+        then applies the saved deletion bitmap.
+        """
+        loaded = []
+        for name in os.listdir(self.segment_folder):
+            segment_dir = os.path.join(self.segment_folder, name)
+            if name.endswith(".tmp"):
+                shutil.rmtree(segment_dir, ignore_errors=True)  # Interrupted write
+            elif name.startswith("seg_"):
+                meta = load_json(os.path.join(segment_dir, SEGMENT_META_FILE))
+                loaded.append((meta["first_doc_id"], segment_dir, meta))
+
+        for first_doc_id, segment_dir, meta in sorted(loaded):
+            if first_doc_id != len(self.doc_urls):
+                # Left over by a merge interrupted before removing its inputs
+                shutil.rmtree(segment_dir, ignore_errors=True)
+                continue
+            segment = {
+                name[: -len(SEGMENT_EXTENSION)]: SegmentIndex(os.path.join(segment_dir, name))
+                for name in os.listdir(segment_dir)
+                if name.endswith(SEGMENT_EXTENSION)
+            }
+            segment["doc_urls"] = meta["doc_urls"]
+            segment["documents"] = meta["documents"]
+            segment["reviews_index"] = {int(k): v for k, v in meta["reviews_index"].items()}
+            self._add_segment(segment)
+            self._segment_dirs[-1] = segment_dir
+
+        deleted_path = os.path.join(self.segment_folder, DELETED_FILE)
+        if os.path.exists(deleted_path):
+            with open(deleted_path, "rb") as f:
+                saved = f.read()
+            # By doc ID: a URL deleted then added again has a deleted doc ID
+            # in the base and a live one in a segment
+            for doc_id in list(self._live_doc_ids().values()):
+                byte = doc_id // 8
+                if byte < len(saved) and saved[byte] & (1 << (doc_id % 8)):
+                    self._delete_doc_id(doc_id)
@@ -1,6 +1,18 @@
 import json
 import os
 
+from TP3.corpus_stats import STATS_FILE, load_corpus_stats
+from TP3.doc_tables import DOC_TABLE_EXTENSION, URL_TABLE_FILE, DocTable, UrlTable
+from TP3.postings import build_doc_ids, to_doc_id, to_postings
+from TP3.segment import SEGMENT_EXTENSION, SegmentIndex
+
+# Indexes keyed by document rather than by token (no postings to convert)
+DOC_KEYED_INDEXES = ("reviews_index",)
+# Optional doc-ID dictionary written at index time (list of URLs, position = ID)
+DOC_IDS_FILE = "doc_ids.json"
+# Entries of the loaded indexes dict that are not indexes
+META_KEYS = ("doc_urls", "doc_ids", "stats")
+
 
 def load_json(filepath):
     """
@@ -21,13 +33,24 @@ def load_jsonl(filepath):
     return data
 
 
-def load_indexes(index_folder):
+def load_indexes(index_folder, mode="json"):
     """
-    Loads all JSON index files from the specified folder into a dictionary.
+    Loads all index files from the specified folder into a dictionary.
+
+    mode="json" (default) parses every JSON index of the folder in memory.
+    mode="mmap" opens a segment folder written by TP3.segment.build_segments:
+    each *.seg file becomes a SegmentIndex, which supports the same
+    `token in index` / `index[token]` API but only decodes the postings a
+    query touches, so startup time does not depend on the corpus size.
 
     Each file name (without extension) becomes the index key,
     and the loaded JSON becomes the value.
 
+    Documents are identified by dense integer IDs instead of URLs:
+    postings become Postings objects (sorted array('I') of doc IDs) and
+    doc-keyed indexes are re-keyed by ID. The doc-ID dictionary is read from
+    doc_ids.json if the folder has one, otherwise built from the indexes.
+
     Example:
         index_folder/
             title_index.json
@@ -35,15 +58,74 @@ def load_indexes(index_folder):
             reviews_index.json
             ...
         => {
-            "title_index": {...},
-            "description_index": {...},
-            "reviews_index": {...}
+            "doc_urls": [url_0, url_1, ...],
+            "doc_ids": {url_0: 0, url_1: 1, ...},
+            "title_index": {token: Postings, ...},
+            "description_index": {token: Postings, ...},
+            "reviews_index": {doc_id: {...}, ...}
         }
     """
-    indexes = {}
+    if mode == "mmap":
+        return load_segment_indexes(index_folder)
+    if mode != "json":
+        raise ValueError(f"Unknown index loading mode: '{mode}'")
+
+    raw_indexes = {}
     for filename in os.listdir(index_folder):
-        if filename.endswith(".json"):
+        if filename.endswith(".json") and filename != DOC_IDS_FILE:
             index_name = filename.replace(".json", "")
             full_path = os.path.join(index_folder, filename)
-            indexes[index_name] = load_json(full_path)
+            raw_indexes[index_name] = load_json(full_path)
+
+    doc_ids_path = os.path.join(index_folder, DOC_IDS_FILE)
+    if os.path.exists(doc_ids_path):
+        doc_urls = load_json(doc_ids_path)
+        doc_ids = {url: doc_id for doc_id, url in enumerate(doc_urls)}
+    else:
+        doc_urls, doc_ids = build_doc_ids(raw_indexes, DOC_KEYED_INDEXES)
+
+    indexes = {"doc_urls": doc_urls, "doc_ids": doc_ids}
+    for index_name, raw_index in raw_indexes.items():
+        if index_name in DOC_KEYED_INDEXES:
+            indexes[index_name] = {
+                to_doc_id(doc, doc_ids): value for doc, value in raw_index.items()
+            }
+        else:
+            indexes[index_name] = {
+                token: to_postings(docs, doc_ids) for token, docs in raw_index.items()
+            }
+    return indexes
+
+
+def load_segment_indexes(segment_folder):
+    """
+    Opens a segment folder (see load_indexes with mode="mmap").
+    Postings indexes, the doc-ID dictionary (URL table) and the doc-keyed
+    indexes (doc-keyed tables) are memory-mapped lazily, so opening does not
+    depend on the number of documents; only the corpus statistics segment
+    (stored as indexes["stats"]) is read directly. Folders written before
+    the tables existed (doc_ids.json and <name>.json) are still read.
+    """
+    url_table_path = os.path.join(segment_folder, URL_TABLE_FILE)
+    if os.path.exists(url_table_path):
+        doc_urls = UrlTable(url_table_path)
+        doc_ids = doc_urls.doc_ids
+    else:
+        doc_urls = load_json(os.path.join(segment_folder, DOC_IDS_FILE))
+        doc_ids = {url: doc_id for doc_id, url in enumerate(doc_urls)}
+    indexes = {"doc_urls": doc_urls, "doc_ids": doc_ids}
+    for filename in os.listdir(segment_folder):
+        full_path = os.path.join(segment_folder, filename)
+        if filename.endswith(SEGMENT_EXTENSION):
+            index_name = filename[: -len(SEGMENT_EXTENSION)]
+            indexes[index_name] = SegmentIndex(full_path)
+        elif filename.endswith(DOC_TABLE_EXTENSION):
+            indexes[filename[: -len(DOC_TABLE_EXTENSION)]] = DocTable(full_path)
+        elif filename.endswith(".json") and filename != DOC_IDS_FILE:
+            index_name = filename.replace(".json", "")
+            indexes[index_name] = {
+                int(doc_id): value for doc_id, value in load_json(full_path).items()
+            }
+        elif filename == STATS_FILE:
+            indexes["stats"] = load_corpus_stats(full_path)
     return indexes
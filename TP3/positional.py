@@ -0,0 +1,232 @@
+import math
+import re
+from bisect import bisect_left
+
+from TP3.tokenize import tokenize
+
+# Indexes storing token positions (the only ones usable for phrases and NEAR)
+POSITIONAL_INDEXES = ["title_index", "description_index"]
+# "exact phrase" and left NEAR/k right
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+NEAR_PATTERN = re.compile(r"(\w+)\s+NEAR/(\d+)\s+(\w+)")
+
+
+def parse_query(query):
+    """
+    Extracts the positional operators of a query:
+    - "dark red energy potion": the tokens must appear consecutively,
+    - red NEAR/3 potion: the two tokens must appear at most 3 positions apart.
+
+    :return: (text, phrases, nears) where text is the query without the
+             operator syntax (its words are still used for ranking), phrases
+             a list of token lists and nears a list of (token, token, k).
+    """
+    phrases = [tokens for tokens in map(tokenize, PHRASE_PATTERN.findall(query)) if tokens]
+    nears = []
+    for left, k, right in NEAR_PATTERN.findall(query):
+        left_tokens, right_tokens = tokenize(left), tokenize(right)
+        if left_tokens and right_tokens:
+            nears.append((left_tokens[0], right_tokens[0], int(k)))
+    text = NEAR_PATTERN.sub(r"\1 \3", PHRASE_PATTERN.sub(r" \1 ", query))
+    return text, phrases, nears
+
+
+def gallop(values, target, lo=0):
+    """
+    Index of the first value >= target in the sorted values[lo:], found by
+    exponential then binary search: O(log d) where d is the distance skipped,
+    so walking a long list with increasing targets stays cheap.
+    """
+    n = len(values)
+    bound = lo
+    step = 1
+    while bound < n and values[bound] < target:
+        lo = bound + 1
+        bound += step
+        step *= 2
+    return bisect_left(values, target, lo, min(bound, n))
+
+
+def intersect_postings(postings_list):
+    """
+    Documents present in every Postings of postings_list.
+
+    The shortest postings drive the intersection; the others are searched by
+    galloping, so the cost depends on the shortest list, not the longest.
+    :return: list of (doc_id, ranks) where ranks[i] is the rank of doc_id in
+             postings_list[i] (to reach its positions).
+    """
+    order = sorted(range(len(postings_list)), key=lambda i: len(postings_list[i]))
+    cursors = [0] * len(postings_list)
+    matches = []
+    for rank, doc_id in enumerate(postings_list[order[0]].doc_ids):
+        ranks = [0] * len(postings_list)
+        ranks[order[0]] = rank
+        for i in order[1:]:
+            doc_ids = postings_list[i].doc_ids
+            cursors[i] = gallop(doc_ids, doc_id, cursors[i])
+            if cursors[i] == len(doc_ids):
+                return matches  # No later document can be in every list
+            if doc_ids[cursors[i]] != doc_id:
+                break
+            ranks[i] = cursors[i]
+        else:
+            matches.append((doc_id, ranks))
+    return matches
+
+
+def phrase_starts(position_lists):
+    """
+    Start positions of a phrase in one document: the positions p such that
+    token i occurs at p + i for every i (position_lists[i] are the sorted
+    positions of token i). The shortest list drives the galloping searches.
+    """
+    driver = min(range(len(position_lists)), key=lambda i: len(position_lists[i]))
+    cursors = [0] * len(position_lists)
+    starts = []
+    for position in position_lists[driver]:
+        start = position - driver
+        if start < 0:
+            continue
+        for i, positions in enumerate(position_lists):
+            if i == driver:
+                continue
+            cursors[i] = gallop(positions, start + i, cursors[i])
+            if cursors[i] == len(positions):
+                return starts
+            if positions[cursors[i]] != start + i:
+                break
+        else:
+            starts.append(start)
+    return starts
+
+
+def min_distance(positions_a, positions_b):
+    """
+    Smallest |a - b| between two sorted position lists, walking the shorter
+    one and galloping in the longer one (math.inf if one is empty).
+    """
+    if len(positions_a) > len(positions_b):
+        positions_a, positions_b = positions_b, positions_a
+    best = math.inf
+    cursor = 0
+    for position in positions_a:
+        cursor = gallop(positions_b, position, cursor)
+        if cursor < len(positions_b):
+            best = min(best, positions_b[cursor] - position)
+        if cursor > 0:
+            best = min(best, position - positions_b[cursor - 1])
+        if best == 0:
+            break
+    return best
+
+
+def _field_postings(tokens, index):
+    """
+    Postings of every token in a positional index, or None if one is missing.
+    """
+    postings_list = []
+    for token in tokens:
+        postings = index.get(token)
+        if postings is None or postings.positions is None:
+            return None
+        postings_list.append(postings)
+    return postings_list
+
+
+def phrase_docs(tokens, indexes):
+    """
+    Documents containing the exact phrase in one of POSITIONAL_INDEXES.
+    :return: dict { doc_id: number of occurrences of the phrase }
+    """
+    docs = {}
+    for index_name in POSITIONAL_INDEXES:
+        if index_name not in indexes:
+            continue
+        postings_list = _field_postings(tokens, indexes[index_name])
+        if postings_list is None:
+            continue
+        for doc_id, ranks in intersect_postings(postings_list):
+            starts = phrase_starts(
+                [postings.positions[rank] for postings, rank in zip(postings_list, ranks)]
+            )
+            if starts:
+                docs[doc_id] = docs.get(doc_id, 0) + len(starts)
+    return docs
+
+
+def near_docs(token_a, token_b, k, indexes):
+    """
+    Documents where token_a and token_b appear at most k positions apart (in
+    any order) in one of POSITIONAL_INDEXES.
+    :return: dict { doc_id: smallest distance }
+    """
+    docs = {}
+    for index_name in POSITIONAL_INDEXES:
+        if index_name not in indexes:
+            continue
+        postings_list = _field_postings([token_a, token_b], indexes[index_name])
+        if postings_list is None:
+            continue
+        postings_a, postings_b = postings_list
+        for doc_id, (rank_a, rank_b) in intersect_postings(postings_list):
+            distance = min_distance(postings_a.positions[rank_a], postings_b.positions[rank_b])
+            if distance <= k:
+                docs[doc_id] = min(distance, docs.get(doc_id, math.inf))
+    return docs
+
+
+def match_positional_constraints(phrases, nears, indexes):
+    """
+    Documents satisfying every phrase and NEAR/k constraint of a query, or
+    None if the query has none. Constraints are evaluated from the one with
+    the fewest matches, so the candidate set only shrinks.
+    :return: dict { doc_id: number of satisfied constraints } or None
+    """
+    if not phrases and not nears:
+        return None
+    matches = [phrase_docs(tokens, indexes) for tokens in phrases]
+    matches += [near_docs(token_a, token_b, k, indexes) for token_a, token_b, k in nears]
+    matches.sort(key=len)
+    docs = set(matches[0])
+    for other in matches[1:]:
+        docs.intersection_update(other)
+    constraint_count = len(matches)
+    return {doc_id: constraint_count for doc_id in docs}
+
+
+def proximity_score(query_tokens, doc_id, indexes):
+    """
+    Proximity signal: for each pair of consecutive query tokens, 1 / (their
+    smallest distance) in the best positional field (1.0 when adjacent),
+    summed over the pairs. 0.0 for single-token queries.
+    """
+    tokens = list(dict.fromkeys(query_tokens))  # Query order, no repeats
+    score = 0.0
+    for token_a, token_b in zip(tokens, tokens[1:]):
+        best = math.inf
+        for index_name in POSITIONAL_INDEXES:
+            if index_name not in indexes:
+                continue
+            postings_list = _field_postings([token_a, token_b], indexes[index_name])
+            if postings_list is None:
+                continue
+            positions = [postings.get(doc_id) for postings in postings_list]
+            if positions[0] and positions[1]:
+                best = min(best, min_distance(positions[0], positions[1]))
+        if best < math.inf:
+            score += 1.0 / max(best, 1)
+    return score
+
+
+def add_proximity_scores(ranked, query_tokens, indexes, weight):
+    """
+    Adds weight * proximity_score to every (doc_id, score) of ranked and
+    sorts again (desc score, then asc doc ID).
+    """
+    rescored = [
+        (doc_id, score + weight * proximity_score(query_tokens, doc_id, indexes))
+        for doc_id, score in ranked
+    ]
+    rescored.sort(key=lambda item: (-item[1], item[0]))
+    return rescored
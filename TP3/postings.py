@@ -0,0 +1,181 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+from TP3.positional import gallop
+
+
+def to_uint32_bytes(values):
+    """
+    Serializes an array('I') as little-endian uint32.
+    """
+    if sys.byteorder == "big":
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_uint32_bytes(buffer):
+    """
+    Deserializes little-endian uint32 bytes into an array('I').
+    """
+    values = array("I")
+    values.frombytes(buffer)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class Postings:
+    """
+    Postings list of one token, with documents stored as a sorted array of
+    integer doc IDs (array('I')) instead of URL strings.
+
+    If the source index is positional ({token: {doc: [positions]}}),
+    positions[i] holds the positions of the token in doc_ids[i].
+    Otherwise positions is None and each listed document counts as tf = 1.
+
+    Membership checks are binary searches: O(log n) instead of a list scan.
+
+    Postings read from a compressed segment are given as blocks (a
+    TP3.compression.BlockDocIds) instead of doc_ids: membership checks then
+    only decode the block of documents they look at, and doc_ids is decoded
+    on first access.
+    """
+
+    __slots__ = ("_doc_ids", "blocks", "positions")
+
+    def __init__(self, doc_ids, positions=None, blocks=None):
+        self._doc_ids = doc_ids
+        self.blocks = blocks
+        self.positions = positions
+
+    @property
+    def doc_ids(self):
+        if self._doc_ids is None:
+            self._doc_ids = self.blocks.decode_all()
+        return self._doc_ids
+
+    def __len__(self):
+        if self._doc_ids is None:
+            return len(self.blocks)
+        return len(self._doc_ids)
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return self.find(doc_id) >= 0
+
+    def find(self, doc_id):
+        """
+        Returns the rank of doc_id in the postings, or -1 if it is absent.
+        """
+        if self._doc_ids is None:
+            return self.blocks.find(doc_id)[0]
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return i
+        return -1
+
+    def seek(self, doc_id, cursor=0):
+        """
+        Looks up increasing doc IDs one after the other: each search starts
+        from the cursor returned by the previous one (0 for the first).
+        Compressed postings gallop over their skip entries and only decode
+        the blocks holding a searched doc ID; the others gallop over doc_ids.
+        :return: (found, cursor)
+        """
+        if self._doc_ids is None:
+            rank, block = self.blocks.find(doc_id, cursor)
+            return rank >= 0, block
+        # A block cursor is a valid rank cursor too (block <= its first rank),
+        # in case doc_ids was decoded by another search in the meantime
+        doc_ids = self._doc_ids
+        i = gallop(doc_ids, doc_id, cursor)
+        return i < len(doc_ids) and doc_ids[i] == doc_id, i
+
+    def get(self, doc_id, default=None):
+        """
+        Returns the positions of the token in doc_id (an empty list for
+        non-positional postings), or default if doc_id is absent.
+        """
+        i = self.find(doc_id)
+        if i < 0:
+            return default
+        if self.positions is None:
+            return []
+        return self.positions[i]
+
+    def term_frequencies(self):
+        """
+        Term frequency of the token in every document of the postings
+        (aligned with doc_ids), or None for presence-only postings.
+        Compressed positions know their tfs without being decoded.
+        """
+        if self.positions is None:
+            return None
+        lengths = getattr(self.positions, "lengths", None)
+        if lengths is not None:
+            return lengths()
+        return array("I", (len(p) for p in self.positions))
+
+    def tf(self, doc_id):
+        """
+        Term frequency of the token in doc_id: the number of positions for
+        positional postings, 1.0 for presence-only postings, 0.0 if absent.
+        """
+        i = self.find(doc_id)
+        if i < 0:
+            return 0.0
+        if self.positions is None:
+            return 1.0
+        return float(len(self.positions[i]))
+
+
+def build_doc_ids(raw_indexes, doc_keyed=()):
+    """
+    Builds the doc-ID dictionary from URL-keyed indexes.
+
+    Every URL found in a postings list (or as a key of a doc-keyed index
+    such as reviews_index) receives a dense integer ID, in sorted URL order.
+    Returns (doc_urls, doc_ids): the ID -> URL list and the URL -> ID dict.
+    """
+    urls = set()
+    for name, index in raw_indexes.items():
+        if name in doc_keyed:
+            urls.update(index.keys())
+            continue
+        for docs in index.values():
+            urls.update(docs)
+    doc_urls = sorted(urls)
+    doc_ids = {url: doc_id for doc_id, url in enumerate(doc_urls)}
+    return doc_urls, doc_ids
+
+
+def to_doc_id(doc, doc_ids):
+    """
+    Maps a JSON document key to its integer ID. Keys are either URLs or
+    integer IDs (serialized as strings in JSON objects).
+    """
+    if isinstance(doc, int):
+        return doc
+    if doc in doc_ids:
+        return doc_ids[doc]
+    return int(doc)
+
+
+def to_postings(docs, doc_ids):
+    """
+    Converts one raw JSON postings entry (list of docs, or {doc: [positions]})
+    into a Postings object sorted by integer doc ID.
+    """
+    if isinstance(docs, dict):
+        pairs = sorted(
+            (to_doc_id(doc, doc_ids), positions) for doc, positions in docs.items()
+        )
+        return Postings(
+            array("I", (doc_id for doc_id, _ in pairs)),
+            [array("I", positions) for _, positions in pairs],
+        )
+    return Postings(array("I", sorted({to_doc_id(doc, doc_ids) for doc in docs})))
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from TP3.facets import facet_name, parse_facet_filters
+
+
+class QueryCache:
+    """
+    Size-bounded LRU cache of search() results, with an optional TTL.
+
+    Entries are keyed on the normalized query (sorted expanded tokens, plus
+    the phrase and NEAR constraints and the parsed boolean query) and on the
+    search parameters (filter_mode, field_weights, top_k, proximity_weight,
+    facet filters), so different spellings of the same query share an entry.
+
+    The cache is tied to one version of the indexes: when search() is called
+    with another indexes dict, or with indexes whose "version" changed (see
+    IncrementalIndex), every entry is dropped.
+
+    Cached results are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        :param max_size: maximum number of cached queries (least recently used
+                         ones are evicted first).
+        :param ttl: lifetime of an entry in seconds (None: no expiry).
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expiry time, result)
+        self._index_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        query_tokens,
+        expanded_tokens,
+        phrases,
+        nears,
+        filter_mode,
+        field_weights,
+        top_k,
+        proximity_weight,
+        boolean_query=None,
+        facet_filters=None,
+        facet_counts=False,
+    ):
+        """
+        Normalized cache key of a query and its search parameters.
+
+        The query tokens are only kept in order when proximity_weight > 0
+        (the proximity signal depends on their order); otherwise the result
+        only depends on the set of expanded tokens. Facet filters are
+        normalized, so their clause order does not matter.
+        """
+        if facet_filters:
+            facet_filters = tuple(
+                sorted(
+                    (facet_name(facet), tuple(sorted(values)))
+                    for facet, values in parse_facet_filters(facet_filters)
+                )
+            )
+        return (
+            tuple(sorted(set(expanded_tokens))),
+            tuple(query_tokens) if proximity_weight > 0 else None,
+            tuple(sorted(tuple(tokens) for tokens in phrases)),
+            tuple(sorted(nears)),
+            filter_mode,
+            tuple(sorted(field_weights.items())),
+            top_k,
+            proximity_weight,
+            boolean_query,
+            facet_filters or None,
+            facet_counts,
+        )
+
+    def _check_version(self, indexes):
+        version = (id(indexes), indexes.get("version", 0))
+        if version != self._index_version:
+            self._entries.clear()
+            self._index_version = version
+
+    def get(self, key, indexes):
+        """
+        Cached result for key, or None (counted as a miss).
+        """
+        with self._lock:
+            self._check_version(indexes)
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]  # Expired
+            self.misses += 1
+            return None
+
+    def put(self, key, indexes, result):
+        """
+        Stores the result of a query, evicting the least recently used entry
+        if the cache is full.
+        """
+        with self._lock:
+            self._check_version(indexes)
+            expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expiry, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every entry (counters are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters: {"hits", "misses", "hit_rate", "size"}.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    def __len__(self):
+        return len(self._entries)
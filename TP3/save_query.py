@@ -1,41 +1,186 @@
 import json
 import os
+import queue
+import threading
+import time
 
+# Number of results kept per logged query (URL and score only)
+LOG_TOP_K = 10
+# A log file is rotated when it reaches this size (bytes)
+MAX_LOG_BYTES = 64 * 1024 * 1024
+# Query IDs are reserved by blocks in the ID file, which is only rewritten
+# once every ID_BLOCK queries (IDs skipped by a crash are never reused)
+ID_BLOCK = 1000
+ID_FILE_SUFFIX = ".id"
 
-def save_query_results(query_str, results_data, QUERY_RESULTS_FILE):
+
+class QueryLog:
     """
-    Save the search results to query_result.json, assigning an auto-incremented ID.
+    Append-only JSONL log of the queries, one compact line per query:
+    {"id", "time", "query", "total_documents", "filtered_documents",
+     "results": [{"url", "score"}, ...]} (only the top_k results).
+
+    log() only builds the record and queues it: a background thread appends
+    the queued lines in batches, so the cost per query does not depend on the
+    size of the log. The file is rotated (renamed with a timestamp) when it
+    reaches max_bytes or, with rotate_every, after that many seconds.
+
+    IDs increase across restarts without rereading the log: the highest
+    reserved ID is kept in filepath + ".id" (rewritten once every ID_BLOCK
+    queries, and with the last used ID on close()).
     """
 
-    # 1) Load existing data from file, or create empty list if the file doesn't exist
-    if os.path.exists(QUERY_RESULTS_FILE):
-        with open(QUERY_RESULTS_FILE, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-    else:
-        data = []
-
-    if not isinstance(data, list):
-        # If file structure isn't a list, reset to an empty list
-        data = []
-
-    # 2) Determine the next ID
-    next_id = len(data) + 1
-
-    # 3) Build the record to store
-    # Can store any fields we want (the entire results_data, the query, etc.).
-    # We keep it this way for simplicity.
-    record = {
-        "id": next_id,
-        "query": query_str,
-        "results_data": results_data,  # this includes total_docs, filtered_docs, results...
-    }
-
-    # 4) Append and save back to file
-    data.append(record)
-    with open(QUERY_RESULTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-    print(f"Saved query #{next_id} to {QUERY_RESULTS_FILE}")
+    def __init__(
+        self,
+        filepath,
+        top_k=LOG_TOP_K,
+        max_bytes=MAX_LOG_BYTES,
+        rotate_every=None,
+        background=True,
+    ):
+        """
+        :param rotate_every: maximum age of a log file in seconds (None: no
+                             time-based rotation).
+        :param background: False writes every record before log() returns.
+        """
+        self.filepath = filepath
+        self.top_k = top_k
+        self.max_bytes = max_bytes
+        self.rotate_every = rotate_every
+        self._lock = threading.Lock()
+        self._id_file = filepath + ID_FILE_SUFFIX
+        self._reserved_id = self._read_reserved_id()
+        self._next_id = self._reserved_id + 1
+        self._file = None
+        self._opened_at = None
+        self._queue = None
+        self._writer = None
+        if background:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+            self._writer.start()
+
+    # ---------------------- IDs ---------------------- #
+    def _read_reserved_id(self):
+        if not os.path.exists(self._id_file):
+            return 0
+        with open(self._id_file, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+
+    def _write_id_file(self, last_id):
+        with open(self._id_file + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(last_id))
+        os.replace(self._id_file + ".tmp", self._id_file)
+
+    def _reserve_ids(self):
+        self._reserved_id += ID_BLOCK
+        self._write_id_file(self._reserved_id)
+
+    # ---------------------- Logging ---------------------- #
+    def log(self, query_str, results_data):
+        """
+        Logs a query and its search() results.
+        :return: the ID of the query
+        """
+        record = {
+            "time": round(time.time(), 3),
+            "query": query_str,
+            "total_documents": results_data["total_documents"],
+            "filtered_documents": results_data["filtered_documents"],
+            "results": [
+                {"url": res["url"], "score": res["score"]}
+                for res in results_data["results"][: self.top_k]
+            ],
+        }
+        # Serialized outside the lock; the ID is prepended once allocated
+        body = json.dumps(record, ensure_ascii=False)[1:]
+        with self._lock:
+            query_id = self._next_id
+            self._next_id += 1
+            if query_id > self._reserved_id:
+                self._reserve_ids()
+            line = f'{{"id": {query_id}, {body}\n'
+            # Queued (or written) under the lock, so lines reach the file in ID order
+            if self._queue is not None:
+                self._queue.put(line)
+            else:
+                self._write([line])
+        return query_id
+
+    # ---------------------- Writing ---------------------- #
+    def _write_loop(self):
+        while True:
+            lines = [self._queue.get()]
+            while True:  # Everything queued meanwhile is written at once
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in lines
+            self._write([line for line in lines if line is not None])
+            if stop:
+                return
+
+    def _write(self, lines):
+        if not lines:
+            return
+        if self._file is None:
+            self._open()
+        elif self._file.tell() >= self.max_bytes or (
+            self.rotate_every is not None and time.time() - self._opened_at >= self.rotate_every
+        ):
+            self._rotate()
+        self._file.writelines(lines)
+        self._file.flush()
+
+    def _open(self):
+        self._file = open(self.filepath, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _rotate(self):
+        """
+        Renames the current log to <name>.<timestamp><ext> and starts a new one.
+        """
+        self._file.close()
+        base, ext = os.path.splitext(self.filepath)
+        rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}{ext}"
+            suffix += 1
+        os.replace(self.filepath, rotated)
+        self._open()
+
+    def close(self):
+        """
+        Writes the queued records and closes the log.
+        """
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with self._lock:
+            # Unused reserved IDs are released: only a crash leaves a gap
+            if self._reserved_id >= self._next_id:
+                self._reserved_id = self._next_id - 1
+                self._write_id_file(self._reserved_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_query_results(query_str, results_data, QUERY_RESULTS_FILE):
+    """
+    Appends one query and its top results to the JSONL query log
+    QUERY_RESULTS_FILE, with an auto-incremented ID (see QueryLog; long
+    running processes should keep one QueryLog open instead).
+    """
+    with QueryLog(QUERY_RESULTS_FILE, background=False) as query_log:
+        query_id = query_log.log(query_str, results_data)
+    print(f"Saved query #{query_id} to {QUERY_RESULTS_FILE}")
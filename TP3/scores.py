@@ -1,6 +1,6 @@
 import math
 
-from TP3.tokenize import tokenize
+from TP3.corpus_stats import document_frequency, get_corpus_stats
 
 FIELD_INDEX_MAP = {
     "title": "title_index",
@@ -17,36 +17,29 @@ def compute_bm25(
     Compute BM25 across multiple fields, each with its own weight.
 
     :param query_tokens: list of query terms.
-    :param doc_id: the document identifier (e.g. the URL).
+    :param doc_id: the integer document ID (see indexes["doc_urls"]).
     :param indexes: a dict containing your different field indexes:
                     {
-                      "title_index": {... or ...},
-                      "description_index": {... or ...},
-                      "brand_index": {... or ...},
-                      "origin_index": {... or ...},
+                      "doc_urls": [url, ...],
+                      "title_index": {token: Postings, ...},
+                      "description_index": {token: Postings, ...},
+                      "brand_index": {token: Postings, ...},
+                      "origin_index": {token: Postings, ...},
                       ...
                     }
-    :param doc_data: dictionary with doc_id -> {field -> raw text}
+    :param doc_data: dictionary with doc_url -> {field -> raw text}, only used to
+                     build indexes["stats"] once if no statistics segment was loaded
     :param avgdl: dict with average doc length per field: avgdl[field] = float
+                  (if empty, the avgdl of the corpus statistics is used)
     :param field_weights: dict with the weight for each field. E.g. {"title":1.0, "description":1.0, "brand":0.0, ...}
     :param k1, b: BM25 parameters
     :return: float BM25 score.
     """
-    # Use total_docs if stored; otherwise compute from one of the indexes
-    if "total_docs" not in indexes:
-        if "title_index" in indexes and indexes["title_index"]:
-            all_doc_ids = set()
-            for token_dict in indexes["title_index"].values():
-                # token_dict might be a dict or a list
-                if isinstance(token_dict, dict):
-                    all_doc_ids.update(token_dict.keys())
-                elif isinstance(token_dict, list):
-                    all_doc_ids.update(token_dict)
-            total_docs = len(all_doc_ids)
-        else:
-            total_docs = 1
-    else:
-        total_docs = indexes["total_docs"]
+    # N, doc lengths and avgdl come from the precomputed corpus statistics:
+    # no raw text is tokenized here
+    stats = get_corpus_stats(indexes, doc_data)
+    total_docs = stats["total_docs"]
+    avgdl = avgdl or stats["avgdl"]
 
     score = 0.0
 
@@ -61,8 +54,7 @@ def compute_bm25(
             continue
 
         # doc_length for this doc's field
-        field_text = doc_data.get(doc_id, {}).get(field, "")
-        doc_length = len(tokenize(field_text))
+        doc_length = stats["doc_lengths"][field][doc_id]
         if doc_length == 0:
             doc_length = 1  # avoid zero in the denominator
 
@@ -75,29 +67,11 @@ def compute_bm25(
             if token not in indexes[index_name]:
                 continue
 
-            # docs_with_token might be either:
-            # a) dict {doc_id: positions/freq, ...}  or
-            # b) list of doc_ids
+            # Postings of the token: sorted doc IDs, with positions if the
+            # index is positional (tf = number of positions), else tf = 1
             docs_with_token = indexes[index_name][token]
-
-            if isinstance(docs_with_token, dict):
-                # Data structure: token -> { doc_id -> [positions] or freq }
-                df = len(docs_with_token)  # how many docs have this token
-                freq_object = docs_with_token.get(doc_id, [])
-                if isinstance(freq_object, list):
-                    tf = len(freq_object)  # number of positions
-                elif isinstance(freq_object, (int, float)):
-                    tf = float(freq_object)
-                else:
-                    tf = 0.0
-            elif isinstance(docs_with_token, list):
-                # Data structure: token -> [doc_id, doc_id, ...]
-                # => presence means tf=1, absence means tf=0
-                df = len(docs_with_token)  # doc frequency
-                tf = 1.0 if doc_id in docs_with_token else 0.0
-            else:
-                # Unexpected structure => skip scoring
-                continue
+            df = document_frequency(indexes[index_name], token)
+            tf = docs_with_token.tf(doc_id)
 
             # Compute IDF
             idf = math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
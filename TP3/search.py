@@ -1,72 +1,195 @@
 from TP3.tokenize import tokenize
+from TP3.boolean import boolean_filter, parse_boolean_query, positive_tokens
 from TP3.expand_query_synonyms import expand_query
+from TP3.facets import Bitmap
 from TP3.filters import filter_docs_any_token, filter_docs_all_tokens
 from TP3.rank import rank_documents
+from TP3.topk import rank_top_k
+from TP3.corpus_stats import get_corpus_stats
+from TP3.positional import (
+    add_proximity_scores,
+    match_positional_constraints,
+    parse_query,
+)
 
 
-def search(query, indexes, synonyms, doc_data, avgdl, field_weights, filter_mode="any"):
+def search(
+    query,
+    indexes,
+    synonyms,
+    doc_data,
+    avgdl,
+    field_weights,
+    filter_mode="any",
+    top_k=None,
+    proximity_weight=0.0,
+    cache=None,
+    facets=None,
+    facet_filters=None,
+):
     """
     Execute the entire search process:
     1. Tokenize the query
     2. Expand it with synonyms
-    3. Filter documents (either 'any' or 'all' modes)
+    3. Filter documents ('any', 'all' or 'boolean' modes)
     4. Rank them
     5. Format final results
 
+    In 'boolean' mode the query is a boolean expression (see
+    TP3.boolean.parse_boolean_query: AND, OR, NOT, parentheses and field
+    qualifiers like title:red); the documents it matches are ranked with the
+    tokens that are not under a NOT (and their synonyms).
+
+    The query may contain positional operators (see TP3.positional):
+    "exact phrase" and token NEAR/k token. Only documents satisfying all of
+    them are kept; their words are still used for ranking like the others.
+    With proximity_weight > 0, proximity_weight * proximity_score (closeness
+    of consecutive query tokens in the title/description) is added to the
+    score of every result.
+
+    If top_k is given, only the top_k best results are computed and returned,
+    with MaxScore dynamic pruning (see TP3.topk.rank_top_k): documents that
+    cannot reach the current k-th best score are skipped without scoring, and
+    in 'any' mode the filter step is folded into the top-k traversal. In
+    'boolean' mode every match is scored and the top_k best are returned.
+
+    If facets (a TP3.facets.FacetIndex) is given, facet_filters (e.g.
+    "brand=chocodelight AND made_in=switzerland") restricts the results to
+    the products having these features, and the facet value counts of all
+    the matching documents are returned under "facets".
+
+    If cache (a TP3.query_cache.QueryCache) is given, results are looked up
+    after tokenization and synonym expansion, and stored on a miss. The
+    returned dictionary is then shared with later calls: do not modify it.
+
     Return a dictionary with:
     {
       "total_documents": number of docs in the corpus (if known),
-      "filtered_documents": number of docs passing the filter,
+      "filtered_documents": number of docs passing the filter (estimated
+                            for top-k searches over large postings),
       "results": [
          {
-           "url": doc_id,
+           "url": doc_url,
            "title": ...,
            "description": ...,
            "score": ...
          },
          ...
-      ]
+      ],
+      "facets": {facet: {value: count}} (only if facets is given)
     }
     """
-    # 1) Tokenize
-    query_tokens = tokenize(query)
+    # 1) Tokenize (phrase and NEAR operators are matched on the positional indexes)
+    text, phrases, nears = parse_query(query)
+    boolean_query = None
+    if filter_mode == "boolean":
+        boolean_query = parse_boolean_query(text)
+        query_tokens = positive_tokens(boolean_query)
+    else:
+        query_tokens = tokenize(text)
 
     # 2) Expand with synonyms if available
     expanded_tokens = expand_query(query_tokens, synonyms)
+    if cache is not None:
+        cache_key = cache.make_key(
+            query_tokens,
+            expanded_tokens,
+            phrases,
+            nears,
+            filter_mode,
+            field_weights,
+            top_k,
+            proximity_weight,
+            boolean_query,
+            facet_filters,
+            facets is not None,
+        )
+        cached = cache.get(cache_key, indexes)
+        if cached is not None:
+            return cached
 
     # 3) Filter documents based on 'any' or 'all' presence of tokens
+    constraint_docs = match_positional_constraints(phrases, nears, indexes)
     if filter_mode == "all":
         filtered_docs = filter_docs_all_tokens(expanded_tokens, indexes)
-    else:
+    elif filter_mode == "boolean":
+        filtered_docs = boolean_filter(boolean_query, indexes)
+    elif top_k is None or proximity_weight > 0 or facets is not None:
+        # Facet counts need every matching document
         filtered_docs = filter_docs_any_token(expanded_tokens, indexes)
+    else:
+        # Any document matching a token is eligible: no need to materialize them
+        filtered_docs = constraint_docs
+    if constraint_docs is not None and filtered_docs is not constraint_docs:
+        filtered_docs = {
+            doc_id: count
+            for doc_id, count in filtered_docs.items()
+            if doc_id in constraint_docs
+        }
+    if facets is not None and facet_filters:
+        facet_docs = facets.filter(facet_filters)
+        filtered_docs = {
+            doc_id: count
+            for doc_id, count in filtered_docs.items()
+            if doc_id in facet_docs
+        }
 
     # 4) Rank documents (using multi-field BM25)
     #    rank_documents internally calls compute_bm25(..., doc_data, avgdl, field_weights)
-    ranked = rank_documents(
-        filtered_docs, expanded_tokens, indexes, doc_data, avgdl, field_weights
-    )
+    if top_k is None or proximity_weight > 0 or filter_mode == "boolean":
+        # The proximity signal is not part of the top-k score bounds, and the
+        # matches of a boolean query need not contain a positive token (NOT
+        # only, domain: qualifier), so rank_top_k cannot find them: rank fully
+        ranked = rank_documents(
+            filtered_docs, expanded_tokens, indexes, doc_data, avgdl, field_weights
+        )
+        filtered_count = len(ranked)
+        if proximity_weight > 0:
+            ranked = add_proximity_scores(ranked, query_tokens, indexes, proximity_weight)
+        if top_k is not None:
+            ranked = ranked[:top_k]
+    else:
+        ranked, filtered_count = rank_top_k(
+            expanded_tokens,
+            indexes,
+            doc_data,
+            avgdl,
+            field_weights,
+            top_k,
+            filtered_docs=filtered_docs,
+        )
 
     # 5) Format final results
-    total_docs = indexes.get("total_docs", len(doc_data))
+    total_docs = get_corpus_stats(indexes, doc_data)["total_docs"]
+
+    # Ranking works on integer doc IDs; turn them back into URLs here only
+    doc_urls = indexes["doc_urls"]
 
     results_list = []
     for doc_id, score in ranked:
-        # Retrieve fields from doc_data
-        info = doc_data.get(doc_id, {})
+        # Retrieve fields from doc_data (with a TP3.docstore.DocStore, only the
+        # blocks of the returned results are read and decompressed)
+        doc_url = doc_urls[doc_id]
+        info = doc_data.get(doc_url, {})
         doc_title = info.get("title", "Unknown Title")
         doc_description = info.get("description", "No description available")
 
         results_list.append(
             {
-                "url": doc_id,
+                "url": doc_url,
                 "title": doc_title,
                 "description": doc_description,
                 "score": round(score, 2),
             }
         )
 
-    return {
+    results_data = {
         "total_documents": total_docs,
-        "filtered_documents": len(ranked),
+        "filtered_documents": filtered_count,
         "results": results_list,
     }
+    if facets is not None:
+        results_data["facets"] = facets.counts(Bitmap.from_doc_ids(filtered_docs))
+    if cache is not None:
+        cache.put(cache_key, indexes, results_data)
+    return results_data
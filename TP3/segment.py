@@ -0,0 +1,230 @@
+import mmap
+import os
+import struct
+from array import array
+from functools import lru_cache
+
+from TP3.compression import decode_postings, encode_postings
+from TP3.corpus_stats import STATS_FILE, build_corpus_stats, write_corpus_stats
+from TP3.doc_tables import DOC_TABLE_EXTENSION, URL_TABLE_FILE, write_doc_table, write_url_table
+from TP3.docstore import DOC_STORE_FILE, write_doc_store
+from TP3.postings import Postings, from_uint32_bytes
+
+# Binary segment layout (little-endian):
+#   header  : magic, version, flags, number of terms
+#   entries : one fixed-size entry per term, sorted by the UTF-8 bytes of the term
+#             (term offset, term length, df, postings offset, postings length)
+#   terms   : the UTF-8 bytes of every term, back to back
+#   postings: for each term, its compressed postings (see
+#             TP3.compression.encode_postings: delta + varint doc IDs, tfs
+#             and positions, with a skip entry per block of documents)
+# Version 1 segments (raw uint32 doc IDs, tfs and positions) can still be read.
+SEGMENT_MAGIC = b"IWSG"
+SEGMENT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+SEGMENT_EXTENSION = ".seg"
+FLAG_POSITIONAL = 1
+
+HEADER = struct.Struct("<4sHHI")
+ENTRY = struct.Struct("<QIIQQ")
+# Number of decoded postings kept per segment, so the filtering and scoring
+# steps of a query decode each postings list only once
+DECODED_CACHE_SIZE = 256
+
+
+def write_segment(index, filepath):
+    """
+    Writes a {token: Postings} index to a binary segment file.
+    The segment is positional if the postings carry positions.
+    """
+    terms = sorted(index, key=lambda token: token.encode("utf-8"))
+    positional = any(postings.positions is not None for postings in index.values())
+
+    term_blob = bytearray()
+    postings_blob = bytearray()
+    entries = []
+    for token in terms:
+        postings = index[token]
+        encoded = token.encode("utf-8")
+        positions = None
+        if positional:
+            positions = postings.positions or [array("I")] * len(postings)
+        block = encode_postings(postings.doc_ids, positions)
+        entries.append(
+            (len(term_blob), len(encoded), len(postings), len(postings_blob), len(block))
+        )
+        term_blob += encoded
+        postings_blob += block
+
+    terms_start = HEADER.size + ENTRY.size * len(terms)
+    postings_start = terms_start + len(term_blob)
+    with open(filepath, "wb") as f:
+        flags = FLAG_POSITIONAL if positional else 0
+        f.write(HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, flags, len(terms)))
+        for term_off, term_len, df, post_off, post_len in entries:
+            f.write(
+                ENTRY.pack(
+                    terms_start + term_off,
+                    term_len,
+                    df,
+                    postings_start + post_off,
+                    post_len,
+                )
+            )
+        f.write(term_blob)
+        f.write(postings_blob)
+
+
+class SegmentIndex:
+    """
+    Read-only index backed by a memory-mapped segment file.
+
+    Exposes the same API as the in-memory {token: Postings} dicts
+    (token in index, index[token], get, items, ...). Opening only reads the
+    header: term lookups are binary searches over the mapped term dictionary,
+    and only the postings of the looked-up token are decoded (the most
+    recently decoded ones are kept in a small LRU cache). Positions are
+    decoded later, per block of documents, when they are accessed.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, n_terms = HEADER.unpack_from(self._mm, 0)
+        if magic != SEGMENT_MAGIC or version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"'{filepath}' is not a supported index segment.")
+        self.version = version
+        self.positional = bool(flags & FLAG_POSITIONAL)
+        self._n_terms = n_terms
+        self._decode = lru_cache(maxsize=DECODED_CACHE_SIZE)(self._decode)
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mm, HEADER.size + ENTRY.size * i)
+
+    def _term_bytes(self, entry):
+        term_off, term_len = entry[0], entry[1]
+        return self._mm[term_off : term_off + term_len]
+
+    def _find(self, token):
+        """
+        Binary search of the term dictionary. Returns the entry or None.
+        """
+        if not isinstance(token, str):
+            return None
+        key = token.encode("utf-8")
+        lo, hi = 0, self._n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            term = self._term_bytes(entry)
+            if term < key:
+                lo = mid + 1
+            elif term > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def _decode(self, entry):
+        _, _, df, post_off, post_len = entry
+        block = self._mm[post_off : post_off + post_len]
+        if self.version >= 2:
+            doc_ids, positions = decode_postings(block, df, self.positional)
+            return Postings(None, positions, blocks=doc_ids)
+        doc_ids = from_uint32_bytes(block[: 4 * df])
+        if not self.positional:
+            return Postings(doc_ids)
+        tfs = from_uint32_bytes(block[4 * df : 8 * df])
+        flat = from_uint32_bytes(block[8 * df :])
+        positions = []
+        start = 0
+        for tf in tfs:
+            positions.append(flat[start : start + tf])
+            start += tf
+        return Postings(doc_ids, positions)
+
+    def __len__(self):
+        return self._n_terms
+
+    def __contains__(self, token):
+        return self._find(token) is not None
+
+    def __getitem__(self, token):
+        entry = self._find(token)
+        if entry is None:
+            raise KeyError(token)
+        return self._decode(entry)
+
+    def get(self, token, default=None):
+        entry = self._find(token)
+        return default if entry is None else self._decode(entry)
+
+    def df(self, token):
+        """
+        Document frequency of token, read from the term dictionary
+        without decoding its postings.
+        """
+        entry = self._find(token)
+        return 0 if entry is None else entry[2]
+
+    def __iter__(self):
+        for i in range(self._n_terms):
+            yield self._term_bytes(self._entry(i)).decode("utf-8")
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for i in range(self._n_terms):
+            entry = self._entry(i)
+            yield self._term_bytes(entry).decode("utf-8"), self._decode(entry)
+
+    def values(self):
+        for _, postings in self.items():
+            yield postings
+
+    def close(self):
+        self._mm.close()
+
+
+def build_segments(indexes, segment_folder, doc_data=None):
+    """
+    Writes indexes loaded by load_indexes (JSON mode) as a segment folder:
+      - one <name>.seg binary segment per postings index,
+      - the doc-ID dictionary as a URL table and the doc-keyed indexes
+        (reviews_index) as doc-keyed tables (see TP3.doc_tables),
+      - the corpus statistics segment (N, doc lengths, avgdl, highest
+        review score), taken from indexes["stats"] or computed from
+        doc_data if given,
+      - the document store of doc_data (stored fields), if given.
+    The folder can then be opened with load_indexes(segment_folder, mode="mmap").
+    """
+    # Imported here: loadings imports this module for the "mmap" mode
+    from TP3.loadings import DOC_IDS_FILE, DOC_KEYED_INDEXES, META_KEYS
+
+    os.makedirs(segment_folder, exist_ok=True)
+    # JSON files of the previous layout would be loaded with the new tables
+    for filename in [DOC_IDS_FILE] + [f"{name}.json" for name in DOC_KEYED_INDEXES]:
+        if os.path.exists(os.path.join(segment_folder, filename)):
+            os.remove(os.path.join(segment_folder, filename))
+    n_docs = len(indexes["doc_urls"])
+    write_url_table(indexes["doc_urls"], os.path.join(segment_folder, URL_TABLE_FILE))
+
+    for index_name, index in indexes.items():
+        if index_name in META_KEYS:
+            continue
+        if index_name in DOC_KEYED_INDEXES:
+            filepath = os.path.join(segment_folder, f"{index_name}{DOC_TABLE_EXTENSION}")
+            write_doc_table(index, n_docs, filepath)
+        else:
+            filepath = os.path.join(segment_folder, f"{index_name}{SEGMENT_EXTENSION}")
+            write_segment(index, filepath)
+
+    stats = indexes.get("stats")
+    if stats is None and doc_data is not None:
+        stats = build_corpus_stats(indexes, doc_data)
+    if stats is not None:
+        write_corpus_stats(stats, os.path.join(segment_folder, STATS_FILE))
+    if doc_data is not None:
+        write_doc_store(doc_data, indexes["doc_urls"], os.path.join(segment_folder, DOC_STORE_FILE))
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from TP3.corpus_stats import get_corpus_stats
+from TP3.docstore import DOC_STORE_FILE, DocStore
+from TP3.documents_length import build_doc_data
+from TP3.facets import FEATURES_FOLDER, FacetIndex
+from TP3.loadings import load_indexes, load_json
+from TP3.query_cache import QueryCache
+from TP3.save_query import QueryLog
+from TP3.search import search
+from TP3.segment import build_segments
+
+DATA_FOLDER = "TP3/data"
+FIELD_WEIGHTS = {"title": 3.0, "description": 1.0, "brand": 2.0, "origin": 2.0}
+DEFAULT_WORKERS = 4
+DEFAULT_TOP_K = 10
+FILTER_MODES = ("any", "all", "boolean")
+
+
+class SearchService:
+    """
+    Long-running search engine: the indexes, doc data, synonyms and corpus
+    statistics are loaded once and shared by every query.
+
+    Queries are answered by a pool of worker threads (search() only reads
+    the shared data), and their results go through a QueryCache.
+
+    Facet filters and counts use the FacetIndex given as facets (its bitmaps
+    are not updated with the indexes).
+
+    To serve an IncrementalIndex, build the service on `live.indexes` and
+    `live.doc_data` (the doc_data given to the IncrementalIndex, e.g. the
+    DocStore of load_service, is never modified), then call
+    `service.update(live.indexes, live.doc_data)` after each update: running
+    queries keep the snapshot they started with.
+    """
+
+    def __init__(
+        self,
+        indexes,
+        synonyms,
+        doc_data,
+        field_weights=FIELD_WEIGHTS,
+        workers=DEFAULT_WORKERS,
+        cache_size=1024,
+        query_log=None,
+        facets=None,
+    ):
+        """
+        :param workers: number of queries answered at the same time.
+        :param cache_size: size of the result cache (0: no cache).
+        :param query_log: QueryLog receiving every answered query (optional).
+        :param facets: FacetIndex of the product features (optional).
+        """
+        # Swapped as a whole by update(), so a query never mixes two versions
+        self._snapshot = (indexes, doc_data)
+        self.synonyms = synonyms
+        self.field_weights = field_weights
+        self.cache = QueryCache(max_size=cache_size) if cache_size else None
+        self.query_log = query_log
+        self.facets = facets
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+
+    @property
+    def indexes(self):
+        return self._snapshot[0]
+
+    @property
+    def doc_data(self):
+        return self._snapshot[1]
+
+    def update(self, indexes, doc_data=None):
+        """
+        Serves new indexes (and doc_data) to the next queries, e.g. the
+        `indexes` and `doc_data` published by an IncrementalIndex.
+        """
+        self._snapshot = (indexes, self.doc_data if doc_data is None else doc_data)
+
+    def _search(self, query, filter_mode, top_k, proximity_weight, facet_filters, facet_counts):
+        if (facet_filters or facet_counts) and self.facets is None:
+            raise ValueError("this service has no facets")
+        indexes, doc_data = self._snapshot  # Same snapshot for the whole query
+        avgdl = get_corpus_stats(indexes, doc_data)["avgdl"]
+        results_data = search(
+            query,
+            indexes,
+            self.synonyms,
+            doc_data,
+            avgdl,
+            self.field_weights,
+            filter_mode=filter_mode,
+            top_k=top_k,
+            proximity_weight=proximity_weight,
+            cache=self.cache,
+            facets=self.facets if facet_filters or facet_counts else None,
+            facet_filters=facet_filters,
+        )
+        if self.query_log is not None:
+            self.query_log.log(query, results_data)
+        return results_data
+
+    def submit(
+        self,
+        query,
+        filter_mode="any",
+        top_k=DEFAULT_TOP_K,
+        proximity_weight=0.0,
+        facet_filters=None,
+        facet_counts=False,
+    ):
+        """
+        Queues a query on the worker pool.
+        :param facet_filters: facet filters ("brand=chocodelight AND ...").
+        :param facet_counts: also return the facet value counts (they are
+                             always returned with facet filters).
+        :return: a Future of the search() result.
+        """
+        return self.pool.submit(
+            self._search, query, filter_mode, top_k, proximity_weight, facet_filters, facet_counts
+        )
+
+    def search(self, query, filter_mode="any", top_k=DEFAULT_TOP_K, proximity_weight=0.0, **kwargs):
+        """
+        Answers a query on the worker pool; same result as search().
+        :param kwargs: facet_filters and facet_counts (see submit).
+        """
+        return self.submit(query, filter_mode, top_k, proximity_weight, **kwargs).result()
+
+    def stats(self):
+        """
+        Corpus size and result cache counters.
+        """
+        indexes, doc_data = self._snapshot
+        return {
+            "total_documents": get_corpus_stats(indexes, doc_data)["total_docs"],
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.query_log is not None:
+            self.query_log.close()
+
+
+def load_service(data_folder=DATA_FOLDER, **kwargs):
+    """
+    Loads the data of __main__.py (binary segments and document store, built
+    on the first run, origin synonyms, and the TP2 product features as facets, or
+    the brand and origin indexes without them) into a SearchService.
+    :param kwargs: other SearchService parameters.
+    """
+    index_folder = os.path.join(data_folder, "indexes")
+    segment_folder = os.path.join(data_folder, "segments")
+    doc_store_path = os.path.join(segment_folder, DOC_STORE_FILE)
+    if not os.path.exists(doc_store_path):
+        doc_data = build_doc_data(os.path.join(data_folder, "rearranged_products.jsonl"))
+        build_segments(load_indexes(index_folder), segment_folder, doc_data)
+    indexes = load_indexes(segment_folder, mode="mmap")
+    doc_data = DocStore(doc_store_path, indexes["doc_ids"])
+    synonyms = load_json(os.path.join(data_folder, "synonyms/origin_synonyms.json"))
+    if os.path.isdir(FEATURES_FOLDER):
+        facets = FacetIndex.load(FEATURES_FOLDER, indexes)
+    else:
+        facets = FacetIndex.from_indexes(indexes)
+    return SearchService(indexes, synonyms, doc_data, facets=facets, **kwargs)
+
+
+# ---------------------- Interactive mode ---------------------- #
+def run_repl(service, filter_mode="any", top_k=DEFAULT_TOP_K):
+    """
+    Answers queries typed on stdin until an empty line, "quit" or EOF.
+    """
+    while True:
+        try:
+            query = input("search> ").strip()
+        except EOFError:
+            break
+        if not query or query == "quit":
+            break
+        try:
+            results_data = service.search(query, filter_mode, top_k)
+        except ValueError as e:  # Boolean query syntax
+            print(e)
+            continue
+        print(
+            f"{results_data['filtered_documents']} matching documents "
+            f"(out of {results_data['total_documents']})"
+        )
+        for i, res in enumerate(results_data["results"], 1):
+            print(f"{i}. [{res['score']}] {res['title']}\n   {res['url']}")
+
+
+# ---------------------- HTTP mode ---------------------- #
+def parse_search_params(params):
+    """
+    Validates the parameters of GET /search (a parse_qs dict).
+    :return: (query, filter_mode, top_k, proximity_weight, facet_filters, facet_counts)
+    :raise ValueError: on a missing query or an invalid parameter.
+    """
+    query = params.get("q", [""])[0]
+    if not query.strip():
+        raise ValueError("missing query parameter 'q'")
+    filter_mode = params.get("mode", ["any"])[0]
+    if filter_mode not in FILTER_MODES:
+        raise ValueError(f"'mode' must be one of {', '.join(FILTER_MODES)}")
+    top_k = int(params.get("top_k", [DEFAULT_TOP_K])[0])
+    if top_k <= 0:
+        raise ValueError("'top_k' must be positive")
+    proximity_weight = float(params.get("proximity", [0.0])[0])
+    facet_filters = params.get("filters", [None])[0]
+    facet_counts = params.get("facets", ["0"])[0] not in ("0", "false", "")
+    return query, filter_mode, top_k, proximity_weight, facet_filters, facet_counts
+
+
+def make_http_server(service, host="127.0.0.1", port=8000):
+    """
+    Local JSON endpoint over a SearchService:
+    - GET /search?q=...&mode=any|all|boolean&top_k=10&proximity=0.0 returns the
+      search() result; filters=brand=chocodelight,made_in=switzerland (URL
+      encoded) restricts it by facets, and facets=1 adds the facet counts,
+    - GET /stats returns service.stats().
+    Each connection gets its own thread, but the queries themselves run on
+    the service worker pool.
+    """
+
+    class SearchHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self._send_json(200, service.stats())
+                return
+            if url.path != "/search":
+                self._send_json(404, {"error": f"unknown path {url.path}"})
+                return
+            try:
+                query, filter_mode, top_k, proximity_weight, facet_filters, facet_counts = (
+                    parse_search_params(parse_qs(url.query))
+                )
+                results_data = service.search(
+                    query,
+                    filter_mode,
+                    top_k,
+                    proximity_weight,
+                    facet_filters=facet_filters,
+                    facet_counts=facet_counts,
+                )
+            except ValueError as e:  # Invalid parameter, boolean query or facet filter syntax
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, results_data)
+
+        def log_message(self, format, *args):
+            pass  # One line per query would slow down the service
+
+    return ThreadingHTTPServer((host, port), SearchHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Search service: loads the indexes once, then answers queries."
+    )
+    parser.add_argument("--http", type=int, metavar="PORT", help="Serve HTTP on this port instead of a REPL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--mode", choices=FILTER_MODES, default="any", help="REPL filter mode")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    parser.add_argument("--log", metavar="FILE", help="Append every query to this JSONL log")
+    args = parser.parse_args()
+
+    print("Loading indexes...")
+    service = load_service(
+        workers=args.workers,
+        cache_size=args.cache_size,
+        query_log=QueryLog(args.log) if args.log else None,
+    )
+    try:
+        if args.http:
+            server = make_http_server(service, args.host, args.http)
+            print(f"Serving on http://{args.host}:{args.http}/search?q=...")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                server.server_close()
+        else:
+            run_repl(service, args.mode)
+    finally:
+        service.close()
@@ -0,0 +1,26 @@
+import os
+
+# English stopwords of NLTK (nltk.corpus.stopwords.words("english")), bundled
+# so that importing the search code needs neither NLTK nor the network
+STOPWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords-en.txt")
+
+
+def load_stopwords(filepath=STOPWORDS_FILE):
+    """
+    Loads a stopword list (one word per line).
+
+    If the file is missing, falls back to the NLTK corpus when NLTK and its
+    stopwords data are installed (nothing is downloaded).
+    :return: frozenset of stopwords
+    """
+    if os.path.exists(filepath):
+        with open(filepath, "r", encoding="utf-8") as f:
+            return frozenset(word.strip() for word in f if word.strip())
+    try:
+        from nltk.corpus import stopwords
+    except ImportError:
+        raise FileNotFoundError(f"Stopwords file not found: {filepath} (and NLTK is not installed)") from None
+    return frozenset(stopwords.words("english"))
+
+
+STOPWORDS = load_stopwords()
@@ -1,13 +1,9 @@
-import nltk
 import re
 
-nltk.download("stopwords")
-from nltk.corpus import stopwords
+from TP3.stopwords import STOPWORDS
 
-STOPWORDS = set(stopwords.words("english"))
 
-
-# Same as in TP2 but with the stopwords list from nltk
+# Same as in TP2 but with the stopwords list from nltk (bundled, see TP3.stopwords)
 def tokenize(text):
     """
     Tokenizes text by:
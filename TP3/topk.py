@@ -0,0 +1,217 @@
+import heapq
+import math
+from bisect import bisect_left
+
+import numpy as np
+
+from TP3.batch_scores import batch_bm25, batch_linear_score
+from TP3.corpus_stats import document_frequency, get_corpus_stats, max_review_score
+from TP3.scores import FIELD_INDEX_MAP
+
+# Fields in which a query token makes a document match (as in filter_docs_any_token)
+MATCH_INDEXES = ["title_index", "description_index", "origin_index", "brand_index"]
+# Per-token weights of the presence signals of compute_linear_score
+LINEAR_WEIGHTS = {"title_index": 2.0, "description_index": 1.0, "origin_index": 3.0}
+# Candidates are scored exactly in blocks of this size (vectorized scoring)
+SCORING_BLOCK = 64
+# Above this many postings, the number of matching documents is estimated
+# instead of computing the union of the postings of every query token
+EXACT_COUNT_MAX_POSTINGS = 10_000
+
+
+def _review_upper_bound(indexes):
+    """
+    Highest average review score of the corpus (the review part of the
+    linear score of any document), computed at index time with the corpus
+    statistics, or on first use and cached in them.
+    """
+    stats = indexes.get("stats", {})
+    if "max_review_score" not in stats:
+        stats["max_review_score"] = max_review_score(indexes.get("reviews_index", {}))
+    return stats["max_review_score"]
+
+
+def _term_upper_bound(token, indexes, stats, field_weights, k1):
+    """
+    Upper bound of what one query token can add to bm25 * 1.5 + linear score.
+    In BM25, tf * (k1 + 1) / (tf + norm) < k1 + 1, so each field adds at most
+    weight * idf * (k1 + 1); the linear presence signals add their weights.
+    """
+    total_docs = stats["total_docs"]
+    bm25_bound = 0.0
+    for field, weight in field_weights.items():
+        index_name = FIELD_INDEX_MAP.get(field)
+        if weight <= 0.0 or not index_name or index_name not in indexes:
+            continue
+        df = document_frequency(indexes[index_name], token)
+        if df:
+            idf = math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
+            bm25_bound += weight * idf * (k1 + 1)
+
+    linear_bound = sum(
+        weight
+        for index_name, weight in LINEAR_WEIGHTS.items()
+        if index_name in indexes and token in indexes[index_name]
+    )
+    return bm25_bound * 1.5 + linear_bound
+
+
+def _term_docs(token, indexes):
+    """
+    Sorted array of the documents matching token in any of MATCH_INDEXES.
+    """
+    arrays = [
+        np.frombuffer(indexes[index_name][token].doc_ids, dtype=np.uint32)
+        for index_name in MATCH_INDEXES
+        if index_name in indexes and token in indexes[index_name]
+    ]
+    if not arrays:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(arrays)).astype(np.int64)
+
+
+def _count_matches(term_docs, total_docs):
+    """
+    Number of documents matching at least one token. Exact for one token or
+    small postings; otherwise estimated from the postings sizes (tokens
+    assumed independent), clamped between the largest postings and their
+    sum, so broad queries do not pay for a union of all their postings.
+    """
+    sizes = [len(docs) for docs in term_docs]
+    if len(sizes) == 1:
+        return sizes[0]
+    if sum(sizes) <= EXACT_COUNT_MAX_POSTINGS or total_docs <= 0:
+        return len(np.unique(np.concatenate(term_docs)))
+    missing = 1.0
+    for size in sizes:
+        missing *= max(1 - size / total_docs, 0.0)
+    return min(max(round(total_docs * (1 - missing)), max(sizes)), sum(sizes))
+
+
+def rank_top_k(
+    query_tokens,
+    indexes,
+    doc_data,
+    avgdl,
+    field_weights,
+    k,
+    filtered_docs=None,
+    k1=1.5,
+    b=0.75,
+):
+    """
+    Returns the k best documents for the query, with the same scores as
+    rank_documents, using MaxScore dynamic pruning instead of scoring every
+    matching document.
+
+    Each query token gets an upper bound of its score contribution. Tokens are
+    sorted by bound; the "non-essential" ones are the low-bound tokens whose
+    bounds sum (plus the best possible review score) cannot beat the current
+    k-th best score: documents found only in their postings are never visited.
+    Documents of the essential postings are visited in doc ID order, and are
+    only scored if their upper bound can still beat the k-th best score.
+    Results are kept in a bounded heap of size k.
+
+    :param filtered_docs: optional dict/set of doc IDs the results must belong
+                          to (e.g. from filter_docs_all_tokens); if None,
+                          every document matching a query token is eligible.
+    :return: (ranked, matched_count) where ranked is a list of (doc_id, score)
+             sorted like rank_documents (desc score, then asc doc ID), and
+             matched_count the number of eligible documents (estimated for
+             several tokens with large postings, see _count_matches).
+    """
+    stats = get_corpus_stats(indexes, doc_data)
+    review_bound = _review_upper_bound(indexes)
+
+    terms = []
+    for token in query_tokens:
+        docs = _term_docs(token, indexes)
+        if filtered_docs is not None and len(docs):
+            keep = np.fromiter((d in filtered_docs for d in docs.tolist()), dtype=bool)
+            docs = docs[keep]
+        if len(docs):
+            terms.append((_term_upper_bound(token, indexes, stats, field_weights, k1), docs))
+    if not terms or k <= 0:
+        return [], 0
+
+    terms.sort(key=lambda term: term[0])
+    bounds = [bound for bound, _ in terms]
+    matched_count = _count_matches([docs for _, docs in terms], stats["total_docs"])
+    # Plain lists: cheaper than NumPy scalars for the doc-at-a-time cursors
+    postings = [docs.tolist() for _, docs in terms]
+    # non_essential_bound[i]: best possible score of a doc found only in terms[:i]
+    non_essential_bound = [review_bound]
+    for bound in bounds:
+        non_essential_bound.append(non_essential_bound[-1] + bound)
+
+    heap = []  # (score, -doc_id): the root is the current k-th best result
+    threshold = -math.inf
+    first_essential = 0
+    cursors = [0] * len(terms)
+    pending = []
+
+    def flush(pending):
+        """
+        Scores the pending candidates exactly and pushes them into the heap.
+        """
+        doc_ids = np.array(pending, dtype=np.int64)
+        scores = (
+            batch_bm25(doc_ids, query_tokens, indexes, doc_data, avgdl, field_weights, k1, b)
+            * 1.5
+            + batch_linear_score(doc_ids, query_tokens, indexes)
+        )
+        for doc_id, score in zip(pending, scores.tolist()):
+            entry = (score, -doc_id)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def cannot_enter(bound):
+        # Tolerance so that float rounding in the bounds never prunes a result
+        return len(heap) == k and bound + 1e-9 * (1 + abs(bound)) <= threshold
+
+    while True:
+        # Next candidate: smallest current doc among the essential postings
+        doc_id = None
+        for i in range(first_essential, len(terms)):
+            if cursors[i] < len(postings[i]):
+                current = postings[i][cursors[i]]
+                if doc_id is None or current < doc_id:
+                    doc_id = current
+        if doc_id is None:
+            break
+
+        bound = non_essential_bound[first_essential]
+        for i in range(first_essential, len(terms)):
+            if cursors[i] < len(postings[i]) and postings[i][cursors[i]] == doc_id:
+                bound += bounds[i]
+                cursors[i] += 1
+
+        # Refine with the non-essential postings, highest bounds first
+        for i in range(first_essential - 1, -1, -1):
+            if cannot_enter(bound):
+                break
+            rank = bisect_left(postings[i], doc_id)
+            if rank >= len(postings[i]) or postings[i][rank] != doc_id:
+                bound -= bounds[i]
+
+        if cannot_enter(bound):
+            continue
+
+        pending.append(doc_id)
+        if len(pending) >= SCORING_BLOCK:
+            flush(pending)
+            pending = []
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < len(terms) and cannot_enter(
+                    non_essential_bound[first_essential + 1]
+                ):
+                    first_essential += 1
+
+    if pending:
+        flush(pending)
+
+    ranked = sorted(heap, reverse=True)
+    return [(-neg_doc_id, score) for score, neg_doc_id in ranked], matched_count
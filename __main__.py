@@ -12,8 +12,16 @@
 #     max_pages = 50
 #     output_file = "crawler_results.json"
 
-#     results = crawl(start_url, max_pages)
+#     # Jusqu'à 8 requêtes simultanées, au plus une requête par seconde et par hôte
+#     results = crawl(start_url, max_pages, concurrency=8, delay=1)
 #     save_results_to_json(results, output_file, overwrite=True)
+
+#     # Pour de gros crawls : résultats écrits au fil de l'eau en JSONL, checkpoints
+#     # réguliers et reprise après interruption avec resume=True
+#     # crawl(start_url, 100_000, output_file="crawler_results.jsonl", resume=True)
+#     # Recrawl : requêtes conditionnelles (ETag / Last-Modified) et cache des pages extraites
+#     # from TP1.fetcher import Fetcher
+#     # crawl(start_url, max_pages, fetcher=Fetcher(cache_dir="TP1/http_cache"))
 # # Testé avec web-scraping.dev/products et ensai.fr sans problème.
 
 ###################################
@@ -22,15 +30,9 @@
 
 
 # import os
-# from TP2.loadings import load_products, load_stopwords
-# from TP2.indexes_creation import (
-#     create_feature_index,
-#     create_inverted_index,
-#     create_positional_index,
-#     create_reviews_index,
-# )
-# from TP2.save_indexes import save_index
-# from TP2.extract_features import extract_unique_features
+# from TP2.loadings import load_stopwords
+# from TP2.indexes_creation import build_indexes_single_pass
+# from TP2.save_indexes import save_all_indexes
 
 
 # ---------------------- Main Execution ---------------------- #
@@ -39,49 +41,26 @@
 #     OUTPUT_DIR = "TP2/indexes"
 #     FEATURES_OUTPUT_DIR = f"{OUTPUT_DIR}/features"
 #     INPUT_STOPWORDS = "TP2/stopwords-en.txt"
-#     os.makedirs(OUTPUT_DIR, exist_ok=True)  # Ensure output directory exists
-#     os.makedirs(FEATURES_OUTPUT_DIR, exist_ok=True)  # Ensure output directory exists
 
 #     # Load the stopwords from the provided file
 #     print("Loading stopwords...")
 #     stopwords = load_stopwords(INPUT_STOPWORDS)
 
-#     print("Loading products...")
-#     products = load_products(INPUT_FILE)
-
+#     # One streaming pass over the JSONL fills every index (inverted, positional,
+#     # reviews and all the features, discovered on the fly) with integer doc IDs.
+#     # Variants and near-duplicate pages are collapsed into one canonical document.
 #     print("Creating indexes...")
-#     title_index = create_inverted_index(products, "title", stopwords)
-#     description_index = create_inverted_index(products, "description", stopwords)
-#     title_pos_index = create_positional_index(products, "title", stopwords)
-#     description_pos_index = create_positional_index(products, "description", stopwords)
-#     reviews_index = create_reviews_index(products)
-
-#     # Creating indexes for the features
-#     list_features = extract_unique_features(INPUT_FILE)
+#     indexes = build_indexes_single_pass(INPUT_FILE, stopwords, dedup=True)
+
 #     print("Saving indexes...")
+#     save_all_indexes(indexes, OUTPUT_DIR, FEATURES_OUTPUT_DIR, overwrite=True)
 
-#     list_non_features_to_save = [
-#         "title",
-#         "description",
-#         "title_pos",
-#         "description_pos",
-#         "reviews",
-#     ]
-
-#     for non_features in list_non_features_to_save:
-#         save_index(
-#             eval(f"{non_features}_index"),
-#             os.path.join(OUTPUT_DIR, f"{non_features}_index.json"),
-#             overwrite=True,
-#         )
-
-#     for feature in list_features:
-#         feature_index = create_feature_index(products, feature, stopwords)
-#         save_index(
-#             feature_index,
-#             os.path.join(FEATURES_OUTPUT_DIR, f"{feature}_index.json"),
-#             overwrite=True,
-#         )
+#     # For large crawls: parallel, out-of-core build (process pool + sorted runs
+#     # spilled to disk + k-way merge), replacing the two calls above:
+#     # from TP2.parallel_build import build_indexes_parallel
+#     # build_indexes_parallel(
+#     #     INPUT_FILE, stopwords, OUTPUT_DIR, FEATURES_OUTPUT_DIR, max_postings=1_000_000
+#     # )
 
 #     print("Indexing completed successfully!")
 
@@ -91,8 +70,11 @@
 import os
 
 from TP3.loadings import load_json, load_indexes
+from TP3.segment import build_segments
+from TP3.corpus_stats import get_corpus_stats
 from TP3.search import search
-from TP3.documents_length import build_doc_data, compute_avgdl_per_field
+from TP3.documents_length import build_doc_data
+from TP3.docstore import DOC_STORE_FILE, DocStore
 from TP3.save_query import save_query_results
 
 if __name__ == "__main__":
@@ -107,19 +89,28 @@ if __name__ == "__main__":
     # Adjust these paths according to your local file structure
     DATA_FOLDER = "TP3/data"
     INDEX_FOLDER = os.path.join(DATA_FOLDER, "indexes")
+    # Binary memory-mapped copy of the JSON indexes, built on the first run
+    SEGMENT_FOLDER = os.path.join(DATA_FOLDER, "segments")
+    # Compressed titles and descriptions, read only for the displayed results
+    DOC_STORE_PATH = os.path.join(SEGMENT_FOLDER, DOC_STORE_FILE)
     SYNONYMS_FILE = os.path.join(DATA_FOLDER, "synonyms/origin_synonyms.json")
 
-    QUERY_RESULTS_FILE = "query_result.json"
-
-    # 1) Build doc_data from your JSONL
-    doc_data = build_doc_data("TP3/data/rearranged_products.jsonl")
+    # Append-only JSONL log (query, top result URLs and scores)
+    QUERY_RESULTS_FILE = "query_log.jsonl"
 
-    # 2) Compute average doc length per field
-    fields = ["title", "description", "brand", "origin"]
-    avgdl = compute_avgdl_per_field(doc_data, fields)
+    # 1) Build the index segments once, with the corpus statistics
+    #    (N, doc lengths, average doc length per field) used by BM25 and the
+    #    document store; doc_data (the whole JSONL in memory) is only needed here
+    if not os.path.exists(DOC_STORE_PATH):
+        print("Building index segments...")
+        doc_data = build_doc_data("TP3/data/rearranged_products.jsonl")
+        build_segments(load_indexes(INDEX_FOLDER), SEGMENT_FOLDER, doc_data)
 
+    # 2) Open the segments and the document store (memory-mapped)
     print("Loading indexes...")
-    indexes = load_indexes(INDEX_FOLDER)
+    indexes = load_indexes(SEGMENT_FOLDER, mode="mmap")
+    doc_data = DocStore(DOC_STORE_PATH, indexes["doc_ids"])
+    avgdl = get_corpus_stats(indexes, doc_data)["avgdl"]
 
     # To fully work with indexes instead of the "build_doc_data" dictionary, you can use this function:
     #    doc_data = build_doc_data_from_indexes(indexes)
@@ -128,11 +119,18 @@ if __name__ == "__main__":
     synonyms = load_json(SYNONYMS_FILE)
 
     print("Ready to search.")
+    # This answers a single query; to load everything once and answer many:
+    #    python -m TP3.service               (interactive loop)
+    #    python -m TP3.service --http 8000   (GET /search?q=...&top_k=10)
+    # Phrases and proximity are supported: "dark red energy potion", red NEAR/2 potion
     query_input = input("Enter your search query: ")
 
     # Example usage:
-    # Choose the filtering mode: "any" (OR) or "all" (AND)
-    mode = "any"  # or "all"
+    # Choose the filtering mode: "any" (OR), "all" (AND) or "boolean"
+    # (red AND (potion OR drink) NOT origin:usa, see TP3.boolean)
+    mode = "any"  # or "all", "boolean"
+    # Only the best TOP_K results are computed (pruned top-k retrieval)
+    TOP_K = 10
     results_data = search(
         query_input,
         indexes,
@@ -141,14 +139,15 @@ if __name__ == "__main__":
         avgdl,
         field_weights,
         filter_mode=mode,
+        top_k=TOP_K,
     )
 
-    # Print top 10 results
+    # Print top results
     print("\n=== Search Results ===")
     print(f"Total documents in the corpus: {results_data['total_documents']}")
     print(f"Documents after filtering: {results_data['filtered_documents']}\n")
 
-    for i, res in enumerate(results_data["results"][:10], 1):
+    for i, res in enumerate(results_data["results"][:TOP_K], 1):
         print(
             f"{i}. Title: {res['title']}\n"
             f"   URL: {res['url']}\n"
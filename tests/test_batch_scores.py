@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from TP3.batch_scores import batch_rank
+from TP3.corpus_stats import get_corpus_stats
+from TP3.documents_length import build_doc_data
+from TP3.expand_query_synonyms import expand_query
+from TP3.filters import filter_docs_any_token
+from TP3.loadings import load_indexes, load_json
+from TP3.scores import compute_bm25, compute_linear_score
+from TP3.segment import build_segments
+from TP3.tokenize import tokenize
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TP3", "data")
+
+QUERIES = [
+    "chocolate",
+    "red energy potion",
+    "running shoes for men",
+    "box of chocolate candy usa",
+    "leather boots made in italy",
+    "zzzunknowntoken potion",
+]
+FIELD_WEIGHTS = [
+    {"title": 3.0, "description": 1.0, "brand": 2.0, "origin": 2.0},
+    {"title": 1.0, "description": 1.0},
+    {"title": 0.0, "description": 2.5, "origin": 0.5},
+]
+
+
+@pytest.fixture(scope="module")
+def doc_data():
+    return build_doc_data(os.path.join(DATA_FOLDER, "rearranged_products.jsonl"))
+
+
+@pytest.fixture(scope="module")
+def synonyms():
+    return load_json(os.path.join(DATA_FOLDER, "synonyms", "origin_synonyms.json"))
+
+
+@pytest.fixture(scope="module", params=["json", "mmap"])
+def indexes(request, doc_data, tmp_path_factory):
+    indexes = load_indexes(os.path.join(DATA_FOLDER, "indexes"))
+    if request.param == "mmap":
+        segment_folder = str(tmp_path_factory.mktemp("segments"))
+        build_segments(indexes, segment_folder, doc_data)
+        indexes = load_indexes(segment_folder, mode="mmap")
+    return indexes
+
+
+def reference_rank(candidates, query_tokens, indexes, doc_data, avgdl, field_weights):
+    """
+    The per-document scoring that batch_rank replaces.
+    """
+    scores = {
+        doc_id: compute_bm25(query_tokens, doc_id, indexes, doc_data, avgdl, field_weights) * 1.5
+        + compute_linear_score(doc_id, query_tokens, indexes)
+        for doc_id in candidates
+    }
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+@pytest.mark.parametrize("field_weights", FIELD_WEIGHTS)
+@pytest.mark.parametrize("query", QUERIES)
+def test_batch_rank_matches_per_document_scores(query, field_weights, indexes, doc_data, synonyms):
+    query_tokens = expand_query(tokenize(query), synonyms)
+    avgdl = get_corpus_stats(indexes, doc_data)["avgdl"]
+    candidates = filter_docs_any_token(query_tokens, indexes)
+
+    ranked = batch_rank(candidates, query_tokens, indexes, doc_data, avgdl, field_weights)
+    expected = reference_rank(candidates, query_tokens, indexes, doc_data, avgdl, field_weights)
+
+    assert [doc_id for doc_id, _ in ranked] == [doc_id for doc_id, _ in expected]
+    assert [score for _, score in ranked] == pytest.approx(
+        [score for _, score in expected], rel=1e-9, abs=1e-12
+    )
+
+
+def test_batch_rank_without_candidates(indexes, doc_data):
+    assert batch_rank({}, ["chocolate"], indexes, doc_data, {}, FIELD_WEIGHTS[0]) == []
@@ -0,0 +1,45 @@
+import random
+from array import array
+
+from TP3.boolean import evaluate, parse_boolean_query
+from TP3.compression import decode_postings, encode_postings
+from TP3.postings import Postings
+
+N_DOCS = 5000
+TERMS = {"rare": 0.002, "scarce": 0.03, "half": 0.5, "common": 0.9}
+
+
+def compressed_postings(doc_ids):
+    blocks, _ = decode_postings(encode_postings(doc_ids), len(doc_ids), False)
+    return Postings(None, blocks=blocks)
+
+
+def test_boolean_queries_over_compressed_postings():
+    rng = random.Random(0)
+    doc_sets = {
+        term: {doc_id for doc_id in range(N_DOCS) if rng.random() < density}
+        for term, density in TERMS.items()
+    }
+    index = {term: compressed_postings(array("I", sorted(docs))) for term, docs in doc_sets.items()}
+    indexes = {"title_index": index, "doc_ids": {str(doc_id): doc_id for doc_id in range(N_DOCS)}}
+    everything = set(range(N_DOCS))
+
+    expected = {
+        "title:(rare AND common)": doc_sets["rare"] & doc_sets["common"],
+        "title:(scarce half common)": doc_sets["scarce"] & doc_sets["half"] & doc_sets["common"],
+        "title:(rare OR scarce) AND NOT title:half": (doc_sets["rare"] | doc_sets["scarce"])
+        - doc_sets["half"],
+        "title:(NOT common)": everything - doc_sets["common"],
+        "title:(half AND NOT (scarce OR common))": doc_sets["half"]
+        - doc_sets["scarce"]
+        - doc_sets["common"],
+    }
+    for query, docs in expected.items():
+        assert list(evaluate(parse_boolean_query(query), indexes)) == sorted(docs), query
+
+    # Filtering the few candidates of a rare term only decodes the blocks of
+    # the frequent term that can hold them
+    index["common"] = compressed_postings(array("I", sorted(doc_sets["common"])))
+    evaluate(parse_boolean_query("title:(rare AND common)"), indexes)
+    assert index["common"]._doc_ids is None
+    assert len(index["common"].blocks._blocks) <= len(doc_sets["rare"])
@@ -0,0 +1,28 @@
+import random
+from array import array
+
+import pytest
+
+from TP3.compression import BLOCK_SIZE, decode_postings, encode_postings
+from TP3.postings import Postings
+
+
+@pytest.mark.parametrize("df", [0, 1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 5 * BLOCK_SIZE + 7])
+@pytest.mark.parametrize("positional", [False, True])
+def test_block_wise_lookups_match_full_decode(df, positional):
+    rng = random.Random(df)
+    doc_ids = array("I", sorted(rng.sample(range(20 * df + 10), df)))
+    positions = [array("I", sorted(rng.sample(range(100), rng.randint(1, 4)))) for _ in doc_ids]
+    block = encode_postings(doc_ids, positions if positional else None)
+
+    blocks, decoded_positions = decode_postings(block, df, positional)
+    postings = Postings(None, decoded_positions, blocks=blocks)
+    assert len(postings) == df
+    for doc_id in rng.sample(range(20 * df + 11), min(df + 10, 20 * df + 11)):
+        expected = doc_ids.index(doc_id) if doc_id in doc_ids else -1
+        assert postings.find(doc_id) == expected
+        if positional and expected >= 0:
+            assert postings.get(doc_id) == positions[expected]
+    # Lookups only decode the blocks they touch
+    assert postings._doc_ids is None
+    assert postings.doc_ids == doc_ids
@@ -0,0 +1,31 @@
+from TP3.doc_tables import DocTable, UrlTable, write_doc_table, write_url_table
+
+URLS = ["https://b.dev/é", "https://a.dev/2", "https://c.dev", "https://a.dev/10"]
+
+
+def test_url_table_round_trip(tmp_path):
+    path = str(tmp_path / "doc_urls.bin")
+    write_url_table(URLS, path)
+    table = UrlTable(path)
+    assert len(table) == len(URLS)
+    assert list(table) == URLS
+    assert table[-1] == URLS[-1] and table[1:3] == URLS[1:3]
+    doc_ids = table.doc_ids
+    assert dict(doc_ids.items()) == {url: doc_id for doc_id, url in enumerate(URLS)}
+    assert all(doc_ids[url] == doc_id for doc_id, url in enumerate(URLS))
+    assert doc_ids.get("https://a.dev") is None and "https://a.dev" not in doc_ids
+    assert doc_ids.get(0) is None
+    table.close()
+
+
+def test_doc_table_round_trip(tmp_path):
+    path = str(tmp_path / "reviews_index.table")
+    reviews = {0: {"total_reviews": 2, "mean_mark": 4.5}, 3: {"total_reviews": 0, "mean_mark": 0}}
+    write_doc_table(reviews, len(URLS), path)
+    table = DocTable(path)
+    assert len(table) == 2
+    assert dict(table.items()) == reviews
+    assert list(table) == [0, 3]
+    assert 1 not in table and 7 not in table and "0" not in table
+    assert table.get(1, {}) == {} and table[3] == reviews[3]
+    table.close()
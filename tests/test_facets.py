@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from TP2.indexes_creation import build_indexes_single_pass
+from TP2.loadings import load_stopwords
+from TP2.save_indexes import save_all_indexes
+from TP3.facets import FacetIndex, facet_name
+from TP3.loadings import load_indexes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def dedup_build(tmp_path_factory):
+    """
+    TP2 indexes built with dedup=True: the feature indexes only hold the
+    canonical URL of each cluster of variants.
+    """
+    stopwords = load_stopwords(os.path.join(ROOT, "TP2", "stopwords-en.txt"))
+    tp2_indexes = build_indexes_single_pass(
+        os.path.join(ROOT, "TP2", "products.jsonl"), stopwords, dedup=True
+    )
+    output_dir = tmp_path_factory.mktemp("tp2_indexes")
+    save_all_indexes(tp2_indexes, str(output_dir), str(output_dir / "features"), overwrite=True)
+    return tp2_indexes, str(output_dir / "features")
+
+
+def test_facets_of_a_dedup_build_include_the_variants(dedup_build):
+    tp2_indexes, features_folder = dedup_build
+    assert tp2_indexes["variants"]
+    indexes = load_indexes(os.path.join(ROOT, "TP3", "data", "indexes"))
+    facets = FacetIndex.load(features_folder, indexes)
+
+    doc_ids = indexes["doc_ids"]
+    tp2_urls = sorted(tp2_indexes["doc_ids"], key=tp2_indexes["doc_ids"].get)
+    for feature, index in tp2_indexes["features"].items():
+        for value, docs in index.items():
+            expected = set()
+            for doc in docs:
+                url = tp2_urls[doc]
+                for variant in (url, *tp2_indexes["variants"].get(url, ())):
+                    if variant in doc_ids:
+                        expected.add(doc_ids[variant])
+            bitmap = facets.facets[facet_name(feature)][value]
+            assert sorted(bitmap) == sorted(expected), (feature, value)
+
+    # Every variant of a brand is found, not only the canonical product
+    chocodelight = facets.filter("brand=chocodelight")
+    canonical = {
+        doc_ids[tp2_urls[doc]]
+        for doc in tp2_indexes["features"]["brand"]["chocodelight"]
+        if tp2_urls[doc] in doc_ids
+    }
+    assert len(chocodelight) > len(canonical)
@@ -0,0 +1,23 @@
+import pytest
+
+from TP1.extractors import EXTRACTORS
+from TP1.frontier import Frontier, normalize_url
+
+HTML = '<html><head><title>Docs</title></head><body><p>Intro</p><a href="page2">Next</a></body></html>'
+
+
+def test_normalize_url_keeps_the_trailing_slash():
+    assert normalize_url("HTTPS://Web-Scraping.dev:443/docs/?b=2&a=1#top") == (
+        "https://web-scraping.dev/docs/?a=1&b=2"
+    )
+    assert normalize_url("https://web-scraping.dev/docs") == "https://web-scraping.dev/docs"
+    assert normalize_url("https://web-scraping.dev") == "https://web-scraping.dev/"
+
+
+@pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+def test_relative_links_of_a_directory_url(backend):
+    frontier = Frontier()
+    frontier.add("https://web-scraping.dev/docs/")
+    url = frontier.pop()
+    links = EXTRACTORS[backend](HTML, url)["links"]
+    assert links == ["https://web-scraping.dev/docs/page2"]
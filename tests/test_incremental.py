@@ -0,0 +1,29 @@
+import os
+
+from TP3.documents_length import build_doc_data
+from TP3.incremental import IncrementalIndex
+from TP3.loadings import load_indexes
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TP3", "data")
+
+
+def test_reopen_keeps_a_url_deleted_then_added_again(tmp_path):
+    doc_data = build_doc_data(os.path.join(DATA_FOLDER, "rearranged_products.jsonl"))
+    indexes = load_indexes(os.path.join(DATA_FOLDER, "indexes"))
+    url = indexes["doc_urls"][0]
+    product = {"url": url, "title": "Renamed zorblax", "description": "", "product_features": {}}
+
+    live = IncrementalIndex(indexes, doc_data, segment_folder=str(tmp_path), background_merge=False)
+    live.delete_product(url)
+    live.add_product(product)
+    expected_docs = len(live.indexes["doc_ids"])
+
+    reopened = IncrementalIndex(
+        load_indexes(os.path.join(DATA_FOLDER, "indexes")),
+        doc_data,
+        segment_folder=str(tmp_path),
+        background_merge=False,
+    )
+    assert reopened.doc_data.get(url)["title"] == "Renamed zorblax"
+    assert reopened.indexes["doc_ids"][url] == live.indexes["doc_ids"][url]
+    assert len(reopened.indexes["doc_ids"]) == expected_docs
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from TP3.corpus_stats import get_corpus_stats
+from TP3.documents_length import build_doc_data
+from TP3.loadings import load_indexes, load_json
+from TP3.search import search
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TP3", "data")
+FIELD_WEIGHTS = {"title": 3.0, "description": 1.0, "brand": 2.0, "origin": 2.0}
+
+
+@pytest.fixture(scope="module")
+def doc_data():
+    return build_doc_data(os.path.join(DATA_FOLDER, "rearranged_products.jsonl"))
+
+
+@pytest.fixture(scope="module")
+def indexes():
+    return load_indexes(os.path.join(DATA_FOLDER, "indexes"))
+
+
+BOOLEAN_QUERIES = [
+    "NOT red",
+    "domain:webscrapingdev",
+    "domain:webscrapingdev AND NOT chocolate",
+    "red OR NOT potion",
+]
+
+
+@pytest.mark.parametrize("query", BOOLEAN_QUERIES)
+@pytest.mark.parametrize("top_k", [1, 10])
+def test_boolean_top_k_matches_full_ranking(query, top_k, indexes, doc_data):
+    synonyms = load_json(os.path.join(DATA_FOLDER, "synonyms", "origin_synonyms.json"))
+    avgdl = get_corpus_stats(indexes, doc_data)["avgdl"]
+
+    def run(k):
+        return search(
+            query,
+            indexes,
+            synonyms,
+            doc_data,
+            avgdl,
+            FIELD_WEIGHTS,
+            filter_mode="boolean",
+            top_k=k,
+        )
+
+    full = run(None)
+    best = run(top_k)
+    assert full["filtered_documents"] > 0
+    assert best["filtered_documents"] == full["filtered_documents"]
+    assert best["results"] == full["results"][:top_k]